@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class PartialIndex(models.Index):
+    """Index over the rows matching a raw SQL condition, optionally unique.
+
+    Django 2.1 has no conditional indexes. Declaring them in Meta.indexes (instead of a RunSQL migration) keeps them
+    alive when SQLite migrations rebuild the table.
+    """
+
+    def __init__(self, *, condition, unique=False, **kwargs):
+        super().__init__(**kwargs)
+        self.condition = condition
+        self.unique = unique
+
+    def create_sql(self, model, schema_editor, using=''):
+        fields = [model._meta.get_field(field_name) for field_name, _ in self.fields_orders]
+        col_suffixes = [order[1] for order in self.fields_orders]
+        sql = 'CREATE {}INDEX %(name)s ON %(table)s (%(columns)s)%(extra)s WHERE {}'.format(
+            'UNIQUE ' if self.unique else '',
+            self.condition,
+        )
+        return schema_editor._create_index_sql(
+            model, fields, name=self.name, using=using, db_tablespace=self.db_tablespace,
+            col_suffixes=col_suffixes, sql=sql,
+        )
+
+    def deconstruct(self):
+        path, args, kwargs = super().deconstruct()
+        kwargs['condition'] = self.condition
+        if self.unique:
+            kwargs['unique'] = self.unique
+        return path, args, kwargs
@@ -158,7 +158,58 @@ LOGGING = {
 }
 
 TASK_QUEUE_WORKERS = env.int('DJANGO_TASK_QUEUE_WORKERS', 2)
-TASK_QUEUE_POLL_INTERVAL = env.float('DJANGO_TASK_QUEUE_POLL_INTERVAL', 0.5)
+# Worker pool size per named queue, e.g. DJANGO_TASK_QUEUE_QUEUES='default=2;sync=1'. Sync-critical periodic
+# work gets its own pool so it's never starved by long-running tasks.
+TASK_QUEUE_QUEUES = env.dict('DJANGO_TASK_QUEUE_QUEUES', cast={'value': int}, default={
+    'default': TASK_QUEUE_WORKERS,
+    'sync': 1,
+    'interactive': 2,
+})
+# Enqueued tasks wake the scheduler through a notification, so polling is only a fallback for missed wakeups.
+TASK_QUEUE_POLL_INTERVAL = env.float('DJANGO_TASK_QUEUE_POLL_INTERVAL', 5)
+TASK_QUEUE_CLAIM_BATCH_SIZE = env.int('DJANGO_TASK_QUEUE_CLAIM_BATCH_SIZE', 16)
+# Without Postgres' LISTEN/NOTIFY, each scheduler binds a datagram socket in this directory and enqueues wake them all
+TASK_QUEUE_NOTIFY_SOCKET_DIR = env.str('DJANGO_TASK_QUEUE_NOTIFY_SOCKET_DIR',
+                                       os.path.join(BASE_DIR, 'task_queue_sockets'))
+TASK_QUEUE_LEASE_SECONDS = env.int('DJANGO_TASK_QUEUE_LEASE_SECONDS', 60)
+TASK_QUEUE_HEARTBEAT_INTERVAL = env.float('DJANGO_TASK_QUEUE_HEARTBEAT_INTERVAL', 15)
+TASK_QUEUE_MAX_ATTEMPTS = env.int('DJANGO_TASK_QUEUE_MAX_ATTEMPTS', 3)
+# Periodic tasks start up to this fraction of their interval late, so that schedulers don't all check at once
+TASK_QUEUE_PERIODIC_JITTER = env.float('DJANGO_TASK_QUEUE_PERIODIC_JITTER', 0.1)
+# Upper bound for long-polling a task's result through the API. A waiting request holds a web worker, and gunicorn
+# defaults to a single sync worker, so keep this to a few seconds and have clients re-poll with the task id. Raising
+# it needs as many gunicorn workers (or threads) as there can be concurrently waiting requests, plus one.
+TASK_QUEUE_MAX_RESULT_WAIT = env.float('DJANGO_TASK_QUEUE_MAX_RESULT_WAIT', 5)
+# Number of processes for tasks declared with executor='process'
+TASK_QUEUE_PROCESS_POOL_SIZE = env.int('DJANGO_TASK_QUEUE_PROCESS_POOL_SIZE', os.cpu_count() or 1)
+# Finished tasks older than this are pruned, in chunks of TASK_QUEUE_PRUNE_CHUNK_SIZE rows per transaction
+TASK_QUEUE_HISTORY_DAYS = env.int('DJANGO_TASK_QUEUE_HISTORY_DAYS', 30)
+TASK_QUEUE_PRUNE_CHUNK_SIZE = env.int('DJANGO_TASK_QUEUE_PRUNE_CHUNK_SIZE', 1000)
+# Keep per handler daily aggregates (AsyncTaskDailyStats) of pruned tasks
+TASK_QUEUE_ARCHIVE_HISTORY = env.bool('DJANGO_TASK_QUEUE_ARCHIVE_HISTORY', False)
+
+# Each Alcazar poll drains the update backlog for up to this many seconds, in pages sized to take about
+# ALCAZAR_UPDATE_PAGE_SECONDS each to write
+ALCAZAR_DRAIN_BUDGET = env.float('DJANGO_ALCAZAR_DRAIN_BUDGET', 60)
+ALCAZAR_UPDATE_PAGE_SECONDS = env.float('DJANGO_ALCAZAR_UPDATE_PAGE_SECONDS', 2)
+# consume_alcazar_updates long-polls Alcazar for this long. poll_alcazar stands down while the consumer has
+# heartbeated within ALCAZAR_CONSUMER_STALE_SECONDS
+ALCAZAR_CONSUMER_WAIT = env.float('DJANGO_ALCAZAR_CONSUMER_WAIT', 25)
+ALCAZAR_CONSUMER_HEARTBEAT_INTERVAL = env.float('DJANGO_ALCAZAR_CONSUMER_HEARTBEAT_INTERVAL', 15)
+ALCAZAR_CONSUMER_STALE_SECONDS = env.float('DJANGO_ALCAZAR_CONSUMER_STALE_SECONDS', 120)
+# Whatever applies Alcazar updates holds a lease, renewed before every pop. It must outlast a long-polling pop plus
+# writing a page, and is how long a crashed holder blocks the others.
+ALCAZAR_SYNC_LEASE_SECONDS = env.float('DJANGO_ALCAZAR_SYNC_LEASE_SECONDS', 180)
+# Also send the per-torrent torrent_* signals next to the batched torrents_* ones, for receivers not batched yet
+TORRENTS_PER_TORRENT_SIGNALS = env.bool('DJANGO_TORRENTS_PER_TORRENT_SIGNALS', False)
+# Number of torrents whose last synced state is remembered in memory, so that unchanged Alcazar updates are skipped
+# without reading the torrents. A process' cache is cleared whenever another process held the sync lease in the
+# meantime, 0 disables it.
+ALCAZAR_STATE_CACHE_SIZE = env.int('DJANGO_ALCAZAR_STATE_CACHE_SIZE', 200000)
+# Alcazar and the DB are compared this often through digests of buckets of torrents sharing the first
+# ALCAZAR_RECONCILE_PREFIX_LENGTH hex digits of their info hash, 2 makes 256 buckets per realm
+ALCAZAR_RECONCILE_INTERVAL = env.int('DJANGO_ALCAZAR_RECONCILE_INTERVAL', 900)
+ALCAZAR_RECONCILE_PREFIX_LENGTH = env.int('DJANGO_ALCAZAR_RECONCILE_PREFIX_LENGTH', 2)
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
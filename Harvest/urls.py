@@ -13,6 +13,7 @@ main_patterns = [
     path('api/', include('home.urls')),
     path('api/settings/', include('settings.urls')),
     path('api/monitoring/', include('monitoring.urls')),
+    path('api/task-queue/', include('task_queue.urls')),
     path('api/torrents/', include('torrents.urls')),
     path('api/trackers/', include('trackers.urls')),
     path('api/upload-studio/', include('upload_studio.urls')),
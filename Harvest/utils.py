@@ -3,7 +3,9 @@ import logging
 import re
 from contextlib import contextmanager
 
-from django.db import transaction
+from django.db import transaction, connections
+from django.db.models import Case, When, Value
+from django.db.models.functions import Cast
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -69,11 +71,42 @@ def chunks(iterable, n):
 
 
 def qs_chunks(qs, n):
-    ids = list(qs.values_list('id', flat=True))
+    ids = list(qs.values_list('pk', flat=True))
     for ids_chunk in chunks(ids, n):
         yield qs.model.objects.filter(pk__in=ids_chunk)
 
 
+def bulk_update(objs, fields, batch_size=None, using='default'):
+    """Update fields of already saved objs with one UPDATE ... SET field = CASE pk WHEN ... per batch.
+
+    Equivalent of QuerySet.bulk_update() from newer Django versions. Returns the number of updated rows.
+    """
+
+    if not objs:
+        return 0
+    model = objs[0]._meta.model
+    fields = [model._meta.get_field(name) for name in fields]
+    connection = connections[using]
+    # Each object takes a parameter for its pk in the WHERE and a pk and value in each CASE
+    max_batch_size = connection.ops.bulk_batch_size(['pk'] * (1 + 2 * len(fields)), objs)
+    batch_size = min(batch_size, max_batch_size) if batch_size else max_batch_size
+
+    num_updated = 0
+    for batch in chunks(objs, batch_size):
+        update_kwargs = {}
+        for field in fields:
+            case = Case(*[
+                When(pk=obj.pk, then=Value(getattr(obj, field.attname), output_field=field))
+                for obj in batch
+            ], output_field=field)
+            if connection.vendor == 'postgresql':
+                # Otherwise the parameters are typed as text
+                case = Cast(case, output_field=field)
+            update_kwargs[field.attname] = case
+        num_updated += model.objects.using(using).filter(pk__in=[obj.pk for obj in batch]).update(**update_kwargs)
+    return num_updated
+
+
 @contextmanager
 def control_transaction():
     exc = None
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+import torrents.fields
+
+
+def copy_to_binary(apps, schema_editor):
+    torrents.fields.copy_info_hashes(apps.get_model('bibliotik', 'BibliotikTorrent'), 'info_hash', 'info_hash_binary')
+
+
+def copy_from_binary(apps, schema_editor):
+    torrents.fields.copy_info_hashes(apps.get_model('bibliotik', 'BibliotikTorrent'), 'info_hash_binary', 'info_hash')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bibliotik', '0006_auto_20190327_0137'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bibliotiktorrent',
+            name='info_hash_binary',
+            field=torrents.fields.BinaryInfoHashField(null=True),
+        ),
+        # Nullable, so that reversing the RemoveField can add the column back before its values are copied
+        migrations.AlterField(
+            model_name='bibliotiktorrent',
+            name='info_hash',
+            field=torrents.fields.InfoHashField(db_index=True, max_length=40, null=True),
+        ),
+        migrations.RunPython(copy_to_binary, copy_from_binary, elidable=True),
+        migrations.RemoveField(
+            model_name='bibliotiktorrent',
+            name='info_hash',
+        ),
+        migrations.RenameField(
+            model_name='bibliotiktorrent',
+            old_name='info_hash_binary',
+            new_name='info_hash',
+        ),
+        migrations.AlterField(
+            model_name='bibliotiktorrent',
+            name='info_hash',
+            field=torrents.fields.BinaryInfoHashField(db_index=True),
+        ),
+    ]
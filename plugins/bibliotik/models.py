@@ -4,7 +4,7 @@ from http import cookiejar
 from django.db import models
 
 from Harvest.throttling import ThrottledRequest
-from torrents.fields import InfoHashField
+from torrents.fields import BinaryInfoHashField
 from torrents.models import TorrentInfo
 
 
@@ -82,7 +82,7 @@ class BibliotikTorrent(models.Model):
     is_deleted = models.BooleanField()
 
     torrent_info = models.OneToOneField(TorrentInfo, models.CASCADE, related_name='bibliotik_torrent')
-    info_hash = InfoHashField(db_index=True)
+    info_hash = BinaryInfoHashField(db_index=True)
     category = models.CharField(max_length=32, choices=CATEGORY_CHOICES, db_index=True)
     format = models.CharField(max_length=16, null=True)
     retail = models.BooleanField(default=False)
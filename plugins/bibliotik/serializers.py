@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from plugins.bibliotik.models import BibliotikClientConfig, BibliotikTorrent
+from torrents.serializers import InfoHashSerializerField
 
 
 class BibliotikClientConfigSerializer(serializers.ModelSerializer):
@@ -12,6 +13,8 @@ class BibliotikClientConfigSerializer(serializers.ModelSerializer):
 
 
 class BibliotikTorrentSerializer(serializers.ModelSerializer):
+    info_hash = InfoHashSerializerField()
+
     class Meta:
         model = BibliotikTorrent
         fields = '__all__'
@@ -6,7 +6,7 @@ from django.db import models
 
 from Harvest.throttling import ThrottledRequest
 from plugins.redacted.exceptions import RedactedException
-from torrents.fields import InfoHashField
+from torrents.fields import BinaryInfoHashField
 from torrents.models import TorrentInfo
 
 
@@ -168,7 +168,7 @@ class RedactedTorrent(models.Model):
 
     torrent_info = models.OneToOneField(TorrentInfo, models.CASCADE, related_name='redacted_torrent')
     torrent_group = models.ForeignKey(RedactedTorrentGroup, models.PROTECT)
-    info_hash = InfoHashField(db_index=True)
+    info_hash = BinaryInfoHashField(db_index=True)
     media = models.CharField(max_length=64, choices=MEDIA_CHOICES)
     format = models.CharField(max_length=64, choices=FORMAT_CHOICES)
     encoding = models.CharField(max_length=64, choices=ENCODING_CHOICES)
@@ -2,6 +2,7 @@ from rest_framework import serializers
 
 from plugins.redacted.models import RedactedClientConfig, RedactedTorrent, RedactedTorrentGroup
 from plugins.redacted.utils import get_joined_artists
+from torrents.serializers import InfoHashSerializerField
 
 
 class RedactedClientConfigSerializer(serializers.ModelSerializer):
@@ -25,6 +26,8 @@ class RedactedTorrentGroupSerializer(serializers.ModelSerializer):
 
 
 class RedactedTorrentSerializer(serializers.ModelSerializer):
+    info_hash = InfoHashSerializerField()
+
     class Meta:
         model = RedactedTorrent
         fields = '__all__'
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connection, OperationalError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from Harvest.utils import get_logger
+from task_queue.codec import encode_args
+from task_queue.history import prune_task_history
+from task_queue.models import AsyncTask, WorkerMetrics
+from task_queue.scheduler import QueueScheduler
+from task_queue.task_queue import TaskQueue
+
+logger = get_logger(__name__)
+
+BENCH_QUEUE = 'bench'
+BENCH_WORKER_PREFIX = 'bench-'
+# A database whose name contains one of these is considered safe to benchmark against
+SCRATCH_DATABASE_MARKERS = ('test', 'bench', 'scratch', 'memory')
+
+
+@TaskQueue.async_task(queue=BENCH_QUEUE)
+def bench_task(value):
+    pass
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds else None
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def percentile(fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    return {
+        'min': values[0],
+        'mean': statistics.mean(values),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': values[-1],
+    }
+
+
+def is_scratch_database():
+    """Whether the database looks like one set up for tests or benchmarks, judging by its name.
+
+    The latency benchmark runs a scheduler and the maintenance one prunes all finished tasks past the history cutoff,
+    neither should happen against a live database by accident.
+    """
+
+    name = os.path.basename(connection.settings_dict['NAME'] or '').lower()
+    return any(marker in name for marker in SCRATCH_DATABASE_MARKERS)
+
+
+def cleanup():
+    AsyncTask.objects.filter(queue=BENCH_QUEUE).delete()
+    WorkerMetrics.objects.filter(worker_id__startswith=BENCH_WORKER_PREFIX).delete()
+
+
+def _get_database_version():
+    if connection.vendor == 'postgresql':
+        connection.ensure_connection()
+        return str(connection.pg_version)
+    elif connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version
+    return None
+
+
+def get_environment():
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'database_vendor': connection.vendor,
+        'database_version': _get_database_version(),
+        'python_version': platform.python_version(),
+        'django_version': django.get_version(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def bench_enqueue(num_tasks):
+    start = time.time()
+    for i in range(num_tasks):
+        bench_task.delay(i)
+    single_seconds = time.time() - start
+    cleanup()
+
+    start = time.time()
+    bench_task.delay_many((i,) for i in range(num_tasks))
+    bulk_seconds = time.time() - start
+    cleanup()
+
+    return {
+        'tasks': num_tasks,
+        'single_seconds': single_seconds,
+        'single_per_second': _rate(num_tasks, single_seconds),
+        'bulk_seconds': bulk_seconds,
+        'bulk_per_second': _rate(num_tasks, bulk_seconds),
+    }
+
+
+def _run_claim_worker(worker_id, claim_batch_size, stats):
+    scheduler = QueueScheduler(worker_id=worker_id)
+    try:
+        while True:
+            try:
+                tasks = scheduler.fetch_async_tasks(BENCH_QUEUE, claim_batch_size)
+            except OperationalError:
+                # SQLite fails lock upgrades of concurrent transactions instead of waiting, count and retry those
+                stats['lock_errors'] += 1
+                time.sleep(0.001)
+                continue
+            if not tasks:
+                break
+            for async_task in tasks:
+                async_task.status = AsyncTask.STATUS_SUCCEEDED
+                async_task.completed_datetime = timezone.now()
+                scheduler.complete_async_task(async_task)
+    except Exception as exc:
+        logger.exception('Benchmark worker {} crashed.', worker_id)
+        stats['errors'].append(repr(exc))
+    finally:
+        connection.close()
+
+
+def bench_claim_complete(num_tasks, max_workers, claim_batch_size):
+    """Drain num_tasks tasks by claiming and completing them from 1..max_workers concurrent workers."""
+
+    results = []
+    for num_workers in range(1, max_workers + 1):
+        bench_task.delay_many((i,) for i in range(num_tasks))
+        stats = {'lock_errors': 0, 'errors': []}
+        threads = [
+            threading.Thread(
+                target=_run_claim_worker,
+                args=('{}claim-{}'.format(BENCH_WORKER_PREFIX, i), claim_batch_size, stats),
+            )
+            for i in range(num_workers)
+        ]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.time() - start
+
+        num_completed = AsyncTask.objects.filter(queue=BENCH_QUEUE, status=AsyncTask.STATUS_SUCCEEDED).count()
+        results.append({
+            'workers': num_workers,
+            'tasks': num_completed,
+            'seconds': seconds,
+            'per_second': _rate(num_completed, seconds),
+            'lock_errors': stats['lock_errors'],
+            'errors': stats['errors'],
+        })
+        cleanup()
+    return {'claim_batch_size': claim_batch_size, 'runs': results}
+
+
+def bench_latency(num_tasks, num_workers, interval):
+    """Run a scheduler and measure the time from delay() until each task starts executing."""
+
+    with tempfile.TemporaryDirectory() as temp_dir, override_settings(
+            TASK_QUEUE_QUEUES={BENCH_QUEUE: num_workers},
+            TASK_QUEUE_NOTIFY_SOCKET_DIR=temp_dir):
+        scheduler = QueueScheduler(worker_id=BENCH_WORKER_PREFIX + 'latency')
+        task_ids = []
+        errors = []
+
+        def enqueue():
+            try:
+                # Give the scheduler time to start listening
+                time.sleep(1)
+                for i in range(num_tasks):
+                    task_ids.append(bench_task.delay(i).id)
+                    time.sleep(interval)
+                deadline = time.time() + 30 + num_tasks * interval
+                while time.time() < deadline and AsyncTask.objects.filter(
+                        id__in=task_ids, completed_datetime__isnull=True).exists():
+                    time.sleep(0.1)
+            except Exception as exc:
+                logger.exception('Benchmark enqueue thread crashed.')
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+                event_loop.call_soon_threadsafe(scheduler._handle_shutdown_signal, 'benchmark done')
+
+        event_loop = asyncio.get_event_loop()
+        thread = threading.Thread(target=enqueue)
+        thread.start()
+        scheduler.run()
+        thread.join()
+
+    latencies = [
+        max(0.0, (started_datetime - created_datetime).total_seconds())
+        for created_datetime, started_datetime in AsyncTask.objects.filter(
+            id__in=task_ids, started_datetime__isnull=False).values_list('created_datetime', 'started_datetime')
+    ]
+    cleanup()
+    return {
+        'tasks': num_tasks,
+        'workers': num_workers,
+        'started': len(latencies),
+        'latency_seconds': _percentiles(latencies),
+        'errors': errors,
+    }
+
+
+def bench_maintenance(num_rows, insert_batch_size=10000):
+    """Time pruning num_rows finished tasks past the history cutoff, and claiming with that history present."""
+
+    created_datetime = timezone.now() - timedelta(days=settings.TASK_QUEUE_HISTORY_DAYS + 1)
+    args_data = encode_args((0,), {})
+    start = time.time()
+    for offset in range(0, num_rows, insert_batch_size):
+        AsyncTask.objects.bulk_create([
+            AsyncTask(
+                handler=bench_task.__module__ + '.' + bench_task.__name__,
+                queue=BENCH_QUEUE,
+                status=AsyncTask.STATUS_SUCCEEDED,
+                args_data=args_data,
+                created_datetime=created_datetime,
+                started_datetime=created_datetime,
+                completed_datetime=created_datetime,
+                attempts=1,
+            )
+            for _ in range(min(insert_batch_size, num_rows - offset))
+        ])
+    insert_seconds = time.time() - start
+
+    bench_task.delay(0)
+    scheduler = QueueScheduler(worker_id=BENCH_WORKER_PREFIX + 'maintenance')
+    start = time.time()
+    scheduler.fetch_async_tasks(BENCH_QUEUE, 1)
+    claim_seconds = time.time() - start
+
+    start = time.time()
+    num_pruned = prune_task_history(
+        cutoff=timezone.now() - timedelta(days=settings.TASK_QUEUE_HISTORY_DAYS),
+        chunk_size=settings.TASK_QUEUE_PRUNE_CHUNK_SIZE,
+        archive=settings.TASK_QUEUE_ARCHIVE_HISTORY,
+    )
+    prune_seconds = time.time() - start
+    cleanup()
+
+    return {
+        'rows': num_rows,
+        'insert_seconds': insert_seconds,
+        'claim_with_history_seconds': claim_seconds,
+        'pruned': num_pruned,
+        'prune_seconds': prune_seconds,
+        'prune_per_second': _rate(num_pruned, prune_seconds),
+        'chunk_size': settings.TASK_QUEUE_PRUNE_CHUNK_SIZE,
+        'archive': settings.TASK_QUEUE_ARCHIVE_HISTORY,
+    }
@@ -0,0 +1,112 @@
+"""Compact, versioned encoding for task payloads (arguments and results).
+
+Payloads are a version byte followed by JSON. Values JSON can't represent natively are encoded through a registry of
+custom types as {"__type__": name, "value": ...}. Dicts that have a "__type__" key of their own are escaped as a list
+of their items. Unlike pickle, decoding never executes code, so it's safe when several nodes share the queue. Tuples
+come back as lists.
+
+Version 2 added the escaping of dicts, version 1 payloads are still decoded.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+CODEC_VERSION = 2
+DECODED_VERSIONS = {1, 2}
+
+TYPE_KEY = '__type__'
+VALUE_KEY = 'value'
+# Type name of escaped dicts, encoded as a list of [key, value] items so that decoding doesn't mistake them for tagged
+# values
+DICT_TYPE = 'dict'
+
+
+class TaskCodecException(Exception):
+    pass
+
+
+class _CustomType:
+    def __init__(self, cls, name, encode, decode):
+        self.cls = cls
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+_types_by_class = {}
+_types_by_name = {}
+
+
+def register_type(cls, name, encode, decode):
+    """Register a custom type. encode turns an instance into JSON-able data, decode does the opposite."""
+
+    custom_type = _CustomType(cls, name, encode, decode)
+    _types_by_class[cls] = custom_type
+    _types_by_name[name] = custom_type
+
+
+def _escape(value):
+    if isinstance(value, dict):
+        if TYPE_KEY in value:
+            return {TYPE_KEY: DICT_TYPE, VALUE_KEY: [[k, _escape(v)] for k, v in value.items()]}
+        return {k: _escape(v) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [_escape(v) for v in value]
+    return value
+
+
+def _default(obj):
+    custom_type = _types_by_class.get(type(obj))
+    if custom_type is None:
+        raise TypeError('Unable to encode {} in a task payload, register it with register_type.'.format(
+            type(obj).__name__))
+    return {TYPE_KEY: custom_type.name, VALUE_KEY: _escape(custom_type.encode(obj))}
+
+
+def _object_hook(obj):
+    type_name = obj.get(TYPE_KEY)
+    if type_name is None:
+        return obj
+    try:
+        return _types_by_name[type_name].decode(obj[VALUE_KEY])
+    except KeyError:
+        raise TaskCodecException('Unknown type {} in task payload.'.format(type_name))
+
+
+def encode_value(value):
+    try:
+        data = json.dumps(_escape(value), default=_default, separators=(',', ':'), ensure_ascii=False)
+    except (TypeError, ValueError) as exc:
+        raise TaskCodecException(str(exc)) from exc
+    return bytes([CODEC_VERSION]) + data.encode()
+
+
+def decode_value(payload):
+    payload = bytes(payload)
+    if not payload:
+        raise TaskCodecException('Empty task payload.')
+    if payload[0] not in DECODED_VERSIONS:
+        raise TaskCodecException('Unsupported task payload version {}.'.format(payload[0]))
+    return json.loads(payload[1:].decode(), object_hook=_object_hook)
+
+
+def encode_args(args, kwargs):
+    return encode_value({'args': args, 'kwargs': kwargs})
+
+
+def decode_args(payload):
+    return decode_value(payload)
+
+
+# fromisoformat keeps naive datetimes naive, they have no offset in their isoformat()
+register_type(datetime, 'datetime', lambda v: v.isoformat(), datetime.fromisoformat)
+register_type(date, 'date', lambda v: v.isoformat(), date.fromisoformat)
+register_type(dict, DICT_TYPE, lambda v: list(v.items()), dict)
+register_type(timedelta, 'timedelta', lambda v: v.total_seconds(), lambda v: timedelta(seconds=v))
+register_type(Decimal, 'decimal', str, Decimal)
+register_type(uuid.UUID, 'uuid', str, uuid.UUID)
+register_type(bytes, 'bytes', lambda v: base64.b64encode(v).decode(), base64.b64decode)
+register_type(set, 'set', list, set)
+register_type(frozenset, 'frozenset', list, frozenset)
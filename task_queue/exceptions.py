@@ -0,0 +1,10 @@
+class TaskTimeoutException(Exception):
+    pass
+
+
+class RetryTaskException(Exception):
+    """Raised by a handler to reschedule its task after countdown seconds, without holding a worker in sleep()."""
+
+    def __init__(self, countdown, message=None):
+        super().__init__(message or 'Retry in {} seconds.'.format(countdown))
+        self.countdown = countdown
@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from Harvest.utils import get_logger
+from task_queue.models import AsyncTask, AsyncTaskDailyStats
+
+logger = get_logger(__name__)
+
+FINISHED_STATUSES = (AsyncTask.STATUS_SUCCEEDED, AsyncTask.STATUS_ERRORED, AsyncTask.STATUS_TIMED_OUT)
+
+_CHUNK_FIELDS = ('id', 'created_datetime', 'handler', 'queue', 'status', 'attempts', 'not_before',
+                 'started_datetime', 'completed_datetime')
+
+
+def _aggregate_chunk(rows):
+    stats = defaultdict(lambda: {'count': 0, 'attempts': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0})
+    for row in rows:
+        key = (timezone.localtime(row['created_datetime']).date(), row['handler'], row['queue'], row['status'])
+        key_stats = stats[key]
+        key_stats['count'] += 1
+        key_stats['attempts'] += row['attempts']
+        if row['started_datetime']:
+            queued_datetime = max(filter(None, (row['created_datetime'], row['not_before'])))
+            key_stats['wait_seconds'] += max(0.0, (row['started_datetime'] - queued_datetime).total_seconds())
+            if row['completed_datetime']:
+                key_stats['run_seconds'] += (row['completed_datetime'] - row['started_datetime']).total_seconds()
+    return stats
+
+
+def _save_daily_stats(stats):
+    for (date, handler, queue, status), values in stats.items():
+        stats_qs = AsyncTaskDailyStats.objects.filter(date=date, handler=handler, queue=queue, status=status)
+        increments = {field: F(field) + value for field, value in values.items()}
+        if stats_qs.update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                AsyncTaskDailyStats.objects.create(date=date, handler=handler, queue=queue, status=status, **values)
+        except IntegrityError:
+            # Created concurrently since the update above
+            stats_qs.update(**increments)
+
+
+def prune_task_history(cutoff, chunk_size, archive=False):
+    """Delete finished tasks created before cutoff, optionally folding them into AsyncTaskDailyStats.
+
+    Works through the (status, created_datetime) index in keyset order, one short transaction per chunk, so the
+    queue table is never locked for long and dead index entries of deleted chunks are not rescanned.
+    """
+
+    num_pruned = 0
+    for status in FINISHED_STATUSES:
+        position_q = Q()
+        while True:
+            with transaction.atomic():
+                rows = list(AsyncTask.objects.filter(
+                    position_q,
+                    status=status,
+                    created_datetime__lt=cutoff,
+                ).order_by('created_datetime', 'id').values(*_CHUNK_FIELDS)[:chunk_size])
+                if not rows:
+                    break
+                if archive:
+                    _save_daily_stats(_aggregate_chunk(rows))
+                AsyncTask.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            num_pruned += len(rows)
+            last = rows[-1]
+            position_q = (Q(created_datetime__gt=last['created_datetime']) |
+                          Q(created_datetime=last['created_datetime'], id__gt=last['id']))
+            if len(rows) < chunk_size:
+                break
+    if num_pruned:
+        logger.info('Pruned {} finished tasks created before {}.', num_pruned, cutoff)
+    return num_pruned
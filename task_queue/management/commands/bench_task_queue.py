@@ -0,0 +1,63 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from task_queue import benchmark
+
+BENCHMARKS = ('enqueue', 'claim', 'latency', 'maintenance')
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the task queue against the configured database (select it with DJANGO_DB) and print the '
+            'results as JSON. Uses the "bench" queue and removes its tasks afterwards, but the maintenance benchmark '
+            'prunes all finished tasks past TASK_QUEUE_HISTORY_DAYS. Refuses to run unless the database name contains '
+            'one of {} or --allow-destructive is given.'.format(', '.join(benchmark.SCRATCH_DATABASE_MARKERS)))
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                            help='Comma-separated subset of {}.'.format(', '.join(BENCHMARKS)))
+        parser.add_argument('--tasks', type=int, default=1000, help='Tasks enqueued/claimed per run.')
+        parser.add_argument('--max-workers', type=int, default=4, help='Claim with 1 up to this many workers.')
+        parser.add_argument('--claim-batch-size', type=int, default=settings.TASK_QUEUE_CLAIM_BATCH_SIZE)
+        parser.add_argument('--latency-tasks', type=int, default=200)
+        parser.add_argument('--latency-interval', type=float, default=0.01,
+                            help='Seconds between enqueues in the latency benchmark.')
+        parser.add_argument('--history-rows', type=int, default=1000000,
+                            help='Finished tasks to prune in the maintenance benchmark.')
+        parser.add_argument('--allow-destructive', action='store_true',
+                            help='Run even if the database doesn\'t look like a scratch one.')
+        parser.add_argument('--output', help='Write the results to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        selected = [b.strip() for b in options['benchmarks'].split(',') if b.strip()]
+        unknown = set(selected) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError('Unknown benchmarks: {}.'.format(', '.join(sorted(unknown))))
+        if not options['allow_destructive'] and not benchmark.is_scratch_database():
+            raise CommandError('{} doesn\'t look like a scratch database, pass --allow-destructive to benchmark it '
+                               'anyway.'.format(connection.settings_dict['NAME']))
+
+        benchmark.cleanup()
+        results = {'environment': benchmark.get_environment()}
+        try:
+            if 'enqueue' in selected:
+                results['enqueue'] = benchmark.bench_enqueue(options['tasks'])
+            if 'claim' in selected:
+                results['claim'] = benchmark.bench_claim_complete(
+                    options['tasks'], options['max_workers'], options['claim_batch_size'])
+            if 'latency' in selected:
+                results['latency'] = benchmark.bench_latency(
+                    options['latency_tasks'], settings.TASK_QUEUE_WORKERS, options['latency_interval'])
+            if 'maintenance' in selected:
+                results['maintenance'] = benchmark.bench_maintenance(options['history_rows'])
+        finally:
+            benchmark.cleanup()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
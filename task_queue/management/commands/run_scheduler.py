@@ -11,5 +11,8 @@ logger = get_logger(__name__)
 class Command(BaseCommand):
     help = "Run the queue consumer"
 
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', help='Unique identifier of this scheduler, defaults to hostname:pid.')
+
     def handle(self, *args, **options):
-        QueueScheduler().run()
+        QueueScheduler(worker_id=options['worker_id']).run()
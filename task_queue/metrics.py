@@ -0,0 +1,217 @@
+import math
+import time
+from collections import defaultdict
+
+# Upper bounds (in seconds) of the wait and run time histogram buckets. The last bucket catches everything else.
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, math.inf)
+
+OUTCOME_SUCCEEDED = 'succeeded'
+OUTCOME_ERRORED = 'errored'
+OUTCOME_TIMED_OUT = 'timed_out'
+OUTCOME_RETRIED = 'retried'
+OUTCOMES = (OUTCOME_SUCCEEDED, OUTCOME_ERRORED, OUTCOME_TIMED_OUT, OUTCOME_RETRIED)
+
+
+class Histogram:
+    def __init__(self, counts=None, total=0.0):
+        self.counts = list(counts) if counts else [0] * len(HISTOGRAM_BUCKETS)
+        self.total = total
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, value):
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations, None if there are none."""
+
+        target = fraction * self.count
+        if not target:
+            return None
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound if bound != math.inf else None
+        return None
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+        }
+
+    def to_dict(self):
+        return {'counts': self.counts, 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['counts'], data['total'])
+
+
+class HandlerMetrics:
+    def __init__(self):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.wait_time = Histogram()
+        self.run_time = Histogram()
+
+    def merge(self, other):
+        for outcome, count in other.outcomes.items():
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        self.wait_time.merge(other.wait_time)
+        self.run_time.merge(other.run_time)
+
+    def summary(self):
+        return {
+            'outcomes': self.outcomes,
+            'wait_time': self.wait_time.summary(),
+            'run_time': self.run_time.summary(),
+        }
+
+    def to_dict(self):
+        return {
+            'outcomes': self.outcomes,
+            'wait_time': self.wait_time.to_dict(),
+            'run_time': self.run_time.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        metrics.outcomes.update(data['outcomes'])
+        metrics.wait_time = Histogram.from_dict(data['wait_time'])
+        metrics.run_time = Histogram.from_dict(data['run_time'])
+        return metrics
+
+
+class SchedulerMetrics:
+    """In-memory counters of a single scheduler. Snapshots are persisted by the scheduler on every heartbeat."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.handlers = defaultdict(HandlerMetrics)
+        # Total time executors in each queue spent running tasks
+        self.busy_seconds = defaultdict(float)
+
+    def record_task(self, handler, queue, outcome, run_time, wait_time=None):
+        """queue is the queue whose worker ran the task, None for coroutine tasks that don't take a worker."""
+
+        handler_metrics = self.handlers[handler]
+        handler_metrics.outcomes[outcome] += 1
+        handler_metrics.run_time.observe(run_time)
+        if wait_time is not None:
+            handler_metrics.wait_time.observe(wait_time)
+        if queue is not None:
+            self.busy_seconds[queue] += run_time
+
+    def snapshot(self, executors):
+        """Serializable state, including executor counts from the scheduler's {queue: [QueueExecutor]}."""
+
+        return {
+            'started': self.started,
+            'uptime': time.time() - self.started,
+            'handlers': {handler: metrics.to_dict() for handler, metrics in self.handlers.items()},
+            'queues': {
+                queue: {
+                    'executors': len(queue_executors),
+                    'busy_executors': sum(1 for e in queue_executors if e.current is not None),
+                    'busy_seconds': self.busy_seconds.get(queue, 0.0),
+                }
+                for queue, queue_executors in executors.items()
+            },
+        }
+
+
+def get_queue_utilization(queue_data, uptime):
+    """Fraction of the available executor time spent running tasks since the scheduler started."""
+
+    available = queue_data['executors'] * uptime
+    if not available:
+        return None
+    return min(1.0, queue_data['busy_seconds'] / available)
+
+
+def merge_handler_metrics(snapshots):
+    merged = defaultdict(HandlerMetrics)
+    for snapshot in snapshots:
+        for handler, data in snapshot['handlers'].items():
+            merged[handler].merge(HandlerMetrics.from_dict(data))
+    return merged
+
+
+def _format_labels(labels):
+    return ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in labels.items())
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+def format_prometheus(queue_depths, worker_snapshots):
+    """Render metrics in the Prometheus text exposition format.
+
+    queue_depths is a list of dicts as returned by get_queue_depths(), worker_snapshots is a {worker_id: snapshot}
+    dict. Counters are per worker and reset when a scheduler restarts, which rate() handles.
+    """
+
+    lines = []
+
+    def metric(name, metric_type, help_text, samples):
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+        for suffix, labels, value in samples:
+            lines.append('{}{}{{{}}} {}'.format(name, suffix, _format_labels(labels), value))
+
+    metric('harvest_task_queue_depth', 'gauge', 'Number of tasks in the queue by state.', [
+        ('', {'queue': depth['queue'], 'state': state}, depth[state])
+        for depth in queue_depths for state in ('pending', 'delayed', 'executing')
+    ])
+    metric('harvest_task_queue_oldest_pending_seconds', 'gauge', 'Age of the oldest due pending task.', [
+        ('', {'queue': depth['queue']}, depth['oldest_pending_seconds'] or 0)
+        for depth in queue_depths
+    ])
+
+    executor_samples, busy_samples, busy_seconds_samples = [], [], []
+    task_samples, wait_samples, run_samples = [], [], []
+    for worker_id, snapshot in sorted(worker_snapshots.items()):
+        for queue, queue_data in sorted(snapshot['queues'].items()):
+            labels = {'worker': worker_id, 'queue': queue}
+            executor_samples.append(('', labels, queue_data['executors']))
+            busy_samples.append(('', labels, queue_data['busy_executors']))
+            busy_seconds_samples.append(('', labels, queue_data['busy_seconds']))
+        for handler, data in sorted(snapshot['handlers'].items()):
+            handler_metrics = HandlerMetrics.from_dict(data)
+            for outcome, count in sorted(handler_metrics.outcomes.items()):
+                task_samples.append(('', {'worker': worker_id, 'handler': handler, 'outcome': outcome}, count))
+            for histogram, samples in ((handler_metrics.wait_time, wait_samples),
+                                       (handler_metrics.run_time, run_samples)):
+                labels = {'worker': worker_id, 'handler': handler}
+                cumulative = 0
+                for bound, count in zip(HISTOGRAM_BUCKETS, histogram.counts):
+                    cumulative += count
+                    samples.append(('_bucket', dict(labels, le=_format_bound(bound)), cumulative))
+                samples.append(('_sum', labels, histogram.total))
+                samples.append(('_count', labels, histogram.count))
+
+    metric('harvest_task_queue_executors', 'gauge', 'Number of executors.', executor_samples)
+    metric('harvest_task_queue_busy_executors', 'gauge', 'Number of executors running a task.', busy_samples)
+    metric('harvest_task_queue_busy_seconds_total', 'counter', 'Time executors spent running tasks.',
+           busy_seconds_samples)
+    metric('harvest_task_queue_tasks_total', 'counter', 'Number of executed tasks by outcome.', task_samples)
+    metric('harvest_task_queue_wait_seconds', 'histogram', 'Time tasks waited before being claimed.', wait_samples)
+    metric('harvest_task_queue_run_seconds', 'histogram', 'Time tasks spent executing.', run_samples)
+    return '\n'.join(lines) + '\n'
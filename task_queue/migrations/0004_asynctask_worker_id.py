@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-17 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0003_auto_20190408_2107'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asynctask',
+            name='worker_id',
+            field=models.CharField(max_length=128, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.7 on 2026-10-17 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0004_asynctask_worker_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asynctask',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='asynctask',
+            name='lease_expires_datetime',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.1.7 on 2026-10-17 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0005_asynctask_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asynctask',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='asynctask',
+            name='queue',
+            field=models.CharField(default='default', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='asynctask',
+            index=models.Index(fields=['status', 'queue', '-priority', 'id'], name='task_queue_claim_idx'),
+        ),
+    ]
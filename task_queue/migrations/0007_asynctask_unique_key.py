@@ -0,0 +1,25 @@
+# Generated by Django 2.1.7 on 2026-10-17 05:56
+
+import Harvest.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0006_asynctask_queue_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asynctask',
+            name='unique_key',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='asynctask',
+            index=Harvest.indexes.PartialIndex(condition='status = 0 AND unique_key IS NOT NULL',
+                                               fields=['unique_key'], name='task_queue_pending_unique_key',
+                                               unique=True),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 2.1.7 on 2026-10-17 06:02
+
+import base64
+import json
+import pickle
+import traceback
+import uuid
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+from django.db import migrations
+from iso8601 import iso8601
+
+STATUS_PENDING = 0
+STATUS_ERRORED = 3
+CHUNK_SIZE = 1000
+
+# Frozen copy of version 1 of task_queue.codec, so that later changes to the codec don't change what this writes
+CODEC_VERSION = 1
+TYPE_KEY = '__type__'
+VALUE_KEY = 'value'
+ENCODERS = {
+    datetime: ('datetime', lambda v: v.isoformat()),
+    date: ('date', lambda v: v.isoformat()),
+    timedelta: ('timedelta', lambda v: v.total_seconds()),
+    Decimal: ('decimal', str),
+    uuid.UUID: ('uuid', str),
+    bytes: ('bytes', lambda v: base64.b64encode(v).decode()),
+    set: ('set', list),
+    frozenset: ('frozenset', list),
+}
+DECODERS = {
+    'datetime': iso8601.parse_date,
+    'date': lambda v: iso8601.parse_date(v).date(),
+    'timedelta': lambda v: timedelta(seconds=v),
+    'decimal': Decimal,
+    'uuid': uuid.UUID,
+    'bytes': base64.b64decode,
+    'set': set,
+    'frozenset': frozenset,
+}
+
+
+def _default(obj):
+    name, encode = ENCODERS[type(obj)]
+    return {TYPE_KEY: name, VALUE_KEY: encode(obj)}
+
+
+def _object_hook(obj):
+    if TYPE_KEY not in obj:
+        return obj
+    return DECODERS[obj[TYPE_KEY]](obj[VALUE_KEY])
+
+
+def encode_args(args, kwargs):
+    data = json.dumps({'args': args, 'kwargs': kwargs}, default=_default, separators=(',', ':'), ensure_ascii=False)
+    return bytes([CODEC_VERSION]) + data.encode()
+
+
+def decode_args(payload):
+    payload = bytes(payload)
+    if payload[0] != CODEC_VERSION:
+        raise ValueError('Unsupported task payload version {}.'.format(payload[0]))
+    return json.loads(payload[1:].decode(), object_hook=_object_hook)
+
+
+def convert_pickle_to_codec(apps, schema_editor):
+    AsyncTask = apps.get_model('task_queue', 'AsyncTask')
+    task_ids = list(AsyncTask.objects.order_by('id').values_list('id', flat=True))
+    for i in range(0, len(task_ids), CHUNK_SIZE):
+        for task in AsyncTask.objects.filter(id__in=task_ids[i:i + CHUNK_SIZE]):
+            try:
+                task_args = pickle.loads(bytes(task.args_data))
+                task.args_data = encode_args(task_args['args'], task_args['kwargs'])
+            except Exception:
+                task.args_data = encode_args((), {})
+                if task.status == STATUS_PENDING:
+                    task.status = STATUS_ERRORED
+                    task.traceback = 'Unable to convert pickled arguments:\n' + traceback.format_exc()
+            task.save(update_fields=('args_data', 'status', 'traceback'))
+
+
+def convert_codec_to_pickle(apps, schema_editor):
+    AsyncTask = apps.get_model('task_queue', 'AsyncTask')
+    for task in AsyncTask.objects.all().iterator():
+        task.args_data = pickle.dumps(decode_args(task.args_data))
+        task.save(update_fields=('args_data',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0007_asynctask_unique_key'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='asynctask',
+            old_name='args_pickle',
+            new_name='args_data',
+        ),
+        migrations.RunPython(convert_pickle_to_codec, convert_codec_to_pickle),
+    ]
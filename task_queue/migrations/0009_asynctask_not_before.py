@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0008_asynctask_args_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asynctask',
+            name='not_before',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
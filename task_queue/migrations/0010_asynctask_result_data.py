@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0009_asynctask_not_before'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asynctask',
+            name='result_data',
+            field=models.BinaryField(null=True),
+        ),
+    ]
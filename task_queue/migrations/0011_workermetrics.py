@@ -0,0 +1,22 @@
+# Generated by Django 2.1.7 on 2026-10-17 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0010_asynctask_result_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=128, unique=True)),
+                ('updated_datetime', models.DateTimeField(db_index=True)),
+                ('snapshot_json', models.TextField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.1.7 on 2026-10-17 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0011_workermetrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsyncTaskDailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('handler', models.CharField(max_length=128)),
+                ('queue', models.CharField(max_length=64)),
+                ('status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Executing'), (2, 'Succeeded'), (3, 'Errored'), (4, 'Timed Out')])),
+                ('count', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('wait_seconds', models.FloatField(default=0)),
+                ('run_seconds', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='asynctask',
+            index=models.Index(fields=['status', 'created_datetime'], name='task_queue_history_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='asynctaskdailystats',
+            unique_together={('date', 'handler', 'queue', 'status')},
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.7 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_queue', '0012_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodicTaskSchedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('handler', models.CharField(max_length=128, unique=True)),
+                ('interval_seconds', models.FloatField()),
+                ('last_run_datetime', models.DateTimeField(null=True)),
+                ('next_run_datetime', models.DateTimeField()),
+                ('worker_id', models.CharField(max_length=128, null=True)),
+                ('lease_expires_datetime', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
@@ -1,9 +1,16 @@
-import pickle
+import json
+from datetime import timedelta
 
 from django.db import models
+from django.db.models import Count, Min
 # Create your models here.
 from django.utils import timezone
 
+from Harvest.indexes import PartialIndex
+from task_queue.codec import decode_args, decode_value
+
+DEFAULT_QUEUE = 'default'
+
 
 class AsyncTask(models.Model):
     STATUS_PENDING = 0
@@ -19,14 +26,158 @@ class AsyncTask(models.Model):
         (STATUS_TIMED_OUT, 'Timed Out'),
     )
 
+    UNIQUE_KEY_MAX_LENGTH = 255
+
     status = models.IntegerField(db_index=True, choices=STATUS_CHOICES, default=STATUS_PENDING)
     handler = models.CharField(max_length=128)
-    args_pickle = models.BinaryField()
+    queue = models.CharField(max_length=64, default=DEFAULT_QUEUE)
+    priority = models.IntegerField(default=0)
+    # Arguments encoded with task_queue.codec
+    args_data = models.BinaryField()
     created_datetime = models.DateTimeField(default=timezone.now)
+    # The task is not claimed before this time. Used for delayed tasks and retries.
+    not_before = models.DateTimeField(null=True, db_index=True)
     started_datetime = models.DateTimeField(null=True)
     completed_datetime = models.DateTimeField(null=True)
     traceback = models.TextField(null=True)
+    # Return value of the handler encoded with task_queue.codec, if it returned anything
+    result_data = models.BinaryField(null=True)
+    # Identifier of the scheduler process that claimed the task, see QueueScheduler.worker_id
+    worker_id = models.CharField(max_length=128, null=True)
+    # Renewed by the worker while the task is executing. An expired lease means the worker is gone.
+    lease_expires_datetime = models.DateTimeField(null=True, db_index=True)
+    attempts = models.IntegerField(default=0)
+    # At most one pending task per key, enforced by a partial unique index
+    unique_key = models.CharField(max_length=UNIQUE_KEY_MAX_LENGTH, null=True)
+
+    class Meta:
+        indexes = [
+            # Used for claiming - pending tasks in a queue in priority order
+            models.Index(fields=['status', 'queue', '-priority', 'id'], name='task_queue_claim_idx'),
+            # Used for pruning finished tasks
+            models.Index(fields=['status', 'created_datetime'], name='task_queue_history_idx'),
+            PartialIndex(
+                fields=['unique_key'],
+                name='task_queue_pending_unique_key',
+                condition='status = 0 AND unique_key IS NOT NULL',
+                unique=True,
+            ),
+        ]
 
     @property
     def args(self):
-        return pickle.loads(bytes(self.args_pickle))
+        return decode_args(self.args_data)
+
+    @property
+    def result(self):
+        if self.result_data is None:
+            return None
+        return decode_value(self.result_data)
+
+    @property
+    def is_finished(self):
+        return self.status not in (self.STATUS_PENDING, self.STATUS_EXECUTING)
+
+
+def release_pending_unique_keys(tasks_qs):
+    """Drop the unique keys of tasks about to go back to pending if an identical task is already pending.
+
+    Otherwise the update would violate the partial unique index. The pending duplicate still coalesces new tasks.
+    """
+
+    tasks_qs.filter(
+        unique_key__in=AsyncTask.objects.filter(
+            status=AsyncTask.STATUS_PENDING,
+            unique_key__isnull=False,
+        ).values('unique_key'),
+    ).update(unique_key=None)
+
+
+class AsyncTaskDailyStats(models.Model):
+    """Aggregates of pruned tasks, kept when TASK_QUEUE_ARCHIVE_HISTORY is enabled."""
+
+    date = models.DateField()
+    handler = models.CharField(max_length=128)
+    queue = models.CharField(max_length=64)
+    status = models.IntegerField(choices=AsyncTask.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    # Sums over the tasks that were started/completed
+    wait_seconds = models.FloatField(default=0)
+    run_seconds = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = (('date', 'handler', 'queue', 'status'),)
+
+
+class PeriodicTaskSchedule(models.Model):
+    """Shared schedule of a periodic task. A lease ensures a single scheduler runs each tick."""
+
+    handler = models.CharField(max_length=128, unique=True)
+    # Current interval, which differs from the declared one while the task is backing off
+    interval_seconds = models.FloatField()
+    last_run_datetime = models.DateTimeField(null=True)
+    next_run_datetime = models.DateTimeField()
+    # Scheduler that is running the task, see AsyncTask.worker_id
+    worker_id = models.CharField(max_length=128, null=True)
+    lease_expires_datetime = models.DateTimeField(null=True)
+
+
+def get_queue_depths():
+    """Number of pending (due), delayed and executing tasks and the age of the oldest due task per queue."""
+
+    now = timezone.now()
+    depths = {}
+
+    def get_depth(queue):
+        return depths.setdefault(queue, {
+            'queue': queue,
+            'pending': 0,
+            'delayed': 0,
+            'executing': 0,
+            'oldest_pending_seconds': None,
+        })
+
+    pending_qs = AsyncTask.objects.filter(status=AsyncTask.STATUS_PENDING)
+    due_q = models.Q(not_before__isnull=True) | models.Q(not_before__lte=now)
+    for row in pending_qs.filter(due_q).values('queue').annotate(count=Count('id'), oldest=Min('created_datetime')):
+        depth = get_depth(row['queue'])
+        depth['pending'] = row['count']
+        depth['oldest_pending_seconds'] = max(0.0, (now - row['oldest']).total_seconds())
+    for row in pending_qs.exclude(due_q).values('queue').annotate(count=Count('id')):
+        get_depth(row['queue'])['delayed'] = row['count']
+    executing_qs = AsyncTask.objects.filter(status=AsyncTask.STATUS_EXECUTING)
+    for row in executing_qs.values('queue').annotate(count=Count('id')):
+        get_depth(row['queue'])['executing'] = row['count']
+    return [depths[queue] for queue in sorted(depths)]
+
+
+class WorkerMetrics(models.Model):
+    """Latest metrics snapshot of each scheduler, see task_queue.metrics.SchedulerMetrics."""
+
+    # Workers that haven't reported for this long are considered gone
+    STALE_AFTER = timedelta(days=1)
+
+    worker_id = models.CharField(max_length=128, unique=True)
+    updated_datetime = models.DateTimeField(db_index=True)
+    snapshot_json = models.TextField()
+
+    @property
+    def snapshot(self):
+        return json.loads(self.snapshot_json)
+
+    @classmethod
+    def save_snapshot(cls, worker_id, snapshot):
+        now = timezone.now()
+        values = {'updated_datetime': now, 'snapshot_json': json.dumps(snapshot)}
+        # Plain statements instead of update_or_create's locking transaction, a worker only ever writes its own row
+        if not cls.objects.filter(worker_id=worker_id).update(**values):
+            cls.objects.create(worker_id=worker_id, **values)
+        cls.objects.filter(updated_datetime__lt=now - cls.STALE_AFTER).delete()
+
+    @classmethod
+    def get_live_snapshots(cls, max_age):
+        return {
+            worker_metrics.worker_id: worker_metrics.snapshot
+            for worker_metrics in cls.objects.filter(updated_datetime__gte=timezone.now() - max_age)
+        }
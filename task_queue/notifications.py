@@ -0,0 +1,164 @@
+import os
+import socket
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from Harvest.utils import get_logger
+
+logger = get_logger(__name__)
+
+NOTIFY_CHANNEL = 'harvest_task_queue'
+
+
+def _get_socket_paths(socket_dir):
+    try:
+        names = os.listdir(socket_dir)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(socket_dir, name) for name in names if name.endswith('.sock')]
+
+
+def _send_socket_wakeup():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        for path in _get_socket_paths(settings.TASK_QUEUE_NOTIFY_SOCKET_DIR):
+            try:
+                sock.sendto(b'\0', path)
+            except OSError:
+                # Scheduler is gone or its buffer is full - either way it will pick the task on its next wakeup.
+                pass
+    finally:
+        sock.close()
+
+
+def notify_scheduler(using='default'):
+    """Wake up the scheduler(s) once the current transaction commits (or immediately in autocommit)."""
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        # NOTIFY is transactional - it's only delivered when the surrounding transaction commits.
+        with connection.cursor() as cursor:
+            cursor.execute('NOTIFY {}'.format(NOTIFY_CHANNEL))
+    else:
+        transaction.on_commit(_send_socket_wakeup, using=using)
+
+
+class PostgresListener:
+    """Listens for NOTIFY on a dedicated connection, outside of Django's connection management."""
+
+    def __init__(self, using='default'):
+        self.using = using
+        self.raw_connection = None
+
+    def start(self, event_loop, callback):
+        if self.raw_connection is not None:
+            return
+        connection = connections[self.using]
+        self.raw_connection = connection.get_new_connection(connection.get_connection_params())
+        self.raw_connection.autocommit = True
+        with self.raw_connection.cursor() as cursor:
+            cursor.execute('LISTEN {}'.format(NOTIFY_CHANNEL))
+        event_loop.add_reader(self.raw_connection.fileno(), self._on_readable, event_loop, callback)
+        logger.info('Listening for task notifications on {}.', NOTIFY_CHANNEL)
+
+    def _on_readable(self, event_loop, callback):
+        try:
+            self.raw_connection.poll()
+        except Exception:
+            logger.exception('Task notification connection failed, falling back to polling until reconnected.')
+            self.stop(event_loop)
+            return
+        if self.raw_connection.notifies:
+            del self.raw_connection.notifies[:]
+            callback()
+
+    def stop(self, event_loop):
+        if self.raw_connection is None:
+            return
+        try:
+            event_loop.remove_reader(self.raw_connection.fileno())
+            self.raw_connection.close()
+        except Exception:
+            pass
+        self.raw_connection = None
+
+
+class SocketListener:
+    """Local datagram socket fallback for backends without a notification mechanism (SQLite).
+
+    Every scheduler process binds its own socket in socket_dir and notifiers wake all of them, so that starting a
+    scheduler never takes the wakeups away from one that is already running.
+    """
+
+    def __init__(self, socket_dir):
+        self.socket_dir = socket_dir
+        self.path = None
+        self.sock = None
+
+    def _remove_stale_sockets(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            for path in _get_socket_paths(self.socket_dir):
+                try:
+                    sock.sendto(b'\0', path)
+                except ConnectionRefusedError:
+                    # Nothing is bound to it anymore, left behind by a scheduler that didn't stop cleanly
+                    logger.info('Removing stale task notification socket {}.', path)
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except OSError:
+                    pass
+        finally:
+            sock.close()
+
+    def start(self, event_loop, callback):
+        if self.sock is not None:
+            return
+        os.makedirs(self.socket_dir, exist_ok=True)
+        path = os.path.join(self.socket_dir, '{}.sock'.format(os.getpid()))
+        # Only ever ours, left behind by an earlier listener of this process or a dead one with the same pid
+        if os.path.exists(path):
+            os.unlink(path)
+        self._remove_stale_sockets()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sock.bind(path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.path = path
+        event_loop.add_reader(self.sock.fileno(), self._on_readable, callback)
+        logger.info('Listening for task notifications on {}.', self.path)
+
+    def _on_readable(self, callback):
+        try:
+            while True:
+                self.sock.recv(64)
+        except BlockingIOError:
+            pass
+        callback()
+
+    def stop(self, event_loop):
+        if self.sock is None:
+            return
+        event_loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        self.path = None
+
+
+def get_listener(using='default'):
+    if connections[using].vendor == 'postgresql':
+        return PostgresListener(using)
+    return SocketListener(settings.TASK_QUEUE_NOTIFY_SOCKET_DIR)
@@ -0,0 +1,93 @@
+import multiprocessing
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+from Harvest.utils import get_logger
+from task_queue.task_queue import TaskQueue
+
+logger = get_logger(__name__)
+
+# Seconds to wait for all worker processes to start
+START_TIMEOUT = 60
+
+_process_pool = None
+# Set in the worker processes, see _wait_for_siblings
+_start_barrier = None
+
+
+def _initialize_process(start_barrier):
+    global _start_barrier
+
+    _start_barrier = start_barrier
+    # Shutdown is coordinated by the scheduler, workers shouldn't react to the terminal's signals on their own.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # The inherited wakeup fd belongs to the scheduler's event loop
+    signal.set_wakeup_fd(-1)
+    if not apps.ready:
+        django.setup()
+    # Connections are closed before forking, this only guards against connections opened during setup.
+    connections.close_all()
+
+
+def _wait_for_siblings():
+    # Keeps this process busy until every worker process runs one of these, so the pool has to start all of them
+    _start_barrier.wait(START_TIMEOUT)
+
+
+def run_task_in_process(handler_str, args, kwargs):
+    task_info = TaskQueue.get_task_info(handler_str)
+    return task_info.handler(*args, **kwargs)
+
+
+def start_process_pool():
+    """Pre-fork the worker processes with Django already set up."""
+
+    global _process_pool
+
+    if _process_pool is not None:
+        return _process_pool
+
+    # Forked children must not share the parent's DB connections (sockets), so close them before forking.
+    connections.close_all()
+    num_processes = settings.TASK_QUEUE_PROCESS_POOL_SIZE
+    context = multiprocessing.get_context('fork')
+    # Inherited by the forked workers, synchronization primitives can't be pickled into a task
+    start_barrier = context.Barrier(num_processes)
+    _process_pool = ProcessPoolExecutor(num_processes, mp_context=context, initializer=_initialize_process,
+                                        initargs=(start_barrier,))
+    # Depending on the Python version and start method, a worker process is only started when a task is submitted and
+    # none is idle. Occupy all of them at once, so that none is forked later from a scheduler that has threads and open
+    # connections by then.
+    futures = [_process_pool.submit(_wait_for_siblings) for _ in range(num_processes)]
+    for future in futures:
+        future.result()
+    logger.info('Started task process pool with {} processes.', settings.TASK_QUEUE_PROCESS_POOL_SIZE)
+    return _process_pool
+
+
+def get_process_pool():
+    global _process_pool
+
+    if _process_pool is not None and getattr(_process_pool, '_broken', False):
+        logger.error('Task process pool is broken, a worker died. Restarting it.')
+        shutdown_process_pool(wait=False)
+    return start_process_pool()
+
+
+def shutdown_process_pool(wait=True):
+    global _process_pool
+
+    if _process_pool is None:
+        return
+    try:
+        _process_pool.shutdown(wait=wait)
+    except BrokenProcessPool:
+        pass
+    _process_pool = None
@@ -1,54 +1,161 @@
 import asyncio
+import math
+import os
+import random
 import signal
+import socket
 import time
 import traceback
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import chain
 
 from django.conf import settings
-from django.db import transaction, close_old_connections
+from django.db import transaction, close_old_connections, connection
+from django.db.models import F, Q, Min
 from django.utils import timezone
 
 from Harvest.utils import get_logger
-from task_queue.models import AsyncTask
-from task_queue.task_queue import TaskQueue
+from task_queue.codec import encode_value, TaskCodecException
+from task_queue.exceptions import TaskTimeoutException, RetryTaskException
+from task_queue.metrics import SchedulerMetrics, OUTCOME_SUCCEEDED, OUTCOME_ERRORED, OUTCOME_TIMED_OUT, \
+    OUTCOME_RETRIED
+from task_queue.models import AsyncTask, PeriodicTaskSchedule, WorkerMetrics, release_pending_unique_keys
+from task_queue.notifications import get_listener
+from task_queue.process_pool import get_process_pool, run_task_in_process, start_process_pool, \
+    shutdown_process_pool
+from task_queue.task_queue import TaskQueue, EXECUTOR_THREAD, EXECUTOR_PROCESS, EXECUTOR_LOOP, RUN_AGAIN
 
 logger = get_logger(__name__)
 
 
 class QueueExecutor:
+    # Whether the executor is one of the queue's workers, counted towards its utilization
+    uses_worker = True
+
     def __init__(self):
         self.executor = ThreadPoolExecutor(1)
         self.current = None
 
-    async def submit(self, fn, *args, **kwargs):
-        return await asyncio.wrap_future(self.executor.submit(fn, *args, **kwargs))
+    def _submit(self, task_info, args, kwargs):
+        if task_info.executor == EXECUTOR_PROCESS:
+            return get_process_pool().submit(run_task_in_process, task_info.handler_str, args, kwargs)
+        return self.executor.submit(task_info.handler, *args, **kwargs)
 
+    async def run_task(self, task_info, *args, **kwargs):
+        future = asyncio.wrap_future(self._submit(task_info, args, kwargs))
+        if task_info.timeout is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, task_info.timeout)
+        except asyncio.TimeoutError:
+            # A process pool worker can't be reclaimed individually - it is left to finish in the background.
+            if task_info.executor == EXECUTOR_THREAD:
+                self.abandon()
+            raise TaskTimeoutException('Task did not complete in {} seconds.'.format(task_info.timeout))
+
+    def abandon(self):
+        """Replace the worker thread, leaving a hung handler to finish (or not) in the background."""
+
+        logger.warning('Abandoning executor thread of a timed out task.')
+        self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(1)
+
+
+class LoopExecutor:
+    """Runs a coroutine handler directly on the scheduler's event loop, created for each execution."""
+
+    uses_worker = False
 
-class QueueScheduler:
     def __init__(self):
-        self.executors = [QueueExecutor() for _ in range(settings.TASK_QUEUE_WORKERS)]
+        self.current = None
+
+    async def run_task(self, task_info, *args, **kwargs):
+        if task_info.timeout is None:
+            return await task_info.handler(*args, **kwargs)
+        try:
+            return await asyncio.wait_for(task_info.handler(*args, **kwargs), task_info.timeout)
+        except asyncio.TimeoutError:
+            raise TaskTimeoutException('Task did not complete in {} seconds.'.format(task_info.timeout))
+
+
+def get_default_worker_id():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def get_next_run_datetime(scheduled_datetime, interval_seconds, now):
+    """Next run on the grid of scheduled_datetime + n * interval, so that execution time doesn't cause drift."""
+
+    elapsed = (now - scheduled_datetime).total_seconds()
+    num_intervals = max(1, math.floor(elapsed / interval_seconds) + 1)
+    return scheduled_datetime + timedelta(seconds=num_intervals * interval_seconds)
+
+
+class QueueScheduler:
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id or get_default_worker_id()
+        self.executors = {
+            queue: [QueueExecutor() for _ in range(num_workers)]
+            for queue, num_workers in settings.TASK_QUEUE_QUEUES.items()
+        }
         self.shutting_down = False
         self.pending_periodic_tasks = set()
         self.executing_periodic_tasks = set()
+        # Scheduled time of the claimed run of each periodic task, the next run is scheduled relative to it
+        self.periodic_task_scheduled_datetimes = {}
+        self.periodic_task_events = {}
+        self.executing_async_task_ids = set()
+        # Coroutine handlers don't take a worker, each handler is limited by its own concurrency instead
+        self.loop_tasks = defaultdict(set)
+        self.loop_async_tasks = [t for t in TaskQueue.async_tasks.values() if t.executor == EXECUTOR_LOOP]
+        self.listener = get_listener()
+        self.wakeup_event = None
+        self.metrics = SchedulerMetrics()
 
-    def _handle_shutdown_signal(self, sig_num, frame):
+    def _handle_shutdown_signal(self, sig_num):
         self.shutting_down = True
         logger.info('Shutting down due to signal {}.', sig_num)
+        self.wake()
+
+    def wake(self):
+        if self.wakeup_event is not None:
+            self.wakeup_event.set()
+
+    def _start_listener(self, event_loop):
+        try:
+            self.listener.start(event_loop, self.wake)
+        except Exception:
+            logger.exception('Unable to listen for task notifications, relying on polling.')
 
     async def execute_periodic_task(self, executor, task_info):
+        start = time.time()
+        result = None
         try:
             logger.info('Executing periodic task {}.', task_info.handler_str)
-            start = time.time()
-            await executor.submit(task_info.handler)
+            result = await executor.run_task(task_info)
             logger.info('Completed periodic task {} in {:.3f}.', task_info.handler_str, time.time() - start)
+            outcome = OUTCOME_SUCCEEDED
+        except TaskTimeoutException:
+            logger.exception('Periodic task {} timed out.', task_info.handler_str)
+            outcome = OUTCOME_TIMED_OUT
         except Exception:
             logger.exception('Exception in task {}.', task_info.handler_str)
+            outcome = OUTCOME_ERRORED
+        self.metrics.record_task(task_info.handler_str, task_info.queue if executor.uses_worker else None, outcome,
+                                 time.time() - start)
         self.executing_periodic_tasks.remove(task_info)
+        try:
+            self.complete_periodic_task(task_info, result)
+        except Exception:
+            logger.exception('Unable to schedule the next run of periodic task {}.', task_info.handler_str)
         executor.current = None
         self.poll_tasks()
 
     async def execute_async_task(self, executor, async_task):
         self.poll_tasks()
+        retry_countdown = None
+        start = time.time()
         try:
             logger.info('Executing async task {}.', async_task.handler)
             try:
@@ -56,82 +163,460 @@ class QueueScheduler:
             except KeyError:
                 raise Exception('Unable to find task with key {}.'.format(async_task.handler))
             task_args = async_task.args
-            start = time.time()
-            await executor.submit(task_info.handler, *task_args['args'], **task_args['kwargs'])
-            async_task.status = AsyncTask.STATUS_SUCCEEDED
-            logger.info('Completed async task {} in {:.3f}.', async_task.handler, time.time() - start)
+            try:
+                result = await executor.run_task(task_info, *task_args['args'], **task_args['kwargs'])
+            except (TaskTimeoutException, RetryTaskException):
+                raise
+            except Exception as exc:
+                if not task_info.should_retry(exc, async_task.attempts):
+                    raise
+                retry_countdown = task_info.get_retry_delay(async_task.attempts)
+                async_task.traceback = traceback.format_exc()
+                logger.warning('Exception in task {}, retrying in {} seconds.', async_task.handler, retry_countdown)
+            else:
+                async_task.status = AsyncTask.STATUS_SUCCEEDED
+                async_task.result_data = self.encode_result(async_task, result)
+                logger.info('Completed async task {} in {:.3f}.', async_task.handler, time.time() - start)
+        except TaskTimeoutException:
+            async_task.status = AsyncTask.STATUS_TIMED_OUT
+            async_task.traceback = traceback.format_exc()
+            logger.error('Async task {} timed out.', async_task.handler)
+        except RetryTaskException as exc:
+            retry_countdown = exc.countdown
+            async_task.traceback = traceback.format_exc()
+            logger.info('Async task {} requested a retry in {} seconds.', async_task.handler, retry_countdown)
         except Exception:
             async_task.status = AsyncTask.STATUS_ERRORED
             async_task.traceback = traceback.format_exc()
             logger.exception('Exception in task {}.', async_task.handler)
-        async_task.completed_datetime = timezone.now()
-        async_task.save()
+        self.record_async_task_metrics(executor, async_task, retry_countdown is not None, time.time() - start)
+        if retry_countdown is None:
+            async_task.completed_datetime = timezone.now()
+            self.complete_async_task(async_task)
+        else:
+            self.retry_async_task(async_task, retry_countdown)
+        self.executing_async_task_ids.discard(async_task.id)
         executor.current = None
         self.poll_tasks()
 
+    def record_async_task_metrics(self, executor, async_task, retried, run_time):
+        if retried:
+            outcome = OUTCOME_RETRIED
+        else:
+            outcome = {
+                AsyncTask.STATUS_SUCCEEDED: OUTCOME_SUCCEEDED,
+                AsyncTask.STATUS_TIMED_OUT: OUTCOME_TIMED_OUT,
+            }.get(async_task.status, OUTCOME_ERRORED)
+        # Delayed tasks and retries only start waiting once they become due
+        queued_datetime = max(filter(None, (async_task.created_datetime, async_task.not_before)))
+        wait_time = max(0.0, (async_task.started_datetime - queued_datetime).total_seconds())
+        self.metrics.record_task(async_task.handler, async_task.queue if executor.uses_worker else None, outcome,
+                                 run_time, wait_time)
+
+    def save_metrics(self):
+        WorkerMetrics.save_snapshot(self.worker_id, self.metrics.snapshot(self.executors))
+
+    def encode_result(self, async_task, result):
+        if result is None:
+            return None
+        try:
+            return encode_value(result)
+        except TaskCodecException:
+            logger.exception('Unable to store the result of async task {}.', async_task.handler)
+            return None
+
+    def _owned_task_qs(self, async_task):
+        # Only write to the task if we still hold the lease, otherwise it was already requeued or timed out.
+        return AsyncTask.objects.filter(
+            id=async_task.id,
+            status=AsyncTask.STATUS_EXECUTING,
+            worker_id=self.worker_id,
+        )
+
+    def complete_async_task(self, async_task):
+        num_updated = self._owned_task_qs(async_task).update(
+            status=async_task.status,
+            completed_datetime=async_task.completed_datetime,
+            traceback=async_task.traceback,
+            result_data=async_task.result_data,
+            lease_expires_datetime=None,
+        )
+        if not num_updated:
+            logger.warning('Lost lease on async task {} ({}), discarding its result.',
+                           async_task.id, async_task.handler)
+
+    def retry_async_task(self, async_task, countdown):
+        task_qs = self._owned_task_qs(async_task)
+        release_pending_unique_keys(task_qs)
+        num_updated = task_qs.update(
+            status=AsyncTask.STATUS_PENDING,
+            not_before=timezone.now() + timedelta(seconds=countdown),
+            traceback=async_task.traceback,
+            worker_id=None,
+            started_datetime=None,
+            lease_expires_datetime=None,
+        )
+        if not num_updated:
+            logger.warning('Lost lease on async task {} ({}), not retrying.', async_task.id, async_task.handler)
+        # Recalculate the wakeup time, the retry might be due sooner than the next poll
+        self.wake()
+
     @transaction.atomic
-    def fetch_async_task(self):
-        next_task = AsyncTask.objects.filter(status=AsyncTask.STATUS_PENDING).select_for_update().first()
-        if next_task is None:
+    def fetch_async_tasks(self, queue, limit, handlers=None, exclude_handlers=None):
+        """Claim up to limit pending tasks from queue for this worker, highest priority first.
+
+        Uses FOR UPDATE SKIP LOCKED where supported, so that multiple schedulers (possibly on different hosts) claim
+        disjoint batches instead of serializing on the same rows. Elsewhere (SQLite) the tasks are claimed with a
+        single UPDATE, as SQLite fails a transaction's upgrade from a read to a write lock under concurrent writes
+        instead of waiting for it. The claiming UPDATE is conditional on the task still being pending either way.
+        """
+
+        pending_qs = AsyncTask.objects.filter(
+            Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()),
+            status=AsyncTask.STATUS_PENDING,
+            queue=queue,
+        ).order_by('-priority', 'id')
+        if handlers is not None:
+            pending_qs = pending_qs.filter(handler__in=handlers)
+        if exclude_handlers:
+            pending_qs = pending_qs.exclude(handler__in=exclude_handlers)
+        if connection.features.has_select_for_update_skip_locked:
+            task_ids = list(pending_qs.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            if not task_ids:
+                return []
+        else:
+            task_ids = pending_qs.values('id')[:limit]
+
+        started_datetime = timezone.now()
+        num_claimed = AsyncTask.objects.filter(id__in=task_ids, status=AsyncTask.STATUS_PENDING).update(
+            status=AsyncTask.STATUS_EXECUTING,
+            worker_id=self.worker_id,
+            started_datetime=started_datetime,
+            lease_expires_datetime=started_datetime + timedelta(seconds=settings.TASK_QUEUE_LEASE_SECONDS),
+            attempts=F('attempts') + 1,
+        )
+        if not num_claimed:
+            return []
+        return list(AsyncTask.objects.filter(
+            status=AsyncTask.STATUS_EXECUTING,
+            worker_id=self.worker_id,
+            started_datetime=started_datetime,
+        ).order_by('-priority', 'id'))
+
+    def pop_periodic_task(self, queue):
+        queue_tasks = [t for t in self.pending_periodic_tasks if t.queue == queue and t.executor != EXECUTOR_LOOP]
+        if not queue_tasks:
             raise KeyError()
-        next_task.status = AsyncTask.STATUS_EXECUTING
-        next_task.started_datetime = timezone.now()
-        next_task.save(update_fields=('status', 'started_datetime'))
-        return next_task
+        task_info = max(queue_tasks, key=lambda t: t.priority)
+        self.pending_periodic_tasks.remove(task_info)
+        return task_info
 
     def poll_tasks(self):
+        for queue, executors in self.executors.items():
+            try:
+                self.poll_queue(queue, executors)
+            except Exception:
+                # Tasks are picked up on the next poll, don't take down the task that triggered this one
+                logger.exception('Exception while polling queue {}.', queue)
+
+    def _start_loop_task(self, handler_str, coroutine):
+        handler_tasks = self.loop_tasks[handler_str]
+        future = asyncio.ensure_future(coroutine)
+        handler_tasks.add(future)
+
+        def on_done(f):
+            handler_tasks.discard(f)
+            # A slot freed up for the handler
+            self.wake()
+
+        future.add_done_callback(on_done)
+
+    def poll_loop_tasks(self, queue):
+        for task_info in [t for t in self.pending_periodic_tasks if t.queue == queue and t.executor == EXECUTOR_LOOP]:
+            self.pending_periodic_tasks.remove(task_info)
+            self.executing_periodic_tasks.add(task_info)
+            self._start_loop_task(task_info.handler_str, self.execute_periodic_task(LoopExecutor(), task_info))
+
+        for task_info in self.loop_async_tasks:
+            if task_info.queue != queue:
+                continue
+            free_slots = task_info.concurrency - len(self.loop_tasks[task_info.handler_str])
+            if free_slots <= 0:
+                logger.debug('Coroutine task {} is at its concurrency limit.', task_info.handler_str)
+                continue
+            next_tasks = self.fetch_async_tasks(
+                queue, min(free_slots, settings.TASK_QUEUE_CLAIM_BATCH_SIZE), handlers=[task_info.handler_str])
+            for next_task in next_tasks:
+                self.executing_async_task_ids.add(next_task.id)
+                self._start_loop_task(task_info.handler_str, self.execute_async_task(LoopExecutor(), next_task))
+
+    def poll_queue(self, queue, executors):
+        if not self.shutting_down:
+            self.poll_loop_tasks(queue)
+
         while not self.shutting_down:
-            free_executors = [e for e in self.executors if e.current is None]
+            free_executors = [e for e in executors if e.current is None]
             if not free_executors:
-                logger.debug('No free executors')
+                logger.debug('No free executors in queue {}.', queue)
                 break
 
             try:
-                task_info = self.pending_periodic_tasks.pop()
+                task_info = self.pop_periodic_task(queue)
                 self.executing_periodic_tasks.add(task_info)
                 free_executors[0].current = asyncio.ensure_future(
                     self.execute_periodic_task(free_executors[0], task_info))
                 continue
             except KeyError:
-                logger.debug('No periodic tasks to be executed.')
+                logger.debug('No periodic tasks to be executed in queue {}.', queue)
 
-            try:
-                next_task = self.fetch_async_task()
-                free_executors[0].current = asyncio.ensure_future(
-                    self.execute_async_task(free_executors[0], next_task))
+            next_tasks = self.fetch_async_tasks(
+                queue, min(len(free_executors), settings.TASK_QUEUE_CLAIM_BATCH_SIZE),
+                exclude_handlers=[t.handler_str for t in self.loop_async_tasks])
+            if next_tasks:
+                for executor, next_task in zip(free_executors, next_tasks):
+                    self.executing_async_task_ids.add(next_task.id)
+                    executor.current = asyncio.ensure_future(self.execute_async_task(executor, next_task))
                 continue
-            except KeyError:
-                logger.debug('No async tasks to be executed.')
+            logger.debug('No async tasks to be executed in queue {}.', queue)
 
             break
 
+    def renew_leases(self):
+        lease_expires_datetime = timezone.now() + timedelta(seconds=settings.TASK_QUEUE_LEASE_SECONDS)
+        if self.periodic_task_scheduled_datetimes:
+            PeriodicTaskSchedule.objects.filter(worker_id=self.worker_id).update(
+                lease_expires_datetime=lease_expires_datetime)
+        if not self.executing_async_task_ids:
+            return
+        AsyncTask.objects.filter(
+            id__in=self.executing_async_task_ids,
+            status=AsyncTask.STATUS_EXECUTING,
+            worker_id=self.worker_id,
+        ).update(
+            lease_expires_datetime=lease_expires_datetime,
+        )
+
+    def reap_expired_leases(self):
+        """Recover tasks whose worker died (or hung without heartbeats) mid-execution.
+
+        Tasks are requeued until they reach their handler's maximum attempts (see AsyncTaskInfo.get_max_attempts),
+        after which they are marked as timed out.
+        """
+
+        now = timezone.now()
+        expired_qs = AsyncTask.objects.filter(
+            Q(lease_expires_datetime__lt=now) | Q(lease_expires_datetime__isnull=True),
+            status=AsyncTask.STATUS_EXECUTING,
+        )
+        requeue_q = Q(attempts__lt=settings.TASK_QUEUE_MAX_ATTEMPTS)
+        for task_info in TaskQueue.async_tasks.values():
+            max_attempts = task_info.get_max_attempts()
+            if max_attempts > settings.TASK_QUEUE_MAX_ATTEMPTS:
+                requeue_q |= Q(handler=task_info.handler_str, attempts__lt=max_attempts)
+        requeue_qs = expired_qs.filter(requeue_q)
+        release_pending_unique_keys(requeue_qs)
+        num_requeued = requeue_qs.update(
+            status=AsyncTask.STATUS_PENDING,
+            worker_id=None,
+            started_datetime=None,
+            lease_expires_datetime=None,
+        )
+        num_timed_out = expired_qs.update(
+            status=AsyncTask.STATUS_TIMED_OUT,
+            completed_datetime=now,
+            lease_expires_datetime=None,
+            traceback='Task lease expired on its last attempt.',
+        )
+        if num_requeued or num_timed_out:
+            logger.warning('Requeued {} and timed out {} tasks with expired leases.', num_requeued, num_timed_out)
+        if num_requeued:
+            self.wake()
+
+    def get_poll_timeout(self):
+        """Wait until the next poll or until the earliest delayed task becomes due, whichever is sooner."""
+
+        next_not_before = AsyncTask.objects.filter(
+            status=AsyncTask.STATUS_PENDING,
+            queue__in=self.executors.keys(),
+            not_before__gt=timezone.now(),
+        ).aggregate(Min('not_before'))['not_before__min']
+        if next_not_before is None:
+            return settings.TASK_QUEUE_POLL_INTERVAL
+        return min(settings.TASK_QUEUE_POLL_INTERVAL, (next_not_before - timezone.now()).total_seconds())
+
+    async def heartbeat(self):
+        # Keep renewing while shutting down, as executing tasks are still waited on
+        while not self.shutting_down or self.executing_async_task_ids or self.executing_periodic_tasks:
+            await asyncio.sleep(settings.TASK_QUEUE_HEARTBEAT_INTERVAL)
+            try:
+                self.renew_leases()
+                if not self.shutting_down:
+                    self.reap_expired_leases()
+            except Exception:
+                logger.exception('Exception while renewing task leases.')
+            try:
+                self.save_metrics()
+            except Exception:
+                logger.exception('Exception while saving task queue metrics.')
+
+    def sync_periodic_schedules(self):
+        """Create schedules for new periodic tasks and bring existing ones in line with changed intervals.
+
+        Schedules persist across restarts, so tasks don't all run at once when schedulers start.
+        """
+
+        now = timezone.now()
+        for task_info in TaskQueue.periodic_tasks.values():
+            schedule, created = PeriodicTaskSchedule.objects.get_or_create(
+                handler=task_info.handler_str,
+                defaults={
+                    'interval_seconds': task_info.interval_seconds,
+                    'next_run_datetime': now,
+                },
+            )
+            if created:
+                continue
+            if not task_info.interval_seconds <= schedule.interval_seconds <= task_info.max_interval_seconds:
+                schedule.interval_seconds = task_info.interval_seconds
+            schedule.next_run_datetime = min(
+                schedule.next_run_datetime, now + timedelta(seconds=schedule.interval_seconds))
+            schedule.save(update_fields=('interval_seconds', 'next_run_datetime'))
+
+    def claim_periodic_task(self, task_info):
+        """Schedule the task if it's due and no other scheduler holds its lease.
+
+        Returns the number of seconds until the task should be checked again.
+        """
+
+        schedule = PeriodicTaskSchedule.objects.get(handler=task_info.handler_str)
+        now = timezone.now()
+        jitter = random.uniform(0, settings.TASK_QUEUE_PERIODIC_JITTER * schedule.interval_seconds)
+        if schedule.next_run_datetime > now:
+            return (schedule.next_run_datetime - now).total_seconds() + jitter
+        if task_info in self.pending_periodic_tasks or task_info in self.executing_periodic_tasks:
+            logger.debug('Skipping executing periodic task {}', task_info.handler_str)
+            return schedule.interval_seconds + jitter
+
+        num_claimed = PeriodicTaskSchedule.objects.filter(
+            Q(worker_id__isnull=True) | Q(lease_expires_datetime__lt=now),
+            id=schedule.id,
+            next_run_datetime=schedule.next_run_datetime,
+        ).update(
+            worker_id=self.worker_id,
+            last_run_datetime=now,
+            lease_expires_datetime=now + timedelta(seconds=settings.TASK_QUEUE_LEASE_SECONDS),
+        )
+        if not num_claimed:
+            logger.debug('Periodic task {} is scheduled by another worker.', task_info.handler_str)
+            return schedule.interval_seconds + jitter
+
+        logger.debug('Scheduling periodic task {}.', task_info.handler_str)
+        self.periodic_task_scheduled_datetimes[task_info] = schedule.next_run_datetime
+        self.pending_periodic_tasks.add(task_info)
+        self.wake()
+        return schedule.interval_seconds + jitter
+
+    def complete_periodic_task(self, task_info, result):
+        """Release the lease and schedule the next run, taking the hint returned by the handler into account."""
+
+        scheduled_datetime = self.periodic_task_scheduled_datetimes.pop(task_info)
+        schedule_qs = PeriodicTaskSchedule.objects.filter(handler=task_info.handler_str, worker_id=self.worker_id)
+        try:
+            schedule = schedule_qs.get()
+        except PeriodicTaskSchedule.DoesNotExist:
+            logger.warning('Lost lease on periodic task {}.', task_info.handler_str)
+            return
+
+        now = timezone.now()
+        interval_seconds = task_info.get_next_interval(schedule.interval_seconds, result)
+        if interval_seconds != schedule.interval_seconds:
+            logger.debug('Interval of periodic task {} is now {} seconds.', task_info.handler_str, interval_seconds)
+        if result == RUN_AGAIN:
+            next_run_datetime = now
+        else:
+            next_run_datetime = get_next_run_datetime(scheduled_datetime, interval_seconds, now)
+        schedule_qs.update(
+            interval_seconds=interval_seconds,
+            next_run_datetime=next_run_datetime,
+            worker_id=None,
+            lease_expires_datetime=None,
+        )
+        if task_info in self.periodic_task_events:
+            self.periodic_task_events[task_info].set()
+
+    def release_periodic_tasks(self, task_infos):
+        for task_info in task_infos:
+            self.periodic_task_scheduled_datetimes.pop(task_info, None)
+        PeriodicTaskSchedule.objects.filter(
+            handler__in=[t.handler_str for t in task_infos],
+            worker_id=self.worker_id,
+        ).update(worker_id=None, lease_expires_datetime=None)
+
     async def periodic_task_tick(self, task_info):
+        # Set when the task completes, to pick up the new schedule
+        completed_event = self.periodic_task_events[task_info] = asyncio.Event()
         while not self.shutting_down:
-            if task_info in self.executing_periodic_tasks:
-                logger.debug('Skipping executing periodic task {}', task_info.handler_str)
-            else:
-                logger.debug('Scheduling periodic task {}.', task_info.handler_str)
-                self.pending_periodic_tasks.add(task_info)
-            await asyncio.sleep(task_info.interval_seconds)
+            try:
+                delay = self.claim_periodic_task(task_info)
+            except Exception:
+                logger.exception('Unable to schedule periodic task {}.', task_info.handler_str)
+                delay = task_info.interval_seconds
+            try:
+                await asyncio.wait_for(completed_event.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            completed_event.clear()
 
     async def loop(self):
-        signal.signal(signal.SIGINT, self._handle_shutdown_signal)
-        signal.signal(signal.SIGTERM, self._handle_shutdown_signal)
+        event_loop = asyncio.get_event_loop()
+        event_loop.add_signal_handler(signal.SIGINT, self._handle_shutdown_signal, signal.SIGINT)
+        event_loop.add_signal_handler(signal.SIGTERM, self._handle_shutdown_signal, signal.SIGTERM)
+        self.wakeup_event = asyncio.Event()
+
+        logger.info('Starting queue scheduler {} with queues {}.', self.worker_id, ', '.join(
+            '{} ({} workers)'.format(queue, len(executors)) for queue, executors in self.executors.items()))
+        for task_info in chain(TaskQueue.async_tasks.values(), TaskQueue.periodic_tasks.values()):
+            if task_info.queue not in self.executors:
+                logger.warning('Task {} uses queue {}, which has no workers configured in TASK_QUEUE_QUEUES.',
+                               task_info.handler_str, task_info.queue)
 
-        logger.info('Starting queue scheduler with {} workers.', len(self.executors))
+        # Fork the process pool before any task threads start running and touching DB connections
+        if any(t.executor == EXECUTOR_PROCESS for t in chain(
+                TaskQueue.async_tasks.values(), TaskQueue.periodic_tasks.values())):
+            start_process_pool()
 
+        self.sync_periodic_schedules()
         for periodic_task_info in TaskQueue.periodic_tasks.values():
-            asyncio.ensure_future(self.periodic_task_tick(periodic_task_info))
+            # Leave periodic tasks of other queues to the schedulers that run them
+            if periodic_task_info.queue in self.executors:
+                asyncio.ensure_future(self.periodic_task_tick(periodic_task_info))
+        asyncio.ensure_future(self.heartbeat())
 
+        # Tasks are picked up as soon as a notification arrives, the poll interval is only a safety net
         while not self.shutting_down:
+            self._start_listener(event_loop)
+            self.wakeup_event.clear()
             self.poll_tasks()
+            poll_timeout = self.get_poll_timeout()
             close_old_connections()
-            await asyncio.sleep(settings.TASK_QUEUE_POLL_INTERVAL)
+            try:
+                await asyncio.wait_for(self.wakeup_event.wait(), poll_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        self.listener.stop(event_loop)
+        # Let other schedulers run periodic tasks that were claimed, but never started
+        self.release_periodic_tasks(list(self.pending_periodic_tasks))
 
     def run(self):
         event_loop = asyncio.get_event_loop()
         event_loop.run_until_complete(self.loop())
-        for executor in self.executors:
+        for executor in chain.from_iterable(self.executors.values()):
             if executor.current:
                 event_loop.run_until_complete(executor.current)
+        loop_tasks = set(chain.from_iterable(self.loop_tasks.values()))
+        if loop_tasks:
+            event_loop.run_until_complete(asyncio.wait(loop_tasks))
+        shutdown_process_pool()
+        self.save_metrics()
         logger.info('Completed shutdown.')
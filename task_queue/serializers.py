@@ -0,0 +1,16 @@
+from rest_framework import serializers
+
+from task_queue.models import AsyncTask
+
+
+class AsyncTaskSerializer(serializers.ModelSerializer):
+    result = serializers.SerializerMethodField()
+    is_finished = serializers.BooleanField(read_only=True)
+
+    def get_result(self, obj):
+        return obj.result
+
+    class Meta:
+        model = AsyncTask
+        fields = ('id', 'handler', 'queue', 'status', 'created_datetime', 'started_datetime', 'completed_datetime',
+                  'attempts', 'traceback', 'is_finished', 'result')
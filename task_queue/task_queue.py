@@ -1,9 +1,27 @@
-import pickle
+import asyncio
+import hashlib
+from datetime import timedelta
 from functools import partial, wraps
 
-from django.db import close_old_connections
+from django.conf import settings
+from django.db import close_old_connections, transaction, IntegrityError
+from django.utils import timezone
 
-from task_queue.models import AsyncTask
+from task_queue.codec import encode_args
+from task_queue.models import AsyncTask, DEFAULT_QUEUE
+from task_queue.notifications import notify_scheduler
+
+EXECUTOR_THREAD = 'thread'
+EXECUTOR_PROCESS = 'process'
+EXECUTOR_LOOP = 'loop'
+
+DEFAULT_LOOP_CONCURRENCY = 10
+
+# Periodic task handlers can return these to adjust their schedule. RUN_AGAIN schedules the task again as soon as it
+# completes (e.g. there is more backlog to process), BACK_OFF doubles the interval up to max_interval_seconds (e.g.
+# there was nothing to do). Any other return value resets the interval.
+RUN_AGAIN = 'run_again'
+BACK_OFF = 'back_off'
 
 
 def db_decorator(fn):
@@ -17,16 +35,90 @@ def db_decorator(fn):
     return inner
 
 
+async def run_sync(fn, *args, **kwargs):
+    """Run blocking code (e.g. ORM queries) from a coroutine task handler without blocking the event loop."""
+
+    return await asyncio.get_event_loop().run_in_executor(None, partial(db_decorator(fn), *args, **kwargs))
+
+
 class AsyncTaskInfo:
-    def __init__(self, handler):
-        self.handler = db_decorator(handler)
+    def __init__(self, handler, timeout=None, queue=DEFAULT_QUEUE, priority=0, executor=None, concurrency=None,
+                 unique_key=None, retries=0, backoff=5, retry_on=(Exception,)):
+        if asyncio.iscoroutinefunction(handler):
+            if executor not in (None, EXECUTOR_LOOP):
+                raise ValueError('Coroutine task handlers can only run on the event loop.')
+            executor = EXECUTOR_LOOP
+            # Coroutines run directly on the scheduler's event loop and must not block it, see run_sync
+            self.handler = handler
+        else:
+            if executor is None:
+                executor = EXECUTOR_THREAD
+            if executor not in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+                raise ValueError('Unknown task executor {}.'.format(executor))
+            if concurrency is not None:
+                raise ValueError('Concurrency can only be limited for coroutine task handlers.')
+            self.handler = db_decorator(handler)
         self.handler_str = handler.__module__ + '.' + handler.__name__
+        # Seconds after which the task is marked as timed out and its worker slot is freed
+        self.timeout = timeout
+        # Name of the worker pool (see TASK_QUEUE_QUEUES) that executes the task
+        self.queue = queue
+        # Tasks with higher priority are claimed first within their queue
+        self.priority = priority
+        # Either a worker thread in the scheduler, or a pre-forked process for CPU-bound work that needs its own GIL.
+        # Coroutine handlers run on the scheduler's event loop instead, without taking a worker.
+        self.executor = executor
+        # Maximum number of instances of a coroutine handler in flight in a scheduler
+        self.concurrency = (concurrency or DEFAULT_LOOP_CONCURRENCY) if executor == EXECUTOR_LOOP else None
+        # True to coalesce pending tasks with identical arguments, or a function of the arguments returning a key
+        self.unique_key = unique_key
+        # Number of times a failed task is rescheduled. backoff is either the base of an exponential delay in seconds
+        # or a function of the attempt number returning the delay. Only exceptions in retry_on are retried.
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_on = retry_on
+
+    def get_retry_delay(self, attempt):
+        if callable(self.backoff):
+            return self.backoff(attempt)
+        return self.backoff * 2 ** (attempt - 1)
+
+    def should_retry(self, exc, attempt):
+        return attempt <= self.retries and isinstance(exc, self.retry_on)
+
+    def get_max_attempts(self):
+        """Attempts after which a task whose lease expired is timed out instead of requeued.
+
+        Retries count as attempts too, so a handler that declares more retries than TASK_QUEUE_MAX_ATTEMPTS allows
+        gets to use all of them.
+        """
+
+        return max(settings.TASK_QUEUE_MAX_ATTEMPTS, self.retries + 1)
+
+    def get_unique_key(self, args, kwargs):
+        if not self.unique_key:
+            return None
+        if self.unique_key is True:
+            key = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+        else:
+            key = str(self.unique_key(*args, **kwargs))
+        unique_key = '{}:{}'.format(self.handler_str, key)
+        if len(unique_key) > AsyncTask.UNIQUE_KEY_MAX_LENGTH:
+            unique_key = '{}:{}'.format(self.handler_str, hashlib.sha1(key.encode()).hexdigest())
+        return unique_key
 
 
 class PeriodicTaskInfo(AsyncTaskInfo):
-    def __init__(self, handler, interval_seconds):
-        super().__init__(handler)
+    def __init__(self, handler, interval_seconds, max_interval_seconds=None, **kwargs):
+        super().__init__(handler, **kwargs)
         self.interval_seconds = interval_seconds
+        # Upper bound of the interval when the handler returns BACK_OFF
+        self.max_interval_seconds = max_interval_seconds or interval_seconds
+
+    def get_next_interval(self, current_interval, result):
+        if result == BACK_OFF:
+            return min(current_interval * 2, self.max_interval_seconds)
+        return self.interval_seconds
 
 
 class _TaskQueue:
@@ -34,32 +126,124 @@ class _TaskQueue:
         self.async_tasks = {}
         self.periodic_tasks = {}
 
-    def async_task(self):
+    def async_task(self, **kwargs):
+        """Register an async task. See AsyncTaskInfo for the options."""
+
         def decorator(fn):
-            task_info = AsyncTaskInfo(fn)
+            task_info = AsyncTaskInfo(fn, **kwargs)
             self.async_tasks[task_info.handler_str] = task_info
             fn.delay = partial(self._execute_async, task_info)
+            fn.delay_many = partial(self._execute_async_many, task_info)
+            fn.apply_async = partial(self._apply_async, task_info)
             return fn
 
         return decorator
 
-    def periodic_task(self, interval_seconds):
+    def periodic_task(self, interval_seconds, **kwargs):
         def decorator(fn):
-            task_info = PeriodicTaskInfo(fn, interval_seconds)
+            task_info = PeriodicTaskInfo(fn, interval_seconds, **kwargs)
             self.periodic_tasks[task_info.handler_str] = task_info
             fn.delay = partial(self._execute_async, task_info)
             return fn
 
         return decorator
 
-    def _execute_async(self, task_info, *args, **kwargs):
-        AsyncTask.objects.create(
+    def get_task_info(self, handler_str):
+        try:
+            return self.async_tasks[handler_str]
+        except KeyError:
+            return self.periodic_tasks[handler_str]
+
+    def _create_unique_task(self, async_task):
+        # The partial unique index on pending unique keys arbitrates concurrent enqueues
+        while True:
+            try:
+                with transaction.atomic():
+                    async_task.save(force_insert=True)
+                    return async_task, True
+            except IntegrityError:
+                async_task.pk = None
+                try:
+                    return AsyncTask.objects.get(
+                        status=AsyncTask.STATUS_PENDING,
+                        unique_key=async_task.unique_key,
+                    ), False
+                except AsyncTask.DoesNotExist:
+                    # Claimed in the meantime, so it's no longer pending - try inserting again.
+                    continue
+
+    def _build_task(self, task_info, args, kwargs, not_before=None):
+        return AsyncTask(
             handler=task_info.handler_str,
-            args_pickle=pickle.dumps({
-                'args': args,
-                'kwargs': kwargs,
-            })
+            queue=task_info.queue,
+            priority=task_info.priority,
+            args_data=encode_args(args, kwargs),
+            unique_key=task_info.get_unique_key(args, kwargs),
+            not_before=not_before,
         )
 
+    def _execute_async(self, task_info, *args, **kwargs):
+        return self._enqueue(task_info, args, kwargs)
+
+    def _apply_async(self, task_info, args=(), kwargs=None, *, eta=None, countdown=None):
+        """Enqueue with options - eta (datetime) or countdown (seconds) delay the execution."""
+
+        if countdown is not None:
+            eta = timezone.now() + timedelta(seconds=countdown)
+        return self._enqueue(task_info, tuple(args), kwargs or {}, not_before=eta)
+
+    def _enqueue(self, task_info, args, kwargs, not_before=None):
+        async_task = self._build_task(task_info, args, kwargs, not_before)
+        if async_task.unique_key is None:
+            async_task.save(force_insert=True)
+            created = True
+        else:
+            async_task, created = self._create_unique_task(async_task)
+        if created:
+            notify_scheduler()
+        return async_task
+
+    def _execute_async_many(self, task_info, args_list):
+        """Enqueue one task per item of args_list (each a tuple of positional arguments) with a single bulk insert.
+
+        Returns the tasks that were created. Items coalesced into already pending tasks are skipped.
+        """
+
+        tasks = []
+        unique_keys = set()
+        for args in args_list:
+            async_task = self._build_task(task_info, tuple(args), {})
+            if async_task.unique_key is not None:
+                if async_task.unique_key in unique_keys:
+                    continue
+                unique_keys.add(async_task.unique_key)
+            tasks.append(async_task)
+
+        if unique_keys:
+            pending_keys = set(AsyncTask.objects.filter(
+                status=AsyncTask.STATUS_PENDING,
+                unique_key__in=unique_keys,
+            ).values_list('unique_key', flat=True))
+            tasks = [t for t in tasks if t.unique_key not in pending_keys]
+        if not tasks:
+            return []
+
+        try:
+            with transaction.atomic():
+                created_tasks = AsyncTask.objects.bulk_create(tasks)
+        except IntegrityError:
+            # Lost a race with a concurrent enqueue of the same unique key, insert one by one instead.
+            created_tasks = []
+            for async_task in tasks:
+                if async_task.unique_key is None:
+                    async_task.save(force_insert=True)
+                    created_tasks.append(async_task)
+                else:
+                    async_task, created = self._create_unique_task(async_task)
+                    if created:
+                        created_tasks.append(async_task)
+        notify_scheduler()
+        return created_tasks
+
 
 TaskQueue = _TaskQueue()
@@ -1,11 +1,16 @@
 from datetime import timedelta
 
+from django.conf import settings
 from django.utils import timezone
 
-from task_queue.models import AsyncTask
+from task_queue.history import prune_task_history
 from task_queue.task_queue import TaskQueue
 
 
 @TaskQueue.periodic_task(3600)
 def task_queue_maintenance():
-    AsyncTask.objects.filter(created_datetime__lt=timezone.now() - timedelta(days=30)).delete()
+    prune_task_history(
+        cutoff=timezone.now() - timedelta(days=settings.TASK_QUEUE_HISTORY_DAYS),
+        chunk_size=settings.TASK_QUEUE_PRUNE_CHUNK_SIZE,
+        archive=settings.TASK_QUEUE_ARCHIVE_HISTORY,
+    )
@@ -0,0 +1,66 @@
+import asyncio
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from task_queue import benchmark
+from task_queue.models import AsyncTask, WorkerMetrics
+
+
+class BenchmarkTests(TestCase):
+    def test_enqueue(self):
+        results = benchmark.bench_enqueue(10)
+
+        self.assertEqual(results['tasks'], 10)
+        self.assertGreater(results['bulk_per_second'], 0)
+        self.assertFalse(AsyncTask.objects.exists())
+
+    def test_maintenance(self):
+        results = benchmark.bench_maintenance(25, insert_batch_size=10)
+
+        self.assertEqual(results['pruned'], 25)
+        self.assertFalse(AsyncTask.objects.exists())
+
+    def test_scratch_database(self):
+        for name, is_scratch in (('/srv/harvest/db.sqlite3', False), ('harvest', False),
+                                 ('/tmp/bench.sqlite3', True), ('test_harvest', True), (':memory:', True)):
+            with self.subTest(name=name), mock.patch.dict(connection.settings_dict, NAME=name):
+                self.assertEqual(benchmark.is_scratch_database(), is_scratch)
+
+    def test_command_refuses_live_database(self):
+        with mock.patch.object(benchmark, 'is_scratch_database', return_value=False), \
+                mock.patch.object(benchmark, 'bench_enqueue') as bench_enqueue:
+            with self.assertRaises(CommandError):
+                call_command('bench_task_queue', benchmarks='enqueue')
+            bench_enqueue.assert_not_called()
+
+
+    def test_command_rejects_unknown_benchmark(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown benchmarks: nope.'):
+            call_command('bench_task_queue', benchmarks='enqueue,nope')
+
+
+# The benchmarks claim and run tasks from other threads, which need to see the committed tasks
+class ConcurrentBenchmarkTests(TransactionTestCase):
+    def test_claim_complete(self):
+        # A single worker, the shared cache of SQLite's in-memory test database fails concurrent writes right away
+        results = benchmark.bench_claim_complete(20, max_workers=1, claim_batch_size=4)
+
+        self.assertEqual(len(results['runs']), 1)
+        self.assertEqual(results['runs'][0]['tasks'], 20)
+        self.assertEqual(results['runs'][0]['errors'], [])
+        self.assertFalse(AsyncTask.objects.exists())
+
+    def test_latency(self):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.addCleanup(asyncio.get_event_loop().close)
+
+        results = benchmark.bench_latency(5, num_workers=1, interval=0.01)
+
+        # Not all of them, the enqueueing thread can hit the in-memory test database's shared cache lock and stop
+        self.assertGreater(results['started'], 0)
+        self.assertEqual(set(results['latency_seconds']), {'min', 'mean', 'p50', 'p95', 'p99', 'max'})
+        self.assertFalse(AsyncTask.objects.exists())
+        self.assertFalse(WorkerMetrics.objects.exists())
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from task_queue.codec import encode_args, decode_args, TaskCodecException, register_type, CODEC_VERSION
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+register_type(Point, 'test_point', lambda p: [p.x, p.y], lambda v: Point(*v))
+
+
+class CodecTests(SimpleTestCase):
+    def test_round_trip(self):
+        now = timezone.now()
+        payload = encode_args((1, 'a', b'\x00\xff', now), {
+            'delta': timedelta(seconds=5),
+            'amount': Decimal('1.50'),
+            'hashes': {'abc'},
+        })
+
+        self.assertEqual(payload[0], CODEC_VERSION)
+        self.assertEqual(decode_args(payload), {
+            'args': [1, 'a', b'\x00\xff', now],
+            'kwargs': {
+                'delta': timedelta(seconds=5),
+                'amount': Decimal('1.50'),
+                'hashes': {'abc'},
+            },
+        })
+
+    def test_registered_type(self):
+        point = decode_args(encode_args((Point(1, 2),), {}))['args'][0]
+        self.assertEqual((point.x, point.y), (1, 2))
+
+    def test_unknown_type(self):
+        with self.assertRaises(TaskCodecException):
+            encode_args((object(),), {})
+
+    def test_unknown_version(self):
+        with self.assertRaises(TaskCodecException):
+            decode_args(b'\xff{}')
+
+    def test_aware_datetime(self):
+        value = datetime(2019, 4, 8, 12, 30, tzinfo=timezone.utc)
+        self.assertEqual(decode_args(encode_args((value,), {}))['args'][0], value)
+
+    def test_naive_datetime(self):
+        value = datetime(2019, 4, 8, 12, 30)
+        decoded = decode_args(encode_args((value,), {}))['args'][0]
+
+        self.assertIsNone(decoded.tzinfo)
+        self.assertEqual(decoded, value)
+
+    def test_datetime_offset(self):
+        value = datetime(2019, 4, 8, 12, 30, tzinfo=dt_timezone(timedelta(hours=2)))
+        decoded = decode_args(encode_args((value,), {}))['args'][0]
+
+        self.assertEqual(decoded.utcoffset(), timedelta(hours=2))
+        self.assertEqual(decoded, value)
+
+    def test_dict_with_type_key(self):
+        value = {'__type__': 'datetime', 'value': 'not a datetime', 'nested': [{'__type__': 'set'}]}
+
+        self.assertEqual(decode_args(encode_args((value,), {'other': {'__type__': None}})), {
+            'args': [value],
+            'kwargs': {'other': {'__type__': None}},
+        })
+
+    def test_version_1(self):
+        payload = b'\x01{"args":[{"__type__":"datetime","value":"2019-04-08T12:30:00+00:00"}],"kwargs":{}}'
+
+        self.assertEqual(decode_args(payload), {
+            'args': [datetime(2019, 4, 8, 12, 30, tzinfo=timezone.utc)],
+            'kwargs': {},
+        })
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from task_queue.codec import encode_args
+from task_queue.history import prune_task_history
+from task_queue.models import AsyncTask, AsyncTaskDailyStats
+
+
+def create_task(status, age_days, handler='history.task'):
+    created_datetime = timezone.now() - timedelta(days=age_days)
+    return AsyncTask.objects.create(
+        handler=handler,
+        status=status,
+        args_data=encode_args((), {}),
+        created_datetime=created_datetime,
+        started_datetime=created_datetime + timedelta(seconds=2),
+        completed_datetime=created_datetime + timedelta(seconds=5),
+        attempts=1,
+    )
+
+
+class PruneTaskHistoryTests(TestCase):
+    def test_prunes_old_finished_tasks_in_chunks(self):
+        for _ in range(5):
+            create_task(AsyncTask.STATUS_SUCCEEDED, 40)
+        create_task(AsyncTask.STATUS_ERRORED, 40)
+        recent = create_task(AsyncTask.STATUS_SUCCEEDED, 1)
+        pending = create_task(AsyncTask.STATUS_PENDING, 40)
+
+        num_pruned = prune_task_history(timezone.now() - timedelta(days=30), chunk_size=2)
+
+        self.assertEqual(num_pruned, 6)
+        self.assertEqual(set(AsyncTask.objects.values_list('id', flat=True)), {recent.id, pending.id})
+        self.assertFalse(AsyncTaskDailyStats.objects.exists())
+
+    def test_archive(self):
+        for _ in range(3):
+            create_task(AsyncTask.STATUS_SUCCEEDED, 40)
+        create_task(AsyncTask.STATUS_ERRORED, 40)
+
+        prune_task_history(timezone.now() - timedelta(days=30), chunk_size=2, archive=True)
+
+        succeeded_stats = AsyncTaskDailyStats.objects.get(status=AsyncTask.STATUS_SUCCEEDED)
+        self.assertEqual(succeeded_stats.handler, 'history.task')
+        self.assertEqual(succeeded_stats.count, 3)
+        self.assertAlmostEqual(succeeded_stats.wait_seconds, 6)
+        self.assertAlmostEqual(succeeded_stats.run_seconds, 9)
+        self.assertEqual(AsyncTaskDailyStats.objects.get(status=AsyncTask.STATUS_ERRORED).count, 1)
+        self.assertFalse(AsyncTask.objects.exists())
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from task_queue.metrics import Histogram, OUTCOME_SUCCEEDED, OUTCOME_ERRORED
+from task_queue.models import WorkerMetrics, get_queue_depths
+from task_queue.scheduler import QueueScheduler
+from task_queue.task_queue import TaskQueue
+from task_queue.tests.test_scheduler import run_claimed_task
+
+
+@TaskQueue.async_task(queue='metrics_test')
+def metrics_test_task(fail):
+    if fail:
+        raise ValueError()
+
+
+class HistogramTests(TestCase):
+    def test_percentiles(self):
+        histogram = Histogram()
+        for value in [0.2] * 90 + [20] * 10:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.percentile(0.5), 0.25)
+        self.assertEqual(histogram.percentile(0.95), 30)
+        self.assertAlmostEqual(histogram.summary()['mean'], 2.18)
+
+    def test_empty(self):
+        self.assertIsNone(Histogram().percentile(0.5))
+
+
+class SchedulerMetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('user'))
+
+    def run_tasks(self):
+        metrics_test_task.delay(False)
+        metrics_test_task.delay(True)
+        scheduler = QueueScheduler(worker_id='worker-a')
+        for task in scheduler.fetch_async_tasks('metrics_test', 10):
+            run_claimed_task(scheduler, task)
+        scheduler.save_metrics()
+        return scheduler
+
+    def test_records_tasks(self):
+        scheduler = self.run_tasks()
+
+        handler_metrics = scheduler.metrics.handlers['task_queue.tests.test_metrics.metrics_test_task']
+        self.assertEqual(handler_metrics.outcomes[OUTCOME_SUCCEEDED], 1)
+        self.assertEqual(handler_metrics.outcomes[OUTCOME_ERRORED], 1)
+        self.assertEqual(handler_metrics.run_time.count, 2)
+        self.assertEqual(handler_metrics.wait_time.count, 2)
+        self.assertIn('worker-a', WorkerMetrics.get_live_snapshots(WorkerMetrics.STALE_AFTER))
+
+    def test_queue_depths(self):
+        metrics_test_task.delay(False)
+        metrics_test_task.apply_async(args=(False,), countdown=60)
+
+        depth, = get_queue_depths()
+        self.assertEqual(depth['queue'], 'metrics_test')
+        self.assertEqual((depth['pending'], depth['delayed'], depth['executing']), (1, 1, 0))
+
+    def test_api(self):
+        self.run_tasks()
+
+        data = self.client.get('/api/task-queue/metrics').data
+        handler_data = data['handlers']['task_queue.tests.test_metrics.metrics_test_task']
+        self.assertEqual(handler_data['run_time']['count'], 2)
+        self.assertEqual(data['workers'][0]['worker_id'], 'worker-a')
+
+    def test_prometheus(self):
+        self.run_tasks()
+
+        response = self.client.get('/api/task-queue/metrics/prometheus')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'harvest_task_queue_tasks_total{worker="worker-a",'
+            'handler="task_queue.tests.test_metrics.metrics_test_task",outcome="errored"} 1',
+            response.content.decode(),
+        )
+        self.assertIn('le="+Inf"', response.content.decode())
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import socket
+import tempfile
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+
+from task_queue.models import AsyncTask
+from task_queue.notifications import SocketListener
+from task_queue.task_queue import TaskQueue
+
+
+@TaskQueue.async_task()
+def noop_task():
+    pass
+
+
+class SocketNotificationTests(TransactionTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_dir = self.temp_dir.name
+        self.event_loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.event_loop.close()
+        self.temp_dir.cleanup()
+
+    def test_delay_wakes_listener(self):
+        listener = SocketListener(self.socket_dir)
+
+        async def delay_and_wait():
+            # Created in the running loop, Event's loop argument is deprecated
+            woken = asyncio.Event()
+            listener.start(self.event_loop, woken.set)
+            try:
+                with override_settings(TASK_QUEUE_NOTIFY_SOCKET_DIR=self.socket_dir):
+                    noop_task.delay()
+                await asyncio.wait_for(woken.wait(), 5)
+            finally:
+                listener.stop(self.event_loop)
+
+        self.event_loop.run_until_complete(delay_and_wait())
+        self.assertEqual(AsyncTask.objects.filter(status=AsyncTask.STATUS_PENDING).count(), 1)
+        self.assertEqual(os.listdir(self.socket_dir), [])
+
+    def test_delay_without_listener(self):
+        with override_settings(TASK_QUEUE_NOTIFY_SOCKET_DIR=os.path.join(self.socket_dir, 'missing')):
+            noop_task.delay()
+        self.assertEqual(AsyncTask.objects.count(), 1)
+
+    def run_until(self, condition):
+        async def wait():
+            while not condition():
+                await asyncio.sleep(0.01)
+
+        async def wait_with_timeout():
+            await asyncio.wait_for(wait(), 5)
+
+        self.event_loop.run_until_complete(wait_with_timeout())
+
+    def start_listener(self, pid, wakeups):
+        listener = SocketListener(self.socket_dir)
+        with mock.patch('task_queue.notifications.os.getpid', return_value=pid):
+            listener.start(self.event_loop, lambda: wakeups.append(pid))
+        self.addCleanup(listener.stop, self.event_loop)
+        return listener
+
+    def test_delay_wakes_every_scheduler(self):
+        wakeups = []
+        self.start_listener(1, wakeups)
+        self.start_listener(2, wakeups)
+        # Starting a listener probes the existing sockets, don't count that
+        self.run_until(lambda: 1 in wakeups)
+        del wakeups[:]
+
+        with override_settings(TASK_QUEUE_NOTIFY_SOCKET_DIR=self.socket_dir):
+            noop_task.delay()
+
+        self.run_until(lambda: sorted(wakeups) == [1, 2])
+
+    def test_removes_stale_sockets(self):
+        stale_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        stale_sock.bind(os.path.join(self.socket_dir, '1.sock'))
+        stale_sock.close()
+
+        self.start_listener(2, [])
+
+        self.assertEqual(os.listdir(self.socket_dir), ['2.sock'])
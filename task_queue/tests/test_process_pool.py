@@ -0,0 +1,36 @@
+import asyncio
+import multiprocessing
+import os
+
+from django.test import SimpleTestCase, override_settings
+
+from task_queue.process_pool import shutdown_process_pool, start_process_pool
+from task_queue.scheduler import QueueExecutor
+from task_queue.task_queue import TaskQueue, EXECUTOR_PROCESS
+
+
+@TaskQueue.async_task(executor=EXECUTOR_PROCESS)
+def process_test_task(value):
+    return os.getpid(), value * 2
+
+
+@override_settings(TASK_QUEUE_PROCESS_POOL_SIZE=2)
+class ProcessPoolTests(SimpleTestCase):
+    def setUp(self):
+        start_process_pool()
+
+    def tearDown(self):
+        shutdown_process_pool()
+
+    def test_runs_in_separate_process(self):
+        task_info = TaskQueue.async_tasks['task_queue.tests.test_process_pool.process_test_task']
+        event_loop = asyncio.new_event_loop()
+        try:
+            pid, result = event_loop.run_until_complete(QueueExecutor().run_task(task_info, 21))
+        finally:
+            event_loop.close()
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(result, 42)
+
+    def test_starts_all_processes(self):
+        self.assertEqual(len(multiprocessing.active_children()), 2)
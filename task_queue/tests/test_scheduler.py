@@ -0,0 +1,389 @@
+import asyncio
+import time
+from datetime import date, timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from task_queue.codec import encode_args
+from task_queue.exceptions import RetryTaskException
+from task_queue.models import AsyncTask, PeriodicTaskSchedule
+from task_queue.scheduler import QueueScheduler, QueueExecutor
+from task_queue.task_queue import TaskQueue, PeriodicTaskInfo, RUN_AGAIN, BACK_OFF
+
+
+@TaskQueue.async_task()
+def scheduler_test_task():
+    pass
+
+
+@TaskQueue.async_task(queue='scheduler_test', priority=10)
+def scheduler_test_urgent_task():
+    pass
+
+
+@TaskQueue.async_task(timeout=0.1)
+def scheduler_test_hung_task():
+    time.sleep(0.5)
+
+
+@TaskQueue.async_task(retries=2, backoff=10, retry_on=(ValueError,))
+def scheduler_test_flaky_task(exception_class):
+    raise {'value': ValueError, 'type': TypeError}[exception_class]()
+
+
+@TaskQueue.async_task(retries=5)
+def scheduler_test_persistent_task():
+    pass
+
+
+@TaskQueue.async_task()
+def scheduler_test_throttled_task():
+    raise RetryTaskException(30)
+
+
+@TaskQueue.async_task(queue='loop_test', concurrency=2)
+async def scheduler_test_coroutine_task(value):
+    await asyncio.sleep(0.05)
+    return value
+
+
+@TaskQueue.async_task(queue='loop_test', timeout=0.05)
+async def scheduler_test_hung_coroutine_task():
+    await asyncio.sleep(1)
+
+
+@TaskQueue.async_task()
+def scheduler_test_result_task(value):
+    return {'doubled': value * 2, 'at': date(2019, 1, 1)}
+
+
+def run_claimed_task(scheduler, async_task):
+    event_loop = asyncio.new_event_loop()
+    try:
+        event_loop.run_until_complete(scheduler.execute_async_task(QueueExecutor(), async_task))
+    finally:
+        event_loop.close()
+    async_task.refresh_from_db()
+
+
+class FetchAsyncTasksTests(TestCase):
+    def test_claims_batch_in_order(self):
+        for _ in range(5):
+            scheduler_test_task.delay()
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        claimed = scheduler.fetch_async_tasks('default', 3)
+
+        self.assertEqual(len(claimed), 3)
+        self.assertEqual([t.id for t in claimed], sorted(t.id for t in claimed))
+        for task in claimed:
+            self.assertEqual(task.status, AsyncTask.STATUS_EXECUTING)
+            self.assertEqual(task.worker_id, 'worker-a')
+            self.assertIsNotNone(task.started_datetime)
+            self.assertIsNotNone(task.lease_expires_datetime)
+            self.assertEqual(task.attempts, 1)
+
+    def test_workers_claim_disjoint_tasks(self):
+        for _ in range(4):
+            scheduler_test_task.delay()
+
+        claimed_a = QueueScheduler(worker_id='worker-a').fetch_async_tasks('default', 3)
+        claimed_b = QueueScheduler(worker_id='worker-b').fetch_async_tasks('default', 3)
+
+        self.assertEqual(len(claimed_a), 3)
+        self.assertEqual(len(claimed_b), 1)
+        self.assertFalse({t.id for t in claimed_a} & {t.id for t in claimed_b})
+        self.assertEqual(QueueScheduler(worker_id='worker-c').fetch_async_tasks('default', 3), [])
+
+    def test_claims_by_queue_and_priority(self):
+        scheduler_test_task.delay()
+        low = scheduler_test_urgent_task.delay()
+        AsyncTask.objects.filter(id=low.id).update(priority=0)
+        high = scheduler_test_urgent_task.delay()
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        claimed = scheduler.fetch_async_tasks('scheduler_test', 3)
+
+        self.assertEqual([t.id for t in claimed], [high.id, low.id])
+        self.assertEqual(claimed[0].priority, 10)
+
+    def test_skips_delayed(self):
+        scheduler_test_task.apply_async(countdown=60)
+        due = scheduler_test_task.apply_async(eta=timezone.now() - timedelta(seconds=1))
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        claimed = scheduler.fetch_async_tasks('default', 10)
+
+        self.assertEqual([t.id for t in claimed], [due.id])
+        self.assertGreater(scheduler.get_poll_timeout(), 0)
+
+
+class RetryTests(TestCase):
+    def test_retries_with_backoff(self):
+        scheduler_test_flaky_task.delay('value')
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        for attempt in (1, 2):
+            task = scheduler.fetch_async_tasks('default', 1)[0]
+            start = timezone.now()
+            run_claimed_task(scheduler, task)
+            self.assertEqual(task.status, AsyncTask.STATUS_PENDING)
+            self.assertIn('ValueError', task.traceback)
+            self.assertAlmostEqual(
+                (task.not_before - start).total_seconds(), 10 * 2 ** (attempt - 1), delta=1)
+            AsyncTask.objects.filter(id=task.id).update(not_before=None)
+
+        task = scheduler.fetch_async_tasks('default', 1)[0]
+        run_claimed_task(scheduler, task)
+        self.assertEqual(task.status, AsyncTask.STATUS_ERRORED)
+        self.assertEqual(task.attempts, 3)
+
+    def test_does_not_retry_other_exceptions(self):
+        scheduler_test_flaky_task.delay('type')
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        task = scheduler.fetch_async_tasks('default', 1)[0]
+        run_claimed_task(scheduler, task)
+
+        self.assertEqual(task.status, AsyncTask.STATUS_ERRORED)
+
+    def test_retry_exception(self):
+        scheduler_test_throttled_task.delay()
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        task = scheduler.fetch_async_tasks('default', 1)[0]
+        run_claimed_task(scheduler, task)
+
+        self.assertEqual(task.status, AsyncTask.STATUS_PENDING)
+        self.assertGreater(task.not_before, timezone.now() + timedelta(seconds=25))
+        self.assertIsNone(task.worker_id)
+
+
+class LeaseTests(TestCase):
+    def _create_executing(self, attempts, lease_expires_datetime,
+                          handler='task_queue.tests.test_scheduler.scheduler_test_task'):
+        return AsyncTask.objects.create(
+            handler=handler,
+            args_data=encode_args((), {}),
+            status=AsyncTask.STATUS_EXECUTING,
+            worker_id='dead-worker',
+            attempts=attempts,
+            lease_expires_datetime=lease_expires_datetime,
+        )
+
+    @override_settings(TASK_QUEUE_MAX_ATTEMPTS=3)
+    def test_reap_expired_leases(self):
+        expired = timezone.now() - timedelta(seconds=1)
+        requeued = self._create_executing(1, expired)
+        timed_out = self._create_executing(3, expired)
+        alive = self._create_executing(1, timezone.now() + timedelta(minutes=1))
+
+        QueueScheduler(worker_id='worker-a').reap_expired_leases()
+
+        requeued.refresh_from_db()
+        self.assertEqual(requeued.status, AsyncTask.STATUS_PENDING)
+        self.assertIsNone(requeued.worker_id)
+        timed_out.refresh_from_db()
+        self.assertEqual(timed_out.status, AsyncTask.STATUS_TIMED_OUT)
+        self.assertIsNotNone(timed_out.completed_datetime)
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, AsyncTask.STATUS_EXECUTING)
+
+    @override_settings(TASK_QUEUE_MAX_ATTEMPTS=3)
+    def test_reap_expired_leases_with_retries(self):
+        expired = timezone.now() - timedelta(seconds=1)
+        handler = 'task_queue.tests.test_scheduler.scheduler_test_persistent_task'
+        # 5 retries allow 6 attempts, more than TASK_QUEUE_MAX_ATTEMPTS
+        requeued = self._create_executing(3, expired, handler)
+        timed_out = self._create_executing(6, expired, handler)
+
+        QueueScheduler(worker_id='worker-a').reap_expired_leases()
+
+        requeued.refresh_from_db()
+        self.assertEqual(requeued.status, AsyncTask.STATUS_PENDING)
+        timed_out.refresh_from_db()
+        self.assertEqual(timed_out.status, AsyncTask.STATUS_TIMED_OUT)
+
+    def test_renew_leases(self):
+        scheduler_test_task.delay()
+        scheduler = QueueScheduler(worker_id='worker-a')
+        task = scheduler.fetch_async_tasks('default', 1)[0]
+        scheduler.executing_async_task_ids.add(task.id)
+        AsyncTask.objects.filter(id=task.id).update(lease_expires_datetime=timezone.now())
+
+        scheduler.renew_leases()
+
+        task.refresh_from_db()
+        self.assertGreater(task.lease_expires_datetime, timezone.now() + timedelta(seconds=30))
+
+    def test_timeout_frees_executor(self):
+        scheduler_test_hung_task.delay()
+        scheduler = QueueScheduler(worker_id='worker-a')
+        task = scheduler.fetch_async_tasks('default', 1)[0]
+        executor = QueueExecutor()
+        hung_thread_pool = executor.executor
+
+        event_loop = asyncio.new_event_loop()
+        try:
+            event_loop.run_until_complete(scheduler.execute_async_task(executor, task))
+        finally:
+            event_loop.close()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, AsyncTask.STATUS_TIMED_OUT)
+        self.assertIsNone(task.lease_expires_datetime)
+        self.assertIsNot(executor.executor, hung_thread_pool)
+
+
+class ResultTests(TestCase):
+    def test_stores_result(self):
+        scheduler_test_result_task.delay(21)
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        task = scheduler.fetch_async_tasks('default', 1)[0]
+        run_claimed_task(scheduler, task)
+
+        self.assertEqual(task.status, AsyncTask.STATUS_SUCCEEDED)
+        self.assertTrue(task.is_finished)
+        self.assertEqual(task.result, {'doubled': 42, 'at': date(2019, 1, 1)})
+
+    def test_no_result(self):
+        scheduler_test_task.delay()
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        task = scheduler.fetch_async_tasks('default', 1)[0]
+        run_claimed_task(scheduler, task)
+
+        self.assertEqual(task.status, AsyncTask.STATUS_SUCCEEDED)
+        self.assertIsNone(task.result)
+
+
+@override_settings(TASK_QUEUE_QUEUES={'loop_test': 1})
+class LoopTaskTests(TestCase):
+    def poll_until_done(self, scheduler):
+        async def poll():
+            scheduler.wakeup_event = asyncio.Event()
+            max_in_flight = 0
+            while True:
+                scheduler.poll_tasks()
+                in_flight = set().union(*scheduler.loop_tasks.values())
+                max_in_flight = max(max_in_flight, len(in_flight))
+                if not in_flight:
+                    return max_in_flight
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+        event_loop = asyncio.new_event_loop()
+        try:
+            return event_loop.run_until_complete(poll())
+        finally:
+            event_loop.close()
+
+    def test_runs_with_concurrency_limit(self):
+        tasks = [scheduler_test_coroutine_task.delay(i) for i in range(5)]
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        self.assertEqual(self.poll_until_done(scheduler), 2)
+
+        for task in tasks:
+            task.refresh_from_db()
+            self.assertEqual(task.status, AsyncTask.STATUS_SUCCEEDED)
+        self.assertEqual([t.result for t in tasks], list(range(5)))
+        # The queue's worker was never taken
+        self.assertIsNone(scheduler.executors['loop_test'][0].current)
+
+    def test_timeout(self):
+        task = scheduler_test_hung_coroutine_task.delay()
+
+        self.poll_until_done(QueueScheduler(worker_id='worker-a'))
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, AsyncTask.STATUS_TIMED_OUT)
+
+    def test_not_claimed_by_workers(self):
+        scheduler_test_coroutine_task.delay(1)
+
+        tasks = QueueScheduler(worker_id='worker-a').fetch_async_tasks(
+            'loop_test', 10, exclude_handlers=['task_queue.tests.test_scheduler.scheduler_test_coroutine_task'])
+
+        self.assertEqual(tasks, [])
+
+
+def periodic_schedule_test_task():
+    pass
+
+
+class PeriodicTaskScheduleTests(TestCase):
+    def setUp(self):
+        self.task_info = PeriodicTaskInfo(periodic_schedule_test_task, 100, max_interval_seconds=300)
+        TaskQueue.periodic_tasks[self.task_info.handler_str] = self.task_info
+        QueueScheduler(worker_id='worker-a').sync_periodic_schedules()
+
+    def tearDown(self):
+        del TaskQueue.periodic_tasks[self.task_info.handler_str]
+
+    def get_schedule(self):
+        return PeriodicTaskSchedule.objects.get(handler=self.task_info.handler_str)
+
+    def run_tick(self, scheduler):
+        scheduler.claim_periodic_task(self.task_info)
+        if self.task_info not in scheduler.pending_periodic_tasks:
+            return False
+        scheduler.pending_periodic_tasks.remove(self.task_info)
+        return True
+
+    def test_single_worker_claims(self):
+        scheduler_a = QueueScheduler(worker_id='worker-a')
+        scheduler_b = QueueScheduler(worker_id='worker-b')
+
+        self.assertTrue(self.run_tick(scheduler_a))
+        self.assertFalse(self.run_tick(scheduler_b))
+        self.assertEqual(self.get_schedule().worker_id, 'worker-a')
+
+        scheduler_a.complete_periodic_task(self.task_info, None)
+        schedule = self.get_schedule()
+        self.assertIsNone(schedule.worker_id)
+        self.assertGreater(schedule.next_run_datetime, timezone.now() + timedelta(seconds=90))
+        self.assertFalse(self.run_tick(scheduler_b))
+
+    def test_expired_lease(self):
+        self.run_tick(QueueScheduler(worker_id='worker-a'))
+        PeriodicTaskSchedule.objects.update(lease_expires_datetime=timezone.now() - timedelta(seconds=1))
+
+        self.assertTrue(self.run_tick(QueueScheduler(worker_id='worker-b')))
+
+    def test_drift_free(self):
+        scheduled_datetime = timezone.now() - timedelta(seconds=250)
+        PeriodicTaskSchedule.objects.update(next_run_datetime=scheduled_datetime)
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        self.run_tick(scheduler)
+        scheduler.complete_periodic_task(self.task_info, None)
+
+        self.assertEqual(self.get_schedule().next_run_datetime, scheduled_datetime + timedelta(seconds=300))
+
+    def test_back_off(self):
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        for expected_interval in (200, 300, 300, 100):
+            PeriodicTaskSchedule.objects.update(next_run_datetime=timezone.now())
+            self.run_tick(scheduler)
+            scheduler.complete_periodic_task(self.task_info, None if expected_interval == 100 else BACK_OFF)
+            self.assertEqual(self.get_schedule().interval_seconds, expected_interval)
+
+    def test_run_again(self):
+        scheduler = QueueScheduler(worker_id='worker-a')
+
+        self.run_tick(scheduler)
+        scheduler.complete_periodic_task(self.task_info, RUN_AGAIN)
+
+        self.assertTrue(self.run_tick(scheduler))
+
+    def test_schedule_survives_restart(self):
+        next_run_datetime = timezone.now() + timedelta(seconds=50)
+        PeriodicTaskSchedule.objects.update(next_run_datetime=next_run_datetime)
+
+        QueueScheduler(worker_id='worker-b').sync_periodic_schedules()
+
+        self.assertEqual(self.get_schedule().next_run_datetime, next_run_datetime)
+        self.assertFalse(self.run_tick(QueueScheduler(worker_id='worker-b')))
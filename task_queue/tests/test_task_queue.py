@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from task_queue.models import AsyncTask
+from task_queue.scheduler import QueueScheduler
+from task_queue.task_queue import TaskQueue
+
+
+@TaskQueue.async_task(unique_key=True)
+def unique_test_task(value):
+    pass
+
+
+@TaskQueue.async_task()
+def bulk_test_task(value, other=None):
+    pass
+
+
+@TaskQueue.async_task(unique_key=lambda value, extra=None: value)
+def unique_by_value_test_task(value, extra=None):
+    pass
+
+
+class UniqueKeyTests(TestCase):
+    def test_coalesces_pending(self):
+        task_a = unique_test_task.delay(1)
+        task_b = unique_test_task.delay(1)
+        task_c = unique_test_task.delay(2)
+
+        self.assertEqual(task_a.id, task_b.id)
+        self.assertNotEqual(task_a.id, task_c.id)
+        self.assertEqual(AsyncTask.objects.count(), 2)
+
+    def test_key_function(self):
+        task_a = unique_by_value_test_task.delay(1, extra='a')
+        task_b = unique_by_value_test_task.delay(1, extra='b')
+
+        self.assertEqual(task_a.id, task_b.id)
+        self.assertEqual(task_a.unique_key, 'task_queue.tests.test_task_queue.unique_by_value_test_task:1')
+
+    def test_enqueues_again_once_claimed(self):
+        task_a = unique_test_task.delay(1)
+        QueueScheduler(worker_id='worker-a').fetch_async_tasks('default', 10)
+        task_b = unique_test_task.delay(1)
+
+        self.assertNotEqual(task_a.id, task_b.id)
+        self.assertEqual(unique_test_task.delay(1).id, task_b.id)
+
+    def test_requeue_with_pending_duplicate(self):
+        unique_test_task.delay(1)
+        scheduler = QueueScheduler(worker_id='worker-a')
+        claimed = scheduler.fetch_async_tasks('default', 10)[0]
+        pending = unique_test_task.delay(1)
+        AsyncTask.objects.filter(id=claimed.id).update(lease_expires_datetime=timezone.now() - timedelta(seconds=1))
+
+        scheduler.reap_expired_leases()
+
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, AsyncTask.STATUS_PENDING)
+        self.assertIsNone(claimed.unique_key)
+        self.assertEqual(unique_test_task.delay(1).id, pending.id)
+
+
+class DelayManyTests(TestCase):
+    def test_creates_all(self):
+        bulk_test_task.delay_many((i,) for i in range(100))
+
+        tasks = AsyncTask.objects.order_by('id')
+        self.assertEqual(len(tasks), 100)
+        self.assertEqual([t.args['args'] for t in tasks], [[i] for i in range(100)])
+        self.assertEqual(tasks[0].handler, 'task_queue.tests.test_task_queue.bulk_test_task')
+
+    def test_coalesces_unique(self):
+        existing = unique_test_task.delay(1)
+
+        created = unique_test_task.delay_many([(1,), (2,), (2,), (3,)])
+
+        self.assertEqual(len(created), 2)
+        self.assertEqual(AsyncTask.objects.count(), 3)
+        self.assertEqual(unique_test_task.delay(1).id, existing.id)
+
+    def test_empty(self):
+        self.assertEqual(bulk_test_task.delay_many([]), [])
+        self.assertEqual(AsyncTask.objects.count(), 0)
@@ -0,0 +1,81 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from task_queue.models import AsyncTask
+from task_queue.task_queue import TaskQueue
+
+
+@TaskQueue.async_task()
+def view_test_task():
+    pass
+
+
+class AsyncTaskViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('user'))
+
+    def test_pending(self):
+        task = view_test_task.delay()
+
+        response = self.client.get('/api/task-queue/tasks/{}'.format(task.id))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], AsyncTask.STATUS_PENDING)
+        self.assertFalse(response.data['is_finished'])
+        self.assertIsNone(response.data['result'])
+
+    def test_wait_returns_when_finished(self):
+        task = view_test_task.delay()
+        AsyncTask.objects.filter(id=task.id).update(status=AsyncTask.STATUS_SUCCEEDED)
+
+        start = time.time()
+        response = self.client.get('/api/task-queue/tasks/{}?wait=10'.format(task.id))
+
+        self.assertLess(time.time() - start, 1)
+        self.assertTrue(response.data['is_finished'])
+
+    def test_wait_times_out(self):
+        task = view_test_task.delay()
+
+        response = self.client.get('/api/task-queue/tasks/{}?wait=0.5'.format(task.id))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_finished'])
+
+    @override_settings(TASK_QUEUE_MAX_RESULT_WAIT=0.5)
+    def test_wait_is_capped(self):
+        task = view_test_task.delay()
+
+        start = time.time()
+        response = self.client.get('/api/task-queue/tasks/{}?wait=30'.format(task.id))
+
+        self.assertLess(time.time() - start, 2)
+        self.assertFalse(response.data['is_finished'])
+
+    def test_invalid_wait(self):
+        task = view_test_task.delay()
+
+        for wait in ('soon', 'nan', 'inf', '-1', ''):
+            with self.subTest(wait=wait):
+                response = self.client.get('/api/task-queue/tasks/{}?wait={}'.format(task.id, wait))
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('wait', response.data)
+
+    def test_wait_backs_off(self):
+        task = view_test_task.delay()
+
+        with mock.patch('task_queue.views.time.sleep') as sleep, \
+                mock.patch('task_queue.views.time.time', side_effect=[0, 0, 0.25, 0.75, 1.75, 3.75, 5.75]):
+            response = self.client.get('/api/task-queue/tasks/{}?wait=5'.format(task.id))
+
+        self.assertFalse(response.data['is_finished'])
+        self.assertEqual([call[0][0] for call in sleep.call_args_list], [0.25, 0.5, 1, 2, 1.25])
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get('/api/task-queue/tasks/12345').status_code, 404)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('tasks/<int:task_id>', views.AsyncTaskView.as_view()),
+    path('metrics', views.Metrics.as_view()),
+    path('metrics/prometheus', views.PrometheusMetrics.as_view()),
+]
@@ -1,3 +1,85 @@
-from django.shortcuts import render
+import math
+import time
+from datetime import timedelta
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from task_queue.metrics import get_queue_utilization, merge_handler_metrics, format_prometheus
+from task_queue.models import AsyncTask, WorkerMetrics, get_queue_depths
+from task_queue.serializers import AsyncTaskSerializer
+
+# Long-polling requests check the task this often at first, backing off to RESULT_MAX_POLL_INTERVAL
+RESULT_POLL_INTERVAL = 0.25
+RESULT_MAX_POLL_INTERVAL = 2
+
+
+def get_live_worker_snapshots():
+    # Schedulers save a snapshot on every heartbeat, give them a few to account for slow ones
+    return WorkerMetrics.get_live_snapshots(timedelta(seconds=3 * settings.TASK_QUEUE_HEARTBEAT_INTERVAL))
+
+
+class AsyncTaskView(APIView):
+    """Return a task's status and result.
+
+    With ?wait=<seconds>, long-poll until the task finishes, for at most TASK_QUEUE_MAX_RESULT_WAIT seconds. Clients
+    re-poll while is_finished is false.
+    """
+
+    def get(self, request, task_id):
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            wait = None
+        # float() also accepts nan and inf, nan would never reach the deadline
+        if wait is None or not math.isfinite(wait) or wait < 0:
+            raise ValidationError({'wait': 'Expected a non-negative number of seconds.'})
+        deadline = time.time() + min(wait, settings.TASK_QUEUE_MAX_RESULT_WAIT)
+        poll_interval = RESULT_POLL_INTERVAL
+        while True:
+            try:
+                async_task = AsyncTask.objects.get(id=task_id)
+            except AsyncTask.DoesNotExist:
+                raise NotFound()
+            remaining = deadline - time.time()
+            if async_task.is_finished or remaining <= 0:
+                break
+            time.sleep(min(poll_interval, remaining))
+            poll_interval = min(poll_interval * 2, RESULT_MAX_POLL_INTERVAL)
+        return Response(AsyncTaskSerializer(async_task).data)
+
+
+class Metrics(APIView):
+    """Queue depths from the database and per handler/queue metrics reported by the live schedulers."""
+
+    def get(self, request):
+        worker_snapshots = get_live_worker_snapshots()
+        return Response({
+            'queues': get_queue_depths(),
+            'workers': [
+                {
+                    'worker_id': worker_id,
+                    'uptime': snapshot['uptime'],
+                    'queues': {
+                        queue: dict(queue_data, utilization=get_queue_utilization(queue_data, snapshot['uptime']))
+                        for queue, queue_data in snapshot['queues'].items()
+                    },
+                }
+                for worker_id, snapshot in sorted(worker_snapshots.items())
+            ],
+            'handlers': {
+                handler: handler_metrics.summary()
+                for handler, handler_metrics in sorted(merge_handler_metrics(worker_snapshots.values()).items())
+            },
+        })
+
+
+class PrometheusMetrics(APIView):
+    def get(self, request):
+        return HttpResponse(
+            format_prometheus(get_queue_depths(), get_live_worker_snapshots()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
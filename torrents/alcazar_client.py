@@ -2,62 +2,31 @@ import base64
 import os
 import threading
 import urllib.parse
+from collections import defaultdict
 
 import django
 import requests
-from django.db import transaction
-from iso8601 import iso8601
+from django.db import transaction, connection
 from requests import Session
 from rest_framework.exceptions import APIException
 
-from Harvest.utils import get_logger
+from Harvest.utils import get_logger, bulk_update
 from torrents import signals
-from torrents.models import AlcazarClientConfig, Torrent
+from torrents.alcazar_state import normalize_torrent_state, get_changed_fields, apply_torrent_state
+from torrents.models import AlcazarClientConfig, Torrent, TorrentStats, TORRENT_STATS_FIELDS
 from trackers.utils import TorrentFileInfo
 
 logger = get_logger(__name__)
 
+BULK_UPDATE_BATCH_SIZE = 1000
+
 
 def alcazar_torrent_equals(torrent, torrent_state):
-    if torrent.info_hash != torrent_state['info_hash']:
-        raise Exception('Comparing different info hash torrents.')
-
-    return (
-            torrent.client == torrent_state['client'] and
-            torrent.status == torrent_state['status'] and
-            torrent.download_path == torrent_state['download_path'] and
-            torrent.name == torrent_state['name'] and
-            torrent.size == torrent_state['size'] and
-            torrent.downloaded == torrent_state['downloaded'] and
-            torrent.uploaded == torrent_state['uploaded'] and
-            torrent.download_rate == torrent_state['download_rate'] and
-            torrent.upload_rate == torrent_state['upload_rate'] and
-            torrent.progress == torrent_state['progress'] and
-            torrent.added_datetime == torrent_state['date_added'] and
-            torrent.error == torrent_state['error'] and
-            torrent.tracker_error == torrent_state['tracker_error']
-    )
+    return not get_changed_fields(torrent, normalize_torrent_state(torrent_state))
 
 
 def _update_torrent_from_alcazar(torrent, torrent_state):
-    if torrent.info_hash != torrent_state['info_hash']:
-        raise Exception('Comparing different info hash torrents.')
-
-    date_added = torrent_state['date_added']
-
-    torrent.client = torrent_state['client']
-    torrent.status = torrent_state['status']
-    torrent.download_path = torrent_state['download_path']
-    torrent.name = torrent_state['name']
-    torrent.size = torrent_state['size']
-    torrent.downloaded = torrent_state['downloaded']
-    torrent.uploaded = torrent_state['uploaded']
-    torrent.download_rate = torrent_state['download_rate']
-    torrent.upload_rate = torrent_state['upload_rate']
-    torrent.progress = torrent_state['progress']
-    torrent.added_datetime = iso8601.parse_date(date_added) if date_added else None
-    torrent.error = torrent_state['error']
-    torrent.tracker_error = torrent_state['tracker_error']
+    apply_torrent_state(torrent, normalize_torrent_state(torrent_state))
 
 
 def update_torrent_from_alcazar(torrent, torrent_state):
@@ -67,12 +36,68 @@ def update_torrent_from_alcazar(torrent, torrent_state):
     _update_torrent_from_alcazar(torrent, torrent_state)
     torrent.save()
     # Dispatch relevant signals
-    signals.torrent_updated.send_robust(None, torrent=torrent)
+    signals.send_torrents_updated(None, [torrent])
     if prev_progress != 1 and torrent.progress == 1:
-        signals.torrent_finished.send_robust(None, torrent=torrent)
+        signals.send_torrents_finished(None, [torrent])
     return True
 
 
+def update_torrents_from_alcazar(torrents_states):
+    """Batched update_torrent_from_alcazar() for a list of (torrent, torrent_state).
+
+    Only changed fields are written, with one UPDATE per chunk of torrents sharing the same changed fields. Returns
+    the list of updated torrents.
+    """
+
+    updated_torrents = []
+    finished_torrents = []
+    torrents_by_fields = defaultdict(list)
+    for torrent, torrent_state in torrents_states:
+        state = normalize_torrent_state(torrent_state)
+        changed_fields = get_changed_fields(torrent, state)
+        if not changed_fields:
+            continue
+        prev_progress = torrent.progress
+        apply_torrent_state(torrent, state, changed_fields)
+        torrents_by_fields[tuple(changed_fields)].append(torrent)
+        updated_torrents.append(torrent)
+        if prev_progress != 1 and torrent.progress == 1:
+            finished_torrents.append(torrent)
+
+    for fields, torrents in torrents_by_fields.items():
+        bulk_update_torrents(torrents, fields)
+
+    # Dispatch relevant signals
+    signals.send_torrents_updated(None, updated_torrents)
+    signals.send_torrents_finished(None, finished_torrents)
+    return updated_torrents
+
+
+def bulk_update_torrents(torrents, fields):
+    """Write the given fields of torrents, the stats ones to TorrentStats and the rest to Torrent."""
+
+    torrent_fields = [field for field in fields if field not in TORRENT_STATS_FIELDS]
+    stats_fields = [field for field in fields if field in TORRENT_STATS_FIELDS]
+    if torrent_fields:
+        bulk_update(torrents, torrent_fields, batch_size=BULK_UPDATE_BATCH_SIZE)
+    if stats_fields:
+        bulk_update([torrent.get_stats() for torrent in torrents], stats_fields, batch_size=BULK_UPDATE_BATCH_SIZE)
+
+
+def _link_unlinked_torrents(torrents, torrent_info_ids):
+    """Link torrents that were added without a TorrentInfo to the one that exists now. Returns the linked torrents."""
+
+    linked_torrents = []
+    for torrent in torrents:
+        torrent_info_id = torrent_info_ids.get(torrent.info_hash)
+        if torrent.torrent_info_id is None and torrent_info_id is not None:
+            logger.warning('Discovered unlinked torrent {}, linking to {}.', torrent.info_hash, torrent_info_id)
+            torrent.torrent_info_id = torrent_info_id
+            linked_torrents.append(torrent)
+    bulk_update(linked_torrents, ['torrent_info'], batch_size=BULK_UPDATE_BATCH_SIZE)
+    return linked_torrents
+
+
 def create_or_update_torrent_from_alcazar(realm, torrent_info_id, torrent_state):
     try:
         with transaction.atomic():
@@ -81,24 +106,80 @@ def create_or_update_torrent_from_alcazar(realm, torrent_info_id, torrent_state)
                 torrent_info_id=torrent_info_id,
                 info_hash=torrent_state['info_hash'],
             )
-            update_torrent_from_alcazar(torrent, torrent_state)
+            _update_torrent_from_alcazar(torrent, torrent_state)
             torrent.save()
-            signals.torrent_added.send_robust(None, torrent=torrent)
+            signals.send_torrents_added(None, [torrent])
             return torrent, True
     except django.db.utils.IntegrityError:
         logger.info('IntegrityError creating torrent, it must have popped up. Retrieving existing.')
         torrent = Torrent.objects.get(realm=realm, info_hash=torrent_state['info_hash'])
 
-        if torrent.torrent_info_id is None and torrent.torrent_info_id != torrent_info_id:
-            logger.warning('Discovered unlinked torrent {}, linking to {}.', torrent.info_hash, torrent_info_id)
-            torrent.torrent_info_id = torrent_info_id
-            torrent.save()
-            signals.torrent_updated.send_robust(None, torrent)
+        if _link_unlinked_torrents([torrent], {torrent.info_hash: torrent_info_id}):
+            signals.send_torrents_updated(None, [torrent])
 
         update_torrent_from_alcazar(torrent, torrent_state)
         return torrent, False
 
 
+def _bulk_create_torrents(realm, torrents):
+    Torrent.objects.bulk_create(torrents, batch_size=BULK_UPDATE_BATCH_SIZE)
+    if not connection.features.can_return_ids_from_bulk_insert:
+        # Fetch the ids, the signal receivers and TorrentStats need them
+        ids = dict(Torrent.objects.filter(
+            realm=realm, info_hash__in=[t.info_hash for t in torrents]).values_list('info_hash', 'id'))
+        for torrent in torrents:
+            torrent.id = ids[torrent.info_hash]
+    stats = []
+    for torrent in torrents:
+        torrent.get_stats().torrent = torrent
+        stats.append(torrent.stats)
+    TorrentStats.objects.bulk_create(stats, batch_size=BULK_UPDATE_BATCH_SIZE)
+    return torrents
+
+
+def create_torrents_from_alcazar(realm, torrent_states, torrent_info_ids):
+    """Batched create_or_update_torrent_from_alcazar() for torrents that are not in the DB yet.
+
+    torrent_info_ids maps info hashes to TorrentInfo ids to link. Creates all torrents with bulk inserts. If some were
+    created concurrently in the meantime, those are updated instead. Returns the list of created torrents.
+    """
+
+    if not torrent_states:
+        return []
+
+    states_by_info_hash = {state['info_hash']: state for state in torrent_states}
+    torrents = []
+    for info_hash, torrent_state in states_by_info_hash.items():
+        torrent = Torrent(
+            realm=realm,
+            torrent_info_id=torrent_info_ids.get(info_hash),
+            info_hash=info_hash,
+        )
+        _update_torrent_from_alcazar(torrent, torrent_state)
+        torrents.append(torrent)
+
+    try:
+        with transaction.atomic():
+            created_torrents = _bulk_create_torrents(realm, torrents)
+    except django.db.utils.IntegrityError:
+        existing_torrents = list(Torrent.objects.filter(realm=realm, info_hash__in=states_by_info_hash.keys()))
+        logger.info('IntegrityError creating {} torrents, {} of them must have popped up. Updating existing.',
+                    len(torrents), len(existing_torrents))
+        existing_info_hashes = {t.info_hash for t in existing_torrents}
+        created_torrents = _bulk_create_torrents(
+            realm, [t for t in torrents if t.info_hash not in existing_info_hashes])
+
+        linked_torrents = _link_unlinked_torrents(existing_torrents, torrent_info_ids)
+        updated_torrents = update_torrents_from_alcazar(
+            [(t, states_by_info_hash[t.info_hash]) for t in existing_torrents])
+        # Linked torrents that were also updated already got their signal
+        updated_ids = {t.id for t in updated_torrents}
+        signals.send_torrents_updated(None, [t for t in linked_torrents if t.id not in updated_ids])
+
+    signals.send_torrents_added(None, created_torrents)
+    return created_torrents
+
+
 class AlcazarRemoteException(APIException):
     def __init__(self, message, response=None):
         self.status_code = 500
@@ -148,8 +229,34 @@ class AlcazarClient:
     def _get_url(self, endpoint):
         return urllib.parse.urljoin(self.config.base_url, endpoint)
 
-    def pop_update_batch(self, limit):
-        return self._request('POST', '/pop_update_batch', params={'limit': limit})
+    def pop_update_batch(self, limit, wait=None):
+        """With wait, Alcazar holds the request for up to wait seconds until there are updates to return.
+
+        Versions of Alcazar without long-polling ignore wait and return immediately.
+        """
+
+        if not wait:
+            return self._request('POST', '/pop_update_batch', params={'limit': limit})
+        return self._request('POST', '/pop_update_batch', params={'limit': limit, 'wait': wait},
+                             timeout=self.timeout + wait)
+
+    def get_digests(self, prefix_length):
+        """Per realm bucket digests of the torrents' states, see alcazar_reconciler.
+
+        Returns None for versions of Alcazar without digest support.
+        """
+
+        try:
+            return self._request('GET', '/digests', params={'prefix_length': prefix_length})
+        except AlcazarRemoteException as exc:
+            if exc.status_code == 404:
+                return None
+            raise
+
+    def get_bucket_torrents(self, realm_name, prefix):
+        """States of the torrents in a realm whose info hashes start with prefix."""
+
+        return self._request('GET', '/digests/{}/{}'.format(realm_name, prefix))
 
     def ping(self):
         return self._request('GET', '/ping')
@@ -1,14 +1,22 @@
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, Future
 from itertools import chain
 
+from django.db import transaction
+
 from Harvest.utils import get_logger
-from torrents.alcazar_client import update_torrent_from_alcazar, \
-    create_or_update_torrent_from_alcazar
+from torrents.alcazar_client import update_torrents_from_alcazar, create_torrents_from_alcazar
+from torrents.alcazar_state import normalize_torrent_state
 from torrents.models import Torrent, Realm, TorrentInfo
-from torrents.signals import torrent_removed
+from torrents.signals import send_torrents_removed
 
 logger = get_logger(__name__)
 
+UPDATE_BATCH_SIZE = 5000
+MIN_UPDATE_BATCH_SIZE = 500
+MAX_UPDATE_BATCH_SIZE = 20000
+
 
 class AlcazarEventProcessor:
     @classmethod
@@ -17,8 +25,7 @@ class AlcazarEventProcessor:
         removed_info_hashes = list(removed_torrents_qs.values_list('info_hash', flat=True))
         logger.debug('Matched {} Torrent objects for deletion.'.format(len(removed_info_hashes)))
         removed_torrents_qs.delete()
-        for removed_info_hash in removed_info_hashes:
-            torrent_removed.send_robust(cls, realm=realm, info_hash=removed_info_hash)
+        send_torrents_removed(cls, realm, removed_info_hashes)
 
     @classmethod
     def _process_added_torrents(cls, realm, added_torrent_states):
@@ -36,51 +43,64 @@ class AlcazarEventProcessor:
             ).values_list('info_hash', 'id')
         }
 
-        for added_state in added_torrent_states:
-            create_or_update_torrent_from_alcazar(
-                realm=realm,
-                torrent_info_id=torrent_info_ids.get(added_state['info_hash']),
-                torrent_state=added_state,
-            )
+        created_torrents = create_torrents_from_alcazar(realm, added_torrent_states, torrent_info_ids)
+        logger.debug('Created {} Torrent objects.', len(created_torrents))
 
     @classmethod
-    def _process_events(cls, realm, events):
+    def _process_events(cls, realm, events, state_cache):
+        """Returns the normalized states that are in the DB after processing, to remember in state_cache."""
+
         cls._process_removed_events(realm, events['removed'])
 
-        updated_info_hashes = [state['info_hash'] for state in chain(events['added'], events['updated'])]
+        updated_states = events['updated']
+        if state_cache is not None:
+            # Added events are never skipped, the torrent could've been deleted by another process in the meantime
+            updated_states = [
+                state for state in updated_states
+                if not state_cache.matches(realm.id, normalize_torrent_state(state))
+            ]
+            logger.debug('Skipped {} unchanged cached states.', len(events['updated']) - len(updated_states))
+
+        updated_info_hashes = [state['info_hash'] for state in chain(events['added'], updated_states)]
         existing_torrents = {
             t.info_hash: t for t in Torrent.objects.filter(realm=realm, info_hash__in=updated_info_hashes)}
         added_torrents_states = []
 
         logger.debug('Matched {} Torrent objects for updating.', len(existing_torrents))
 
-        num_updated = 0
-        for updated_state in chain(events['added'], events['updated']):
+        existing_torrents_states = []
+        for updated_state in chain(events['added'], updated_states):
             torrent = existing_torrents.get(updated_state['info_hash'])
             if not torrent:
                 added_torrents_states.append(updated_state)
             else:
-                if update_torrent_from_alcazar(torrent, updated_state):
-                    num_updated += 1
+                existing_torrents_states.append((torrent, updated_state))
+
+        updated_torrents = update_torrents_from_alcazar(existing_torrents_states)
 
-        logger.debug('Actually updated {} in DB.', num_updated)
+        logger.debug('Actually updated {} in DB.', len(updated_torrents))
         logger.debug('Matched {} new states for adding.', len(added_torrents_states))
 
         cls._process_added_torrents(realm, added_torrents_states)
+        return [normalize_torrent_state(state) for state in chain(events['added'], updated_states)]
 
     @classmethod
-    def _process(cls, events):
+    def _process(cls, events, state_cache):
         realms = {realm.name: realm for realm in Realm.objects.all()}
+        written_states = []
         for realm_name, batch in events.items():
             realm = realms.get(realm_name)
             if not realm:
                 realm, _ = Realm.objects.get_or_create(name=realm_name)
 
             logger.debug('Processing events for realm {}.', realm_name)
-            cls._process_events(realm, batch)
+            written_states.append((realm.id, cls._process_events(realm, batch, state_cache)))
+        return written_states
 
     @classmethod
-    def process(cls, events):
+    def process(cls, events, state_cache=None):
+        """Apply a batch of Alcazar events. With state_cache, updated events that match it are skipped."""
+
         start = time.time()
 
         logger.debug('Processing events.')
@@ -88,7 +108,9 @@ class AlcazarEventProcessor:
         retries_remaining = 3
         while True:
             try:
-                cls._process(events)
+                # Every attempt gets its own transaction, a failed one can't be retried inside an aborted transaction
+                with transaction.atomic():
+                    written_states = cls._process(events, state_cache)
                 break
             except Exception:
                 if retries_remaining > 0:
@@ -98,4 +120,135 @@ class AlcazarEventProcessor:
                     logger.exception('Exhausted event processing retries.')
                     raise
 
+        # Only remember the states once they're committed
+        if state_cache is not None:
+            for realm_id, states in written_states:
+                state_cache.update(realm_id, states)
+
         logger.debug('Completed alcazar update in {:.3f}.', time.time() - start)
+
+
+def count_update_batch_events(update_batch):
+    return sum(
+        len(realm_batch['added']) + len(realm_batch['updated']) + len(realm_batch['removed'])
+        for realm_batch in update_batch.values()
+    )
+
+
+class AlcazarUpdateDrainer:
+    """Drains Alcazar's update backlog page by page.
+
+    The next page is popped from Alcazar on a background thread while the current one is written to the database.
+    The page size adapts so that writing a page takes about target_page_seconds and is carried over between drains.
+    With a state_cache, it's warmed up from the DB on the first drain (and after the lease changed hands) and used to
+    skip unchanged updates.
+
+    Pops are destructive, so when writing a page fails, the already prefetched page is kept and applied first by the
+    next drain. With a lease (AlcazarSyncLeaseHolder), drains only run while holding it, so that pages popped by
+    different processes are never applied concurrently or out of order.
+    """
+
+    def __init__(self, batch_size, target_page_seconds, state_cache=None, lease=None):
+        self.batch_size = batch_size
+        self.target_page_seconds = target_page_seconds
+        self.state_cache = state_cache
+        self.lease = lease
+        self.lock = threading.Lock()
+        # (update batch, limit it was popped with, lease generation) prefetched by a drain that failed
+        self.carried_over_page = None
+
+    def get_next_batch_size(self, num_events, seconds):
+        # Partial pages are dominated by fixed overhead and say nothing about the sustainable throughput
+        if num_events < self.batch_size or seconds <= 0:
+            return self.batch_size
+        target = num_events * self.target_page_seconds / seconds
+        # Move at most 2x per page, so that a single slow page (e.g. lock wait) doesn't collapse the size
+        target = max(self.batch_size / 2, min(self.batch_size * 2, target))
+        return int(max(MIN_UPDATE_BATCH_SIZE, min(MAX_UPDATE_BATCH_SIZE, target)))
+
+    def drain(self, client, time_budget, wait=None):
+        """Pop and process pages until Alcazar returns a partial page or time_budget seconds have passed.
+
+        With wait, the first pop long-polls Alcazar for up to wait seconds until there are updates.
+
+        Returns (number of processed events, whether a backlog is likely still waiting).
+        """
+
+        # A drain abandoned by its task's timeout keeps running in its thread, don't pop and apply pages alongside it
+        if not self.lock.acquire(blocking=False):
+            logger.warning('Skipping alcazar drain, the previous one is still running.')
+            return 0, False
+        try:
+            if self.lease is not None and not self.lease.acquire():
+                logger.info('Skipping alcazar drain, another process holds the sync lease.')
+                return 0, False
+            try:
+                return self._drain(client, time_budget, wait)
+            finally:
+                if self.lease is not None:
+                    self.lease.release()
+        finally:
+            self.lock.release()
+
+    def _drain(self, client, time_budget, wait):
+        if self.state_cache is not None:
+            # Torrents may have been written by another process while it held the lease
+            if self.lease is not None:
+                self.state_cache.check_generation(self.lease.generation)
+            if not self.state_cache.is_warm:
+                self.state_cache.warm_up()
+
+        deadline = time.time() + time_budget
+        num_events_total = 0
+        num_pages = 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            carried_over_page, self.carried_over_page = self.carried_over_page, None
+            if (carried_over_page is not None and self.lease is not None and
+                    carried_over_page[2] != self.lease.generation):
+                # Someone else applied newer updates in the meantime, the old page would overwrite them
+                logger.error('Dropping carried over page of {} alcazar events, the sync lease changed hands.',
+                             count_update_batch_events(carried_over_page[0]))
+                carried_over_page = None
+            if carried_over_page is not None:
+                carried_over_batch, limit, _ = carried_over_page
+                next_page = Future()
+                next_page.set_result(carried_over_batch)
+            else:
+                limit = self.batch_size
+                next_page = executor.submit(client.pop_update_batch, limit, wait)
+            while True:
+                update_batch = next_page.result()
+                num_events = count_update_batch_events(update_batch)
+                has_more = num_events >= limit
+
+                next_page = None
+                if has_more and time.time() < deadline:
+                    if self.lease is None or self.lease.renew():
+                        limit = self.batch_size
+                        next_page = executor.submit(client.pop_update_batch, limit)
+                    else:
+                        logger.warning('Lost the alcazar sync lease, stopping the drain.')
+
+                start = time.time()
+                try:
+                    AlcazarEventProcessor.process(update_batch, self.state_cache)
+                except Exception:
+                    if next_page is not None and not next_page.exception():
+                        self.carried_over_page = (next_page.result(), limit,
+                                                  self.lease.generation if self.lease is not None else None)
+                        logger.warning('Keeping prefetched page of {} alcazar events for the next drain after a '
+                                       'processing failure.', count_update_batch_events(next_page.result()))
+                    raise
+                seconds = time.time() - start
+
+                num_events_total += num_events
+                num_pages += 1
+                self.batch_size = self.get_next_batch_size(num_events, seconds)
+                logger.debug('Processed page of {} alcazar events in {:.3f} s, next page size {}.',
+                             num_events, seconds, self.batch_size)
+
+                if next_page is None:
+                    break
+
+        logger.info('Drained {} alcazar events in {} pages.', num_events_total, num_pages)
+        return num_events_total, has_more
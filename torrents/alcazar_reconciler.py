@@ -0,0 +1,143 @@
+import hashlib
+import json
+import time
+
+from Harvest.utils import get_logger
+from torrents.alcazar_event_processor import AlcazarEventProcessor
+from torrents.alcazar_state import normalize_torrent_state
+from torrents.alcazar_state_cache import torrent_state_cache
+from torrents.alcazar_sync_lease import AlcazarSyncLeaseHolder
+from torrents.fields import INFO_HASH_BYTES
+from torrents.models import Realm, Torrent, TORRENT_STATS_FIELDS
+
+logger = get_logger(__name__)
+
+# Fields covered by the digests. The byte counters and rates change all the time and are left to the incremental sync,
+# a torrent whose status, progress or location drifted still shows up.
+RECONCILED_FIELDS = ('client', 'status', 'download_path', 'name', 'size', 'progress', 'error', 'tracker_error')
+
+
+def get_row_digest(row):
+    """SHA-1 of the JSON array [info_hash, *RECONCILED_FIELDS] of a torrent, as an int. Alcazar computes the same."""
+
+    data = json.dumps(row, separators=(',', ':'))
+    return int.from_bytes(hashlib.sha1(data.encode()).digest(), 'big')
+
+
+def get_state_row(state):
+    return [state.info_hash] + [getattr(state, field) for field in RECONCILED_FIELDS]
+
+
+def get_bucket_digests(rows, prefix_length):
+    """Map of info hash prefix to (number of torrents, XOR of their row digests) for an iterable of rows.
+
+    XOR makes a bucket's digest independent of the order of its torrents, so both sides can compute it in one pass.
+    """
+
+    buckets = {}
+    for row in rows:
+        prefix = row[0][:prefix_length]
+        count, digest = buckets.get(prefix, (0, 0))
+        buckets[prefix] = (count + 1, digest ^ get_row_digest(row))
+    return buckets
+
+
+def parse_bucket_digests(data):
+    return {prefix: (count, int(digest, 16)) for prefix, (count, digest) in data.items()}
+
+
+def get_db_rows(realm, prefix=None):
+    torrents = Torrent.objects.filter(realm=realm)
+    if prefix is not None:
+        # Info hashes are stored as bytes, so a prefix is a contiguous range of the (realm, info_hash) index
+        torrents = torrents.filter(info_hash__range=(
+            prefix.ljust(INFO_HASH_BYTES * 2, '0'),
+            prefix.ljust(INFO_HASH_BYTES * 2, 'f'),
+        ))
+    return torrents.order_by().values_list('info_hash', *(
+        'stats__' + field if field in TORRENT_STATS_FIELDS else field for field in RECONCILED_FIELDS
+    )).iterator()
+
+
+class AlcazarReconciler:
+    """Finds and fixes drift between Alcazar and the DB without transferring the full state of every torrent.
+
+    Alcazar returns the bucket digests (see get_bucket_digests) of every realm, which are compared with the ones
+    computed from the DB. Only the torrents of mismatching buckets are fetched and written, as if Alcazar sent events
+    for them. A bucket that matches again by the time it's fetched (the sync caught up in the meantime) is left alone.
+
+    Each bucket is fixed while holding the sync lease, so that no drain applies updates between reading the bucket
+    and writing it. Buckets are skipped while the lease is held elsewhere, the next run picks them up.
+    """
+
+    def __init__(self, prefix_length, lease=None):
+        self.prefix_length = prefix_length
+        self.lease = lease or AlcazarSyncLeaseHolder('reconcile_alcazar')
+
+    def reconcile_bucket(self, client, realm, prefix):
+        """Returns whether anything in the bucket had to be fixed."""
+
+        if not self.lease.acquire():
+            logger.info('Skipping bucket {} of realm {}, another process holds the sync lease.', prefix, realm.name)
+            return False
+        try:
+            return self._reconcile_bucket(client, realm, prefix)
+        finally:
+            self.lease.release()
+
+    def _reconcile_bucket(self, client, realm, prefix):
+        # The DB first, a torrent that is added or removed in between then ends up as a harmless update or no-op
+        # removal instead of wrongly deleting or re-creating it
+        db_rows = list(get_db_rows(realm, prefix))
+        states = client.get_bucket_torrents(realm.name, prefix)
+        remote_digests = get_bucket_digests(
+            (get_state_row(normalize_torrent_state(state)) for state in states), len(prefix))
+        if remote_digests == get_bucket_digests(db_rows, len(prefix)):
+            return False
+
+        db_info_hashes = {row[0] for row in db_rows}
+        remote_info_hashes = {state['info_hash'] for state in states}
+        events = {
+            'added': [state for state in states if state['info_hash'] not in db_info_hashes],
+            'updated': [state for state in states if state['info_hash'] in db_info_hashes],
+            'removed': list(db_info_hashes - remote_info_hashes),
+        }
+        logger.warning('Reconciling bucket {} of realm {}: {} missing, {} to update, {} extra torrents.',
+                       prefix, realm.name, len(events['added']), len(events['updated']), len(events['removed']))
+        AlcazarEventProcessor.process({realm.name: events})
+        # Bulk updates don't invalidate the cached states of the torrents they fix
+        torrent_state_cache.discard(realm.id, db_info_hashes | remote_info_hashes)
+        return True
+
+    def reconcile(self, client):
+        """Returns the number of fixed buckets, or None if this version of Alcazar doesn't support digests."""
+
+        start = time.time()
+        remote_realm_digests = client.get_digests(self.prefix_length)
+        if remote_realm_digests is None:
+            return None
+
+        realms = {realm.name: realm for realm in Realm.objects.all()}
+        num_checked = 0
+        num_fixed = 0
+        for realm_name, remote_digests in remote_realm_digests.items():
+            realm = realms.get(realm_name)
+            if not realm:
+                realm, _ = Realm.objects.get_or_create(name=realm_name)
+
+            remote_digests = parse_bucket_digests(remote_digests)
+            db_digests = get_bucket_digests(get_db_rows(realm), self.prefix_length)
+            prefixes = sorted(prefix for prefix in remote_digests.keys() | db_digests.keys()
+                              if remote_digests.get(prefix) != db_digests.get(prefix))
+            logger.debug('Found {} mismatching buckets in realm {}.', len(prefixes), realm_name)
+            num_checked += len(remote_digests.keys() | db_digests.keys())
+            for prefix in prefixes:
+                if self.reconcile_bucket(client, realm, prefix):
+                    num_fixed += 1
+
+        for realm_name in realms.keys() - remote_realm_digests.keys():
+            logger.warning('Realm {} is not known to Alcazar, not reconciling it.', realm_name)
+
+        logger.info('Reconciled alcazar in {:.3f} s, fixed {} of {} buckets.', time.time() - start, num_fixed,
+                    num_checked)
+        return num_fixed
@@ -0,0 +1,61 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from iso8601 import iso8601
+
+# Torrent fields that are set from Alcazar's torrent states
+TORRENT_STATE_FIELDS = ('client', 'status', 'download_path', 'name', 'size', 'downloaded', 'uploaded',
+                        'download_rate', 'upload_rate', 'progress', 'added_datetime', 'error', 'tracker_error')
+
+# Alcazar's torrent state, with values of the same types as the corresponding Torrent fields
+TorrentState = namedtuple('TorrentState', ('info_hash',) + TORRENT_STATE_FIELDS)
+
+
+@lru_cache(maxsize=65536)
+def parse_alcazar_datetime(value):
+    # Every poll reports the same dates for the same torrents, so they are only parsed once
+    return iso8601.parse_date(value) if value else None
+
+
+def _int_or_none(value):
+    return None if value is None else int(value)
+
+
+def _float_or_none(value):
+    return None if value is None else float(value)
+
+
+def normalize_torrent_state(torrent_state):
+    """Convert a torrent state dict as returned by Alcazar to a TorrentState."""
+
+    return TorrentState(
+        info_hash=torrent_state['info_hash'],
+        client=torrent_state['client'],
+        status=int(torrent_state['status']),
+        download_path=torrent_state['download_path'],
+        name=torrent_state['name'],
+        size=_int_or_none(torrent_state['size']),
+        downloaded=_int_or_none(torrent_state['downloaded']),
+        uploaded=_int_or_none(torrent_state['uploaded']),
+        download_rate=_int_or_none(torrent_state['download_rate']),
+        upload_rate=_int_or_none(torrent_state['upload_rate']),
+        progress=_float_or_none(torrent_state['progress']),
+        added_datetime=parse_alcazar_datetime(torrent_state['date_added']),
+        error=torrent_state['error'],
+        tracker_error=torrent_state['tracker_error'],
+    )
+
+
+def get_changed_fields(torrent, state):
+    """Names of the Torrent fields whose values differ from the TorrentState."""
+
+    if torrent.info_hash != state.info_hash:
+        raise Exception('Comparing different info hash torrents.')
+    return [field for field in TORRENT_STATE_FIELDS if getattr(torrent, field) != getattr(state, field)]
+
+
+def apply_torrent_state(torrent, state, fields=TORRENT_STATE_FIELDS):
+    if torrent.info_hash != state.info_hash:
+        raise Exception('Comparing different info hash torrents.')
+    for field in fields:
+        setattr(torrent, field, getattr(state, field))
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from Harvest.utils import get_logger
+from torrents.alcazar_state import TorrentState, TORRENT_STATE_FIELDS
+from torrents.models import Torrent, TORRENT_STATS_FIELDS
+
+logger = get_logger(__name__)
+
+
+def get_state_fingerprint(state):
+    # Equal states hash equally (including datetimes in different time zones), so a compact int is enough
+    return hash(state)
+
+
+class TorrentStateCache:
+    """Bounded LRU of the fingerprint of the last written TorrentState per (realm_id, info_hash).
+
+    Lets the sync skip updated events that don't change anything before reading the torrents from the DB. Entries
+    are only ever trusted by the process that wrote them, and only until another process takes the sync lease.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.fingerprints = OrderedDict()
+        self.is_warm = False
+        # Generation of the sync lease the entries were written under
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def matches(self, realm_id, state):
+        key = (realm_id, state.info_hash)
+        with self.lock:
+            fingerprint = self.fingerprints.get(key)
+            if fingerprint is None:
+                return False
+            self.fingerprints.move_to_end(key)
+        return fingerprint == get_state_fingerprint(state)
+
+    def update(self, realm_id, states):
+        if not self.max_size:
+            return
+        with self.lock:
+            for state in states:
+                key = (realm_id, state.info_hash)
+                self.fingerprints[key] = get_state_fingerprint(state)
+                self.fingerprints.move_to_end(key)
+            while len(self.fingerprints) > self.max_size:
+                self.fingerprints.popitem(last=False)
+
+    def discard(self, realm_id, info_hashes):
+        with self.lock:
+            for info_hash in info_hashes:
+                self.fingerprints.pop((realm_id, info_hash), None)
+
+    def check_generation(self, generation):
+        """Clear the cache if the sync lease changed hands since the entries were written."""
+
+        if generation != self.generation:
+            if self.generation is not None:
+                logger.info('Sync lease changed hands, clearing torrent state cache.')
+            self.clear()
+            self.generation = generation
+
+    def clear(self):
+        with self.lock:
+            self.fingerprints.clear()
+            self.is_warm = False
+
+    def warm_up(self):
+        """Load the fingerprints of up to max_size torrents' current states from the DB."""
+
+        start = time.time()
+        self.clear()
+        rows = Torrent.objects.order_by().values_list(
+            'realm_id', 'info_hash', *(
+                'stats__' + field if field in TORRENT_STATS_FIELDS else field for field in TORRENT_STATE_FIELDS
+            ),
+        )[:self.max_size]
+        states_by_realm = {}
+        for row in rows.iterator():
+            states_by_realm.setdefault(row[0], []).append(TorrentState._make(row[1:]))
+        for realm_id, states in states_by_realm.items():
+            self.update(realm_id, states)
+        self.is_warm = True
+        logger.info('Warmed up torrent state cache with {} torrents in {:.3f} s.', len(self), time.time() - start)
+
+
+# Shared by everything applying Alcazar updates in this process
+torrent_state_cache = TorrentStateCache(settings.ALCAZAR_STATE_CACHE_SIZE)
+
+
+def on_torrent_saved_or_deleted(sender, instance, **kwargs):
+    torrent_state_cache.discard(instance.realm_id, [instance.info_hash])
+
+
+def on_torrents_added(sender, torrents, **kwargs):
+    for torrent in torrents:
+        torrent_state_cache.discard(torrent.realm_id, [torrent.info_hash])
+
+
+def on_torrents_removed(sender, realm, info_hashes, **kwargs):
+    torrent_state_cache.discard(realm.id, info_hashes)
@@ -0,0 +1,68 @@
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from torrents.models import AlcazarSyncLease
+
+LEASE_ID = 1
+
+
+class AlcazarSyncLeaseHolder:
+    """Takes the AlcazarSyncLease on behalf of one writer of Alcazar updates in this process, e.g. poll_alcazar.
+
+    Pops from Alcazar are destructive and have to be applied in order, so everything that pops or writes torrent
+    states (poll_alcazar, the update consumer, the reconciler) holds the lease while doing so. Taking the lease back
+    after releasing it is a renewal as long as nobody else held it in between. Otherwise the lease's generation is
+    incremented, which tells the holder that the torrents may have been written elsewhere in the meantime.
+    """
+
+    def __init__(self, role, seconds=None):
+        self.role = role
+        self.seconds = seconds if seconds is not None else settings.ALCAZAR_SYNC_LEASE_SECONDS
+        # Generation of the lease the last time it was acquired
+        self.generation = None
+
+    @property
+    def holder(self):
+        return '{}:{}:{}'.format(self.role, socket.gethostname(), os.getpid())
+
+    def _get_expires_datetime(self):
+        return timezone.now() + timedelta(seconds=self.seconds)
+
+    def acquire(self):
+        """Take the lease if it's free or expired, or renew it if it's ours. Returns whether it's held."""
+
+        lease_qs = AlcazarSyncLease.objects.filter(id=LEASE_ID)
+        # Still ours if nobody took it over, even if it expired in the meantime
+        if not self.renew():
+            taken = lease_qs.filter(Q(expires_datetime__isnull=True) | Q(expires_datetime__lte=timezone.now())).update(
+                holder=self.holder,
+                expires_datetime=self._get_expires_datetime(),
+                generation=F('generation') + 1,
+            )
+            if not taken:
+                if lease_qs.exists():
+                    return False
+                try:
+                    with transaction.atomic():
+                        AlcazarSyncLease.objects.create(id=LEASE_ID, holder=self.holder,
+                                                        expires_datetime=self._get_expires_datetime(), generation=1)
+                except IntegrityError:
+                    return False
+        self.generation = lease_qs.values_list('generation', flat=True).get()
+        return True
+
+    def renew(self):
+        """Extend the lease. Returns False if it's held by someone else."""
+
+        return bool(AlcazarSyncLease.objects.filter(id=LEASE_ID, holder=self.holder).update(
+            expires_datetime=self._get_expires_datetime()))
+
+    def release(self):
+        # Stay the holder, so that taking the lease back before anyone else does keeps its generation
+        AlcazarSyncLease.objects.filter(id=LEASE_ID, holder=self.holder).update(expires_datetime=timezone.now())
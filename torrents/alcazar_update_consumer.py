@@ -0,0 +1,98 @@
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from Harvest.utils import get_logger
+from monitoring.models import ComponentStatus
+from torrents.alcazar_client import AlcazarClient
+from torrents.alcazar_event_processor import AlcazarUpdateDrainer, UPDATE_BATCH_SIZE
+from torrents.alcazar_state_cache import torrent_state_cache
+from torrents.alcazar_sync_lease import AlcazarSyncLeaseHolder
+from torrents.exceptions import AlcazarNotConfiguredException
+
+logger = get_logger(__name__)
+
+CONSUMER_COMPONENT_NAME = 'alcazar_consumer'
+
+
+def is_consumer_active():
+    """Whether a consumer has reported in recently enough for poll_alcazar to leave the syncing to it."""
+
+    return ComponentStatus.objects.using('control').filter(
+        name=CONSUMER_COMPONENT_NAME,
+        status=ComponentStatus.STATUS_GREEN,
+        updated_datetime__gte=timezone.now() - timedelta(seconds=settings.ALCAZAR_CONSUMER_STALE_SECONDS),
+    ).exists()
+
+
+class AlcazarUpdateConsumer:
+    """Applies Alcazar updates as they arrive by long-polling pop_update_batch in a loop.
+
+    While it's running and healthy, it heartbeats through ComponentStatus and poll_alcazar stands down. When it stops
+    or stops heartbeating, poll_alcazar takes over again. Either only drains while holding the sync lease, so they
+    never apply pages concurrently around a handover.
+    """
+
+    def __init__(self, wait=None, error_retry_seconds=5):
+        self.wait = wait if wait is not None else settings.ALCAZAR_CONSUMER_WAIT
+        self.error_retry_seconds = error_retry_seconds
+        self.drainer = AlcazarUpdateDrainer(
+            UPDATE_BATCH_SIZE,
+            settings.ALCAZAR_UPDATE_PAGE_SECONDS,
+            torrent_state_cache if settings.ALCAZAR_STATE_CACHE_SIZE else None,
+            AlcazarSyncLeaseHolder('alcazar_consumer'),
+        )
+        self.stopped = threading.Event()
+        self.last_heartbeat = None
+
+    def stop(self):
+        self.stopped.set()
+
+    def heartbeat(self, status, message, traceback_str=None):
+        ComponentStatus.update_status(CONSUMER_COMPONENT_NAME, status, message, traceback_str)
+        self.last_heartbeat = time.time()
+
+    def run_once(self, client):
+        start = time.time()
+        num_events, has_more = self.drainer.drain(client, settings.ALCAZAR_DRAIN_BUDGET, wait=self.wait)
+        # An Alcazar without long-polling support returns empty batches immediately, don't spin on it
+        remaining = self.wait - (time.time() - start)
+        if not num_events and remaining > 0:
+            self.stopped.wait(remaining)
+        return num_events
+
+    def run(self):
+        logger.info('Consuming alcazar updates, long-polling for up to {} s.', self.wait)
+        client = None
+        while not self.stopped.is_set():
+            try:
+                if client is None:
+                    client = AlcazarClient(timeout=AlcazarClient.TIMEOUT_LONG)
+                self.run_once(client)
+                if self.last_heartbeat is None or (
+                        time.time() - self.last_heartbeat >= settings.ALCAZAR_CONSUMER_HEARTBEAT_INTERVAL):
+                    self.heartbeat(ComponentStatus.STATUS_GREEN, 'Alcazar update consumer is running.')
+            except AlcazarNotConfiguredException:
+                logger.info('Alcazar is not configured, waiting for config.')
+                self.heartbeat(ComponentStatus.STATUS_YELLOW, 'Alcazar update consumer is waiting for config.')
+                self.stopped.wait(self.error_retry_seconds)
+            except Exception:
+                logger.exception('Alcazar update consumer crashed, retrying in {} s.', self.error_retry_seconds)
+                client = None
+                try:
+                    self.heartbeat(ComponentStatus.STATUS_RED, 'Alcazar update consumer crashed.',
+                                   traceback.format_exc())
+                except Exception:
+                    logger.exception('Failed to update alcazar update consumer status.')
+                self.stopped.wait(self.error_retry_seconds)
+            finally:
+                close_old_connections()
+
+        # Hand the syncing back to poll_alcazar right away instead of after the heartbeat goes stale
+        self.heartbeat(ComponentStatus.STATUS_YELLOW, 'Alcazar update consumer is stopped.')
+        logger.info('Stopped consuming alcazar updates.')
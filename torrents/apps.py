@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class TorrentsConfig(AppConfig):
     name = 'torrents'
+
+    def ready(self):
+        from torrents import signals
+        from torrents.models import Torrent
+        from torrents.alcazar_state_cache import (on_torrent_saved_or_deleted, on_torrents_added,
+                                                  on_torrents_removed)
+        # Torrents changed outside of the sync invalidate the sync's cached states
+        post_save.connect(on_torrent_saved_or_deleted, sender=Torrent)
+        post_delete.connect(on_torrent_saved_or_deleted, sender=Torrent)
+        signals.torrents_added.connect(on_torrents_added)
+        signals.torrents_removed.connect(on_torrents_removed)
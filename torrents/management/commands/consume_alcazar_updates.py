@@ -0,0 +1,26 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from Harvest.utils import get_logger
+from torrents.alcazar_update_consumer import AlcazarUpdateConsumer
+
+logger = get_logger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Apply Alcazar updates as they arrive, instead of relying on the periodic poll_alcazar"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wait', type=float, help='Seconds to long-poll Alcazar for, defaults to settings.')
+
+    def handle(self, *args, **options):
+        consumer = AlcazarUpdateConsumer(wait=options['wait'])
+
+        def handle_shutdown_signal(sig_num, frame):
+            logger.info('Received signal {}, stopping.', sig_num)
+            consumer.stop()
+
+        signal.signal(signal.SIGINT, handle_shutdown_signal)
+        signal.signal(signal.SIGTERM, handle_shutdown_signal)
+        consumer.run()
@@ -0,0 +1,71 @@
+# Generated by Django 2.1.7 on 2026-10-17 06:20
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+from Harvest.utils import qs_chunks
+
+STATS_FIELDS = ('downloaded', 'uploaded', 'download_rate', 'upload_rate', 'progress')
+
+
+def copy_stats_to_torrent_stats(apps, schema_editor):
+    Torrent = apps.get_model('torrents', 'Torrent')
+    TorrentStats = apps.get_model('torrents', 'TorrentStats')
+    for batch in qs_chunks(Torrent.objects.only('id', *STATS_FIELDS), 1000):
+        with transaction.atomic():
+            TorrentStats.objects.bulk_create([
+                TorrentStats(torrent_id=t.id, **{field: getattr(t, field) for field in STATS_FIELDS})
+                for t in batch
+            ])
+
+
+def copy_torrent_stats_to_stats(apps, schema_editor):
+    Torrent = apps.get_model('torrents', 'Torrent')
+    TorrentStats = apps.get_model('torrents', 'TorrentStats')
+    for batch in qs_chunks(TorrentStats.objects.all(), 1000):
+        with transaction.atomic():
+            for stats in batch:
+                Torrent.objects.filter(id=stats.torrent_id).update(
+                    **{field: getattr(stats, field) for field in STATS_FIELDS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('torrents', '0026_auto_20190406_2229'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TorrentStats',
+            fields=[
+                ('torrent', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='torrents.Torrent')),
+                ('downloaded', models.BigIntegerField(null=True)),
+                ('uploaded', models.BigIntegerField(null=True)),
+                ('download_rate', models.BigIntegerField(null=True)),
+                ('upload_rate', models.BigIntegerField(null=True)),
+                ('progress', models.FloatField(null=True)),
+            ],
+        ),
+        migrations.RunPython(copy_stats_to_torrent_stats, copy_torrent_stats_to_stats, elidable=True),
+        migrations.RemoveField(
+            model_name='torrent',
+            name='download_rate',
+        ),
+        migrations.RemoveField(
+            model_name='torrent',
+            name='downloaded',
+        ),
+        migrations.RemoveField(
+            model_name='torrent',
+            name='progress',
+        ),
+        migrations.RemoveField(
+            model_name='torrent',
+            name='upload_rate',
+        ),
+        migrations.RemoveField(
+            model_name='torrent',
+            name='uploaded',
+        ),
+    ]
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+import torrents.fields
+
+
+def copy_to_binary(apps, schema_editor):
+    for model_name in ('TorrentInfo', 'Torrent'):
+        torrents.fields.copy_info_hashes(apps.get_model('torrents', model_name), 'info_hash', 'info_hash_binary')
+
+
+def copy_from_binary(apps, schema_editor):
+    for model_name in ('TorrentInfo', 'Torrent'):
+        torrents.fields.copy_info_hashes(apps.get_model('torrents', model_name), 'info_hash_binary', 'info_hash')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('torrents', '0027_torrentstats'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='torrentinfo',
+            index_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='torrent',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='torrentinfo',
+            name='info_hash_binary',
+            field=torrents.fields.BinaryInfoHashField(null=True),
+        ),
+        migrations.AddField(
+            model_name='torrent',
+            name='info_hash_binary',
+            field=torrents.fields.BinaryInfoHashField(null=True),
+        ),
+        # Nullable, so that reversing the RemoveField can add the column back before its values are copied
+        migrations.AlterField(
+            model_name='torrentinfo',
+            name='info_hash',
+            field=torrents.fields.InfoHashField(db_index=True, max_length=40, null=True),
+        ),
+        migrations.AlterField(
+            model_name='torrent',
+            name='info_hash',
+            field=torrents.fields.InfoHashField(db_index=True, max_length=40, null=True),
+        ),
+        migrations.RunPython(copy_to_binary, copy_from_binary, elidable=True),
+        migrations.RemoveField(
+            model_name='torrentinfo',
+            name='info_hash',
+        ),
+        migrations.RemoveField(
+            model_name='torrent',
+            name='info_hash',
+        ),
+        migrations.RenameField(
+            model_name='torrentinfo',
+            old_name='info_hash_binary',
+            new_name='info_hash',
+        ),
+        migrations.RenameField(
+            model_name='torrent',
+            old_name='info_hash_binary',
+            new_name='info_hash',
+        ),
+        migrations.AlterField(
+            model_name='torrentinfo',
+            name='info_hash',
+            field=torrents.fields.BinaryInfoHashField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='torrent',
+            name='info_hash',
+            field=torrents.fields.BinaryInfoHashField(db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='torrentinfo',
+            index_together={('realm', 'info_hash')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='torrent',
+            unique_together={('realm', 'info_hash')},
+        ),
+    ]
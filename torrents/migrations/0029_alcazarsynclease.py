@@ -0,0 +1,22 @@
+# Generated by Django 2.1.7 on 2026-10-17 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('torrents', '0028_binary_info_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlcazarSyncLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(max_length=256, null=True)),
+                ('expires_datetime', models.DateTimeField(null=True)),
+                ('generation', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -3,7 +3,7 @@ import random
 from django.db import models
 
 from torrents.exceptions import AlcazarNotConfiguredException
-from torrents.fields import InfoHashField
+from torrents.fields import BinaryInfoHashField
 
 
 class Realm(models.Model):
@@ -56,6 +56,15 @@ class AlcazarClientConfig(models.Model):
                 'Client config is missing. Please configure your account through settings.')
 
 
+class AlcazarSyncLease(models.Model):
+    """Singleton lease on applying Alcazar updates, see torrents.alcazar_sync_lease."""
+
+    holder = models.CharField(max_length=256, null=True)
+    expires_datetime = models.DateTimeField(null=True)
+    # Incremented whenever the lease changes hands
+    generation = models.IntegerField(default=0)
+
+
 class TorrentInfo(models.Model):
     """
     Main table for storing tracker-specific torrent information, as fetched from the remote.
@@ -69,7 +78,7 @@ class TorrentInfo(models.Model):
     # If the original is deleted, instead of deleting it from DB, we can just mark it as is_deleted=True
     is_deleted = models.BooleanField()
     # Info hash of the torrent inside.
-    info_hash = InfoHashField(db_index=True)
+    info_hash = BinaryInfoHashField(db_index=True)
     # Tracker-specific torrent identifier. In most cases this is a torrent_id in some for or another.
     tracker_id = models.CharField(max_length=65536, db_index=True)
     # Date when this information was fetched (or updated).
@@ -95,6 +104,26 @@ class TorrentFile(models.Model):
     torrent_file = models.BinaryField()
 
 
+# Transfer stats that change on almost every sync. They live in TorrentStats, so that updating them doesn't rewrite
+# the wide and heavily indexed Torrent row, and are exposed on Torrent through properties.
+TORRENT_STATS_FIELDS = ('downloaded', 'uploaded', 'download_rate', 'upload_rate', 'progress')
+
+
+class TorrentManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().select_related('stats')
+
+
+def _torrent_stats_property(name):
+    def getter(self):
+        return getattr(self.get_stats(), name)
+
+    def setter(self, value):
+        setattr(self.get_stats(), name, value)
+
+    return property(getter, setter)
+
+
 class Torrent(models.Model):
     """Main table for torrents that are present in a torrent client."""
 
@@ -116,23 +145,60 @@ class Torrent(models.Model):
     torrent_info = models.OneToOneField(TorrentInfo, models.PROTECT, null=True, related_name='torrent')
 
     client = models.CharField(max_length=64)
-    info_hash = InfoHashField(db_index=True)
+    info_hash = BinaryInfoHashField(db_index=True)
     status = models.IntegerField(choices=STATUS_CHOICES)
     download_path = models.CharField(max_length=65536)
     name = models.TextField(null=True)
     size = models.BigIntegerField(null=True)
-    downloaded = models.BigIntegerField(null=True)
-    uploaded = models.BigIntegerField(null=True)
-    download_rate = models.BigIntegerField(null=True)
-    upload_rate = models.BigIntegerField(null=True)
-    progress = models.FloatField(null=True)
     added_datetime = models.DateTimeField(null=True, db_index=True)
     error = models.TextField(null=True, db_index=True)
     tracker_error = models.TextField(null=True, db_index=True)
 
+    downloaded = _torrent_stats_property('downloaded')
+    uploaded = _torrent_stats_property('uploaded')
+    download_rate = _torrent_stats_property('download_rate')
+    upload_rate = _torrent_stats_property('upload_rate')
+    progress = _torrent_stats_property('progress')
+
+    objects = TorrentManager()
+
     class Meta:
         unique_together = (('realm', 'info_hash'),)
 
+    def get_stats(self):
+        """The torrent's TorrentStats, created in memory (and saved along with the torrent) if it has none yet."""
+
+        try:
+            return self.stats
+        except TorrentStats.DoesNotExist:
+            self.stats = TorrentStats(torrent=self)
+            return self.stats
+
+    def save(self, *args, **kwargs):
+        save_stats = self._state.adding or Torrent.stats.is_cached(self)
+        update_fields = kwargs.get('update_fields')
+        stats_update_fields = None
+        if update_fields is not None:
+            stats_update_fields = [f for f in update_fields if f in TORRENT_STATS_FIELDS]
+            kwargs['update_fields'] = [f for f in update_fields if f not in TORRENT_STATS_FIELDS]
+            save_stats = bool(stats_update_fields)
+        if update_fields is None or kwargs['update_fields']:
+            super().save(*args, **kwargs)
+        if save_stats:
+            stats = self.get_stats()
+            # The torrent's id is only known after it's inserted
+            stats.torrent = self
+            stats.save(update_fields=stats_update_fields)
+
+
+class TorrentStats(models.Model):
+    torrent = models.OneToOneField(Torrent, models.CASCADE, primary_key=True, related_name='stats')
+    downloaded = models.BigIntegerField(null=True)
+    uploaded = models.BigIntegerField(null=True)
+    download_rate = models.BigIntegerField(null=True)
+    upload_rate = models.BigIntegerField(null=True)
+    progress = models.FloatField(null=True)
+
 
 class DownloadLocation(models.Model):
     """Table for download locations - patterns to use to determine where downloads are stored."""
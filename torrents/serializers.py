@@ -1,9 +1,25 @@
 from rest_framework import serializers
 
+from torrents.fields import info_hash_to_bytes
 from torrents.models import AlcazarClientConfig, Realm, Torrent, TorrentInfo, DownloadLocation
 from trackers.registry import TrackerRegistry
 
 
+class InfoHashSerializerField(serializers.CharField):
+    """Info hashes are exchanged as 40 character lowercase hex strings. Declare it for every BinaryInfoHashField."""
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        try:
+            return info_hash_to_bytes(value).hex()
+        except ValueError:
+            self.fail('invalid')
+
+    default_error_messages = {
+        'invalid': 'Enter a valid 40 character hex info hash.',
+    }
+
+
 class AlcazarClientConfigSerializer(serializers.ModelSerializer):
     class Meta:
         model = AlcazarClientConfig
@@ -17,6 +33,7 @@ class RealmSerializer(serializers.ModelSerializer):
 
 
 class TorrentInfoSerializer(serializers.ModelSerializer):
+    info_hash = InfoHashSerializerField()
     metadata = serializers.SerializerMethodField()
 
     def __init__(self, *args, **kwargs):
@@ -57,7 +74,13 @@ class TorrentInfoSerializer(serializers.ModelSerializer):
 
 class TorrentSerializer(serializers.ModelSerializer):
     realm = serializers.IntegerField(source='realm_id')
+    info_hash = InfoHashSerializerField()
     torrent_info = TorrentInfoSerializer()
+    downloaded = serializers.IntegerField(read_only=True)
+    uploaded = serializers.IntegerField(read_only=True)
+    download_rate = serializers.IntegerField(read_only=True)
+    upload_rate = serializers.IntegerField(read_only=True)
+    progress = serializers.FloatField(read_only=True)
 
     @classmethod
     def get_context_from_request_data(cls, data):
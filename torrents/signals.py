@@ -1,6 +1,45 @@
 import django.dispatch
+from django.conf import settings
 
+# Batch signals, sent once per processed batch of Alcazar updates. Receivers should handle the whole list with
+# set-based queries. torrents_removed is sent with realm and info_hashes, the rest with torrents.
+torrents_added = django.dispatch.Signal()
+torrents_updated = django.dispatch.Signal()
+torrents_finished = django.dispatch.Signal()
+torrents_removed = django.dispatch.Signal()
+
+# Per-torrent signals, only sent when TORRENTS_PER_TORRENT_SIGNALS is enabled for receivers that aren't batched yet
 torrent_added = django.dispatch.Signal()
 torrent_updated = django.dispatch.Signal()
 torrent_finished = django.dispatch.Signal()
 torrent_removed = django.dispatch.Signal()
+
+
+def _send(batch_signal, per_torrent_signal, sender, torrents):
+    if not torrents:
+        return
+    batch_signal.send_robust(sender, torrents=torrents)
+    if settings.TORRENTS_PER_TORRENT_SIGNALS:
+        for torrent in torrents:
+            per_torrent_signal.send_robust(sender, torrent=torrent)
+
+
+def send_torrents_added(sender, torrents):
+    _send(torrents_added, torrent_added, sender, torrents)
+
+
+def send_torrents_updated(sender, torrents):
+    _send(torrents_updated, torrent_updated, sender, torrents)
+
+
+def send_torrents_finished(sender, torrents):
+    _send(torrents_finished, torrent_finished, sender, torrents)
+
+
+def send_torrents_removed(sender, realm, info_hashes):
+    if not info_hashes:
+        return
+    torrents_removed.send_robust(sender, realm=realm, info_hashes=info_hashes)
+    if settings.TORRENTS_PER_TORRENT_SIGNALS:
+        for info_hash in info_hashes:
+            torrent_removed.send_robust(sender, realm=realm, info_hash=info_hash)
@@ -1,43 +1,93 @@
-from django.db import transaction
+import requests
+from django.conf import settings
 
 from Harvest.utils import get_logger
 from monitoring.decorators import update_component_status
-from task_queue.task_queue import TaskQueue
+from task_queue.task_queue import TaskQueue, RUN_AGAIN, BACK_OFF
+from torrents.add_torrent import fetch_torrent, add_torrent_from_tracker
 from torrents.alcazar_client import AlcazarClient
-from torrents.alcazar_event_processor import AlcazarEventProcessor
-from torrents.exceptions import AlcazarNotConfiguredException
+from torrents.alcazar_event_processor import AlcazarUpdateDrainer, UPDATE_BATCH_SIZE
+from torrents.alcazar_reconciler import AlcazarReconciler
+from torrents.alcazar_state_cache import torrent_state_cache
+from torrents.alcazar_sync_lease import AlcazarSyncLeaseHolder
+from torrents.alcazar_update_consumer import is_consumer_active
+from torrents.exceptions import AlcazarNotConfiguredException, RealmNotFoundException
+from torrents.models import Realm
+from torrents.serializers import TorrentInfoSerializer, TorrentSerializer
+from trackers.registry import TrackerRegistry
 
 logger = get_logger(__name__)
 
-UPDATE_BATCH_SIZE = 5000
+update_drainer = AlcazarUpdateDrainer(
+    UPDATE_BATCH_SIZE,
+    settings.ALCAZAR_UPDATE_PAGE_SECONDS,
+    torrent_state_cache if settings.ALCAZAR_STATE_CACHE_SIZE else None,
+    AlcazarSyncLeaseHolder('poll_alcazar'),
+)
 
 
-@TaskQueue.periodic_task(3)
-@transaction.atomic
+@TaskQueue.periodic_task(3, max_interval_seconds=30, timeout=300, queue='sync')
 @update_component_status(
     'alcazar_update',
     'Alcazar update completed successfully in {time_taken:.3f} s.',
     'Alcazar update crashed.',
 )
 def poll_alcazar():
+    if is_consumer_active():
+        logger.debug('Skipping alcazar poll, updates are being consumed by consume_alcazar_updates.')
+        return BACK_OFF
+
     try:
         client = AlcazarClient(timeout=60)
     except AlcazarNotConfiguredException:
         logger.info('Skipping alcazar poll due to missing config.')
+        return BACK_OFF
+
+    num_events, has_more = update_drainer.drain(client, settings.ALCAZAR_DRAIN_BUDGET)
+
+    # Out of time budget with more backlog waiting, continue without waiting for the next interval
+    if has_more:
+        return RUN_AGAIN
+    elif not num_events:
+        return BACK_OFF
+
+
+# Runs on the default queue, a slow reconciliation must not hold up poll_alcazar's worker
+@TaskQueue.periodic_task(settings.ALCAZAR_RECONCILE_INTERVAL, timeout=600)
+@update_component_status(
+    'alcazar_reconcile',
+    'Alcazar reconciliation completed successfully in {time_taken:.3f} s.',
+    'Alcazar reconciliation crashed.',
+)
+def reconcile_alcazar():
+    try:
+        client = AlcazarClient(timeout=60)
+    except AlcazarNotConfiguredException:
+        logger.info('Skipping alcazar reconciliation due to missing config.')
         return
 
-    update_batch = client.pop_update_batch(5000)
+    if AlcazarReconciler(settings.ALCAZAR_RECONCILE_PREFIX_LENGTH).reconcile(client) is None:
+        logger.info('Skipping alcazar reconciliation, Alcazar does not support digests.')
 
-    num_added = 0
-    num_updated = 0
-    num_removed = 0
 
-    for realm_batch in update_batch.values():
-        num_added += len(realm_batch['added'])
-        num_updated += len(realm_batch['updated'])
-        num_removed += len(realm_batch['removed'])
+@TaskQueue.async_task(queue='interactive', retries=2, retry_on=(requests.RequestException,))
+def fetch_torrent_task(tracker_name, tracker_id):
+    tracker = TrackerRegistry.get_plugin(tracker_name, 'fetch_torrent')
+    try:
+        realm = Realm.objects.get(name=tracker.name)
+    except Realm.DoesNotExist:
+        raise RealmNotFoundException(tracker.name)
+    torrent_info = fetch_torrent(realm, tracker, tracker_id)
+    return TorrentInfoSerializer(torrent_info).data
 
-    logger.debug('Received {} added, {} updated and {} removed from alcazar.', num_added, num_updated, num_removed)
 
-    processor = AlcazarEventProcessor()
-    processor.process(update_batch)
+@TaskQueue.async_task(queue='interactive')
+def add_torrent_from_tracker_task(tracker_name, tracker_id, download_path_pattern):
+    tracker = TrackerRegistry.get_plugin(tracker_name, 'add_torrent_from_tracker')
+    added_torrent = add_torrent_from_tracker(
+        tracker=tracker,
+        tracker_id=tracker_id,
+        download_path_pattern=download_path_pattern,
+        force_fetch=True,
+    )
+    return TorrentSerializer(added_torrent).data
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Alcazar's side of the digest format, written out separately from torrents.alcazar_reconciler on purpose
+DIGEST_FIELDS = ('info_hash', 'client', 'status', 'download_path', 'name', 'size', 'progress', 'error',
+                 'tracker_error')
+
+
+class FakeAlcazar:
+    """In-process HTTP server implementing the parts of the Alcazar API used by the sync, for tests.
+
+    Updates queued through push() are returned by /pop_update_batch, which long-polls when given a wait parameter
+    (unless supports_wait is False, to behave like older Alcazar versions). push() also applies them to the torrents
+    that /digests reports on (unless supports_digests is False).
+    """
+
+    def __init__(self, supports_wait=True, supports_digests=True):
+        self.supports_wait = supports_wait
+        self.supports_digests = supports_digests
+        self.condition = threading.Condition()
+        # Pending (realm_name, kind, item) events, in order
+        self.events = []
+        # Current torrent states by realm name and info hash
+        self.torrents = {}
+        self.requests = []
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return 'http://{}:{}/'.format(*self.server.server_address)
+
+    def push(self, realm_name, added=(), updated=(), removed=()):
+        with self.condition:
+            self.events.extend((realm_name, 'added', item) for item in added)
+            self.events.extend((realm_name, 'updated', item) for item in updated)
+            self.events.extend((realm_name, 'removed', item) for item in removed)
+            torrents = self.torrents.setdefault(realm_name, {})
+            torrents.update((state['info_hash'], state) for state in list(added) + list(updated))
+            for info_hash in removed:
+                torrents.pop(info_hash, None)
+            self.condition.notify_all()
+
+    def drop_events(self):
+        """Discard the pending events, like a lost update batch."""
+
+        with self.condition:
+            self.events = []
+
+    def pop_update_batch(self, limit, wait):
+        with self.condition:
+            if wait and self.supports_wait:
+                self.condition.wait_for(lambda: self.events, timeout=wait)
+            events, self.events = self.events[:limit], self.events[limit:]
+        batch = {}
+        for realm_name, kind, item in events:
+            batch.setdefault(realm_name, {'added': [], 'updated': [], 'removed': []})[kind].append(item)
+        return batch
+
+    def get_digests(self, prefix_length):
+        digests = {}
+        with self.condition:
+            for realm_name, torrents in self.torrents.items():
+                buckets = digests[realm_name] = {}
+                for info_hash, state in torrents.items():
+                    data = json.dumps([state[field] for field in DIGEST_FIELDS], separators=(',', ':'))
+                    count, digest = buckets.get(info_hash[:prefix_length], (0, 0))
+                    buckets[info_hash[:prefix_length]] = (
+                        count + 1, digest ^ int(hashlib.sha1(data.encode()).hexdigest(), 16))
+        return {
+            realm_name: {prefix: [count, '{:040x}'.format(digest)] for prefix, (count, digest) in buckets.items()}
+            for realm_name, buckets in digests.items()
+        }
+
+    def get_bucket_torrents(self, realm_name, prefix):
+        with self.condition:
+            return [state for info_hash, state in self.torrents[realm_name].items() if info_hash.startswith(prefix)]
+
+    def _create_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, status_code, data):
+                body = json.dumps(data).encode()
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method):
+                url = urllib.parse.urlparse(self.path)
+                params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+                fake.requests.append((method, url.path, params, time.time()))
+                if method == 'GET' and url.path == '/ping':
+                    self._respond(200, {'success': True})
+                elif method == 'POST' and url.path == '/pop_update_batch':
+                    wait = float(params['wait']) if 'wait' in params else None
+                    self._respond(200, fake.pop_update_batch(int(params['limit']), wait))
+                elif method == 'GET' and fake.supports_digests and url.path == '/digests':
+                    self._respond(200, fake.get_digests(int(params['prefix_length'])))
+                elif method == 'GET' and fake.supports_digests and url.path.startswith('/digests/'):
+                    _, _, realm_name, prefix = url.path.split('/')
+                    self._respond(200, fake.get_bucket_torrents(realm_name, prefix))
+                else:
+                    self._respond(404, {'detail': 'Not found.'})
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._create_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
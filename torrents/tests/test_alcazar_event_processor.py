@@ -0,0 +1,138 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from torrents import signals
+from torrents.alcazar_client import create_torrents_from_alcazar
+from torrents.alcazar_event_processor import AlcazarEventProcessor
+from torrents.models import Realm, Torrent, TorrentInfo
+from torrents.tests.utils import make_torrent_state, make_info_hash
+
+
+class AlcazarEventProcessorTests(TestCase):
+    def setUp(self):
+        self.realm = Realm.objects.create(name='test_realm')
+        self.received = []
+        for signal in (signals.torrents_added, signals.torrents_updated, signals.torrents_finished):
+            signal.connect(self.on_signal)
+            self.addCleanup(signal.disconnect, self.on_signal)
+        signals.torrents_removed.connect(self.on_removed_signal)
+        self.addCleanup(signals.torrents_removed.disconnect, self.on_removed_signal)
+
+    def on_signal(self, signal, torrents, **kwargs):
+        self.received.append((signal, [torrent.info_hash for torrent in torrents]))
+
+    def on_removed_signal(self, signal, realm, info_hashes, **kwargs):
+        self.received.append((signal, info_hashes))
+
+    def process(self, added=(), updated=(), removed=()):
+        AlcazarEventProcessor.process({
+            self.realm.name: {'added': list(added), 'updated': list(updated), 'removed': list(removed)},
+        })
+
+    def test_adds_torrents(self):
+        self.process(added=[make_torrent_state(make_info_hash(i)) for i in range(3)])
+
+        self.assertEqual(Torrent.objects.filter(realm=self.realm).count(), 3)
+        self.assertEqual(self.received, [(signals.torrents_added, [make_info_hash(i) for i in range(3)])])
+
+    def test_updates_changed_fields_in_bulk(self):
+        states = [make_torrent_state(make_info_hash(i), progress=0.5, downloaded=500) for i in range(100)]
+        self.process(added=states)
+        self.received.clear()
+
+        updated_states = [dict(state, uploaded=10) for state in states]
+        updated_states[0].update(progress=1.0, downloaded=1000)
+        with CaptureQueriesContext(connection) as queries:
+            self.process(updated=updated_states)
+
+        update_queries = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertLess(len(update_queries), 10)
+        self.assertTrue(all('"name"' not in sql for sql in update_queries))
+        self.assertEqual(set(Torrent.objects.values_list('stats__uploaded', flat=True)), {10})
+        finished = Torrent.objects.get(info_hash=make_info_hash(0))
+        self.assertEqual((finished.progress, finished.downloaded), (1.0, 1000))
+        self.assertEqual(Torrent.objects.get(info_hash=make_info_hash(1)).progress, 0.5)
+        self.assertEqual(self.received, [
+            (signals.torrents_updated, [make_info_hash(i) for i in range(100)]),
+            (signals.torrents_finished, [make_info_hash(0)]),
+        ])
+
+    def test_skips_unchanged(self):
+        states = [make_torrent_state(make_info_hash(i)) for i in range(3)]
+        self.process(added=states)
+        self.received.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.process(updated=states)
+
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')])
+        self.assertEqual(self.received, [])
+
+    def test_removes_torrents(self):
+        self.process(added=[make_torrent_state(make_info_hash(1))])
+
+        self.received.clear()
+
+        self.process(removed=[make_info_hash(1), make_info_hash(2)])
+
+        self.assertFalse(Torrent.objects.exists())
+        self.assertEqual(self.received, [(signals.torrents_removed, [make_info_hash(1)])])
+
+    def test_per_torrent_signals_are_opt_in(self):
+        received = []
+
+        def on_torrent_added(signal, torrent, **kwargs):
+            received.append(torrent.info_hash)
+
+        signals.torrent_added.connect(on_torrent_added)
+        self.addCleanup(signals.torrent_added.disconnect, on_torrent_added)
+
+        self.process(added=[make_torrent_state(make_info_hash(1))])
+        self.assertEqual(received, [])
+
+        with override_settings(TORRENTS_PER_TORRENT_SIGNALS=True):
+            self.process(added=[make_torrent_state(make_info_hash(2))])
+        self.assertEqual(received, [make_info_hash(2)])
+
+
+class CreateTorrentsFromAlcazarTests(TestCase):
+    def setUp(self):
+        self.realm = Realm.objects.create(name='test_realm')
+
+    def create_torrent_info(self, info_hash):
+        return TorrentInfo.objects.create(
+            realm=self.realm,
+            info_hash=info_hash,
+            tracker_id=info_hash,
+            is_deleted=False,
+            fetched_datetime=timezone.now(),
+            raw_response=b'',
+        )
+
+    def test_bulk_creates_and_links(self):
+        torrent_info = self.create_torrent_info(make_info_hash(1))
+        states = [make_torrent_state(make_info_hash(i)) for i in range(50)]
+
+        with CaptureQueriesContext(connection) as queries:
+            created = create_torrents_from_alcazar(self.realm, states, {torrent_info.info_hash: torrent_info.id})
+
+        self.assertEqual(len(created), 50)
+        self.assertTrue(all(t.id for t in created))
+        self.assertLess(len([q for q in queries.captured_queries if q['sql'].startswith('INSERT')]), 5)
+        self.assertEqual(Torrent.objects.get(info_hash=make_info_hash(1)).torrent_info_id, torrent_info.id)
+
+    def test_existing_torrents(self):
+        # Added concurrently, e.g. through the API, before its TorrentInfo was stored
+        create_torrents_from_alcazar(self.realm, [make_torrent_state(make_info_hash(1))], {})
+        torrent_info = self.create_torrent_info(make_info_hash(1))
+        states = [make_torrent_state(make_info_hash(i), uploaded=5) for i in range(3)]
+
+        created = create_torrents_from_alcazar(self.realm, states, {torrent_info.info_hash: torrent_info.id})
+
+        self.assertEqual({t.info_hash for t in created}, {make_info_hash(0), make_info_hash(2)})
+        existing = Torrent.objects.get(info_hash=make_info_hash(1))
+        self.assertEqual(existing.torrent_info_id, torrent_info.id)
+        self.assertEqual(existing.uploaded, 5)
+        self.assertEqual(Torrent.objects.count(), 3)
@@ -0,0 +1,138 @@
+from django.test import TestCase
+
+from torrents.alcazar_client import AlcazarClient
+from torrents.alcazar_event_processor import AlcazarEventProcessor
+from torrents.alcazar_reconciler import (AlcazarReconciler, get_bucket_digests, get_db_rows, get_row_digest,
+                                        get_state_row)
+from torrents.alcazar_state import normalize_torrent_state
+from torrents.alcazar_state_cache import torrent_state_cache
+from torrents.alcazar_sync_lease import AlcazarSyncLeaseHolder
+from torrents.models import AlcazarClientConfig, Realm, Torrent
+from torrents.tests.fake_alcazar import FakeAlcazar
+from torrents.tests.utils import make_torrent_state, make_info_hash
+
+
+class BucketDigestTests(TestCase):
+    def test_order_independent(self):
+        rows = [[make_info_hash(i), 'test_client', 3] for i in range(5)]
+
+        self.assertEqual(get_bucket_digests(rows, 2), get_bucket_digests(reversed(rows), 2))
+        self.assertEqual(get_bucket_digests(rows, 2), {'00': (5, get_bucket_digests(rows, 2)['00'][1])})
+
+    def test_detects_changes(self):
+        rows = [[make_info_hash(i), 'test_client', 3] for i in range(5)]
+        changed_rows = rows[:4] + [[make_info_hash(4), 'test_client', 4]]
+
+        self.assertNotEqual(get_bucket_digests(rows, 2), get_bucket_digests(changed_rows, 2))
+        self.assertNotEqual(get_row_digest(rows[0]), get_row_digest(rows[1]))
+
+    def test_wire_format(self):
+        # Pins the digest format shared with Alcazar, changing it needs a matching Alcazar release
+        states = [
+            make_torrent_state(make_info_hash(1)),
+            make_torrent_state(make_info_hash(2), progress=0.5, error='Error'),
+        ]
+        expected = {'00': (2, 0xf513667071f2d9c2c4977c8e03db9c930dcceded)}
+
+        self.assertEqual(get_row_digest(get_state_row(normalize_torrent_state(states[0]))),
+                         0x73853e4dbf3d267d06b40211f8892143e7fd6702)
+        self.assertEqual(get_bucket_digests((get_state_row(normalize_torrent_state(s)) for s in states), 2), expected)
+
+        realm = Realm.objects.create(name='test_realm')
+        AlcazarEventProcessor.process({realm.name: {'added': states, 'updated': [], 'removed': []}})
+        self.assertEqual(get_bucket_digests(get_db_rows(realm), 2), expected)
+
+    def test_db_rows_by_prefix(self):
+        realm = Realm.objects.create(name='test_realm')
+        AlcazarEventProcessor.process({realm.name: {
+            'added': [make_torrent_state(info_hash) for info_hash in ('00' * 20, '0f' + 'ff' * 19, '10' + '00' * 19)],
+            'updated': [],
+            'removed': [],
+        }})
+
+        self.assertEqual(sorted(row[0] for row in get_db_rows(realm, '0')), ['00' * 20, '0f' + 'ff' * 19])
+        self.assertEqual([row[0] for row in get_db_rows(realm, '10')], ['10' + '00' * 19])
+
+
+class AlcazarReconcilerTests(TestCase):
+    def setUp(self):
+        torrent_state_cache.clear()
+        self.alcazar = FakeAlcazar()
+        AlcazarClientConfig.objects.create(base_url=self.alcazar.start())
+        self.addCleanup(self.alcazar.stop)
+        self.client = AlcazarClient()
+        self.reconciler = AlcazarReconciler(prefix_length=2)
+
+        # Spread the torrents over a few buckets
+        self.info_hashes = [make_info_hash(i << 152) for i in range(1, 6)]
+        self.alcazar.push('test_realm', added=[make_torrent_state(info_hash) for info_hash in self.info_hashes])
+        self.sync()
+
+    def sync(self):
+        AlcazarEventProcessor.process(self.client.pop_update_batch(1000))
+
+    def get_bucket_requests(self):
+        return [path for method, path, params, _ in self.alcazar.requests if path.startswith('/digests/')]
+
+    def test_in_sync(self):
+        self.assertEqual(self.reconciler.reconcile(self.client), 0)
+
+        self.assertEqual(self.get_bucket_requests(), [])
+
+    def test_fixes_lost_batch(self):
+        self.alcazar.push(
+            'test_realm',
+            added=[make_torrent_state(make_info_hash(7 << 152))],
+            updated=[make_torrent_state(self.info_hashes[0], status=4, progress=0.5)],
+            removed=[self.info_hashes[1]],
+        )
+        self.alcazar.drop_events()
+
+        self.assertEqual(self.reconciler.reconcile(self.client), 3)
+
+        self.assertEqual(len(self.get_bucket_requests()), 3)
+        self.assertEqual(
+            set(Torrent.objects.values_list('info_hash', flat=True)),
+            set(self.info_hashes) - {self.info_hashes[1]} | {make_info_hash(7 << 152)},
+        )
+        torrent = Torrent.objects.get(info_hash=self.info_hashes[0])
+        self.assertEqual((torrent.status, torrent.progress), (4, 0.5))
+        self.assertEqual(self.reconciler.reconcile(self.client), 0)
+
+    def test_skips_bucket_that_caught_up(self):
+        self.alcazar.push('test_realm', updated=[make_torrent_state(self.info_hashes[0], status=4)])
+        acquire = self.reconciler.lease.acquire
+
+        # The sync catches up after the digests were compared, just before the reconciler gets the lease
+        def sync_and_acquire():
+            self.sync()
+            return acquire()
+
+        self.reconciler.lease.acquire = sync_and_acquire
+
+        self.assertEqual(self.reconciler.reconcile(self.client), 0)
+        self.assertEqual(len(self.get_bucket_requests()), 1)
+        self.assertEqual(Torrent.objects.get(info_hash=self.info_hashes[0]).status, 4)
+
+    def test_skips_buckets_while_lease_is_held_elsewhere(self):
+        self.alcazar.push('test_realm', updated=[make_torrent_state(self.info_hashes[0], status=4)])
+        self.alcazar.drop_events()
+        poll_lease = AlcazarSyncLeaseHolder('poll_alcazar')
+        poll_lease.acquire()
+
+        self.assertEqual(self.reconciler.reconcile(self.client), 0)
+        self.assertEqual(self.get_bucket_requests(), [])
+
+        poll_lease.release()
+        self.assertEqual(self.reconciler.reconcile(self.client), 1)
+        self.assertEqual(Torrent.objects.get(info_hash=self.info_hashes[0]).status, 4)
+
+
+class UnsupportedDigestsTests(TestCase):
+    def setUp(self):
+        self.alcazar = FakeAlcazar(supports_digests=False)
+        AlcazarClientConfig.objects.create(base_url=self.alcazar.start())
+        self.addCleanup(self.alcazar.stop)
+
+    def test_reconcile_skipped(self):
+        self.assertIsNone(AlcazarReconciler(prefix_length=2).reconcile(AlcazarClient()))
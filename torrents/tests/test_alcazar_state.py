@@ -0,0 +1,37 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.test import TestCase
+
+from torrents.alcazar_client import alcazar_torrent_equals, create_torrents_from_alcazar
+from torrents.alcazar_state import normalize_torrent_state, get_changed_fields, parse_alcazar_datetime
+from torrents.models import Realm, Torrent
+from torrents.tests.utils import make_torrent_state, make_info_hash
+
+
+class AlcazarStateTests(TestCase):
+    def test_normalize(self):
+        state = normalize_torrent_state(make_torrent_state(make_info_hash(1), progress=1, date_added=None))
+
+        self.assertIsInstance(state.progress, float)
+        self.assertIsNone(state.added_datetime)
+
+    def test_parse_datetime(self):
+        parse_alcazar_datetime.cache_clear()
+        for _ in range(2):
+            value = parse_alcazar_datetime('2019-03-01T14:00:00+02:00')
+
+        self.assertEqual(value, datetime(2019, 3, 1, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(parse_alcazar_datetime.cache_info().hits, 1)
+
+    def test_unchanged_after_save(self):
+        realm = Realm.objects.create(name='test_realm')
+        torrent_state = make_torrent_state(make_info_hash(1))
+        create_torrents_from_alcazar(realm, [torrent_state], {})
+        torrent = Torrent.objects.get()
+
+        self.assertTrue(alcazar_torrent_equals(torrent, torrent_state))
+        self.assertEqual(get_changed_fields(torrent, normalize_torrent_state(torrent_state)), [])
+
+        changed_state = dict(torrent_state, uploaded=10, date_added='2019-03-02T12:00:00+00:00')
+        self.assertEqual(get_changed_fields(torrent, normalize_torrent_state(changed_state)),
+                         ['uploaded', 'added_datetime'])
@@ -0,0 +1,123 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from torrents.alcazar_event_processor import AlcazarEventProcessor, AlcazarUpdateDrainer
+from torrents.alcazar_state import normalize_torrent_state
+from torrents.alcazar_state_cache import TorrentStateCache, torrent_state_cache
+from torrents.alcazar_sync_lease import AlcazarSyncLeaseHolder
+from torrents.models import Realm, Torrent
+from torrents.tests.utils import make_torrent_state, make_info_hash
+
+
+class TorrentStateCacheTests(TestCase):
+    def setUp(self):
+        self.realm = Realm.objects.create(name='test_realm')
+        self.cache = TorrentStateCache(100)
+        self.states = [make_torrent_state(make_info_hash(i)) for i in range(10)]
+
+    def process(self, added=(), updated=(), removed=()):
+        AlcazarEventProcessor.process({
+            self.realm.name: {'added': list(added), 'updated': list(updated), 'removed': list(removed)},
+        }, self.cache)
+
+    def get_torrent_selects(self, queries):
+        return [q for q in queries.captured_queries
+                if q['sql'].startswith('SELECT') and 'FROM "torrents_torrent"' in q['sql']]
+
+    def test_skips_unchanged_updates_without_reading_torrents(self):
+        self.process(added=self.states)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.process(updated=self.states)
+
+        self.assertFalse(self.get_torrent_selects(queries))
+
+    def test_applies_changed_updates(self):
+        self.process(added=self.states)
+
+        self.process(updated=[dict(self.states[0], uploaded=10)] + self.states[1:])
+
+        self.assertEqual(Torrent.objects.get(info_hash=make_info_hash(0)).uploaded, 10)
+        self.assertTrue(self.cache.matches(self.realm.id, normalize_torrent_state(dict(self.states[0], uploaded=10))))
+
+    def test_warm_up_matches_synced_states(self):
+        self.process(added=self.states)
+        self.cache.clear()
+
+        self.cache.warm_up()
+
+        self.assertEqual(len(self.cache), 10)
+        self.assertTrue(all(self.cache.matches(self.realm.id, normalize_torrent_state(s)) for s in self.states))
+
+    def test_bounded(self):
+        cache = TorrentStateCache(5)
+
+        cache.update(self.realm.id, [normalize_torrent_state(s) for s in self.states])
+
+        self.assertEqual(len(cache), 5)
+        self.assertTrue(cache.matches(self.realm.id, normalize_torrent_state(self.states[-1])))
+        self.assertFalse(cache.matches(self.realm.id, normalize_torrent_state(self.states[0])))
+
+    def test_failed_processing_is_not_cached(self):
+        with mock.patch.object(AlcazarEventProcessor, '_process_added_torrents', side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                self.process(added=self.states)
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_invalidated_on_delete(self):
+        AlcazarEventProcessor.process({self.realm.name: {'added': self.states[:1], 'updated': [], 'removed': []}})
+        torrent_state_cache.update(self.realm.id, [normalize_torrent_state(self.states[0])])
+
+        Torrent.objects.get(info_hash=make_info_hash(0)).delete()
+
+        self.assertFalse(torrent_state_cache.matches(self.realm.id, normalize_torrent_state(self.states[0])))
+
+    def test_invalidated_on_add(self):
+        torrent_state_cache.update(self.realm.id, [normalize_torrent_state(self.states[0])])
+
+        AlcazarEventProcessor.process({self.realm.name: {'added': self.states[:1], 'updated': [], 'removed': []}})
+
+        self.assertFalse(torrent_state_cache.matches(self.realm.id, normalize_torrent_state(self.states[0])))
+
+
+class QueuedBatchesClient:
+    def __init__(self, *batches):
+        self.batches = list(batches)
+
+    def pop_update_batch(self, limit, wait=None):
+        return self.batches.pop(0) if self.batches else {}
+
+
+class LeaseHandoverTests(TestCase):
+    def setUp(self):
+        self.realm = Realm.objects.create(name='test_realm')
+        self.state = make_torrent_state(make_info_hash(1), upload_rate=0)
+        # Two processes taking turns, each with its own cache
+        self.drainer_a = AlcazarUpdateDrainer(10, 1, TorrentStateCache(100), AlcazarSyncLeaseHolder('a'))
+        self.drainer_b = AlcazarUpdateDrainer(10, 1, TorrentStateCache(100), AlcazarSyncLeaseHolder('b'))
+
+    def drain(self, drainer, added=(), updated=()):
+        drainer.drain(QueuedBatchesClient(
+            {self.realm.name: {'added': list(added), 'updated': list(updated), 'removed': []}}), time_budget=60)
+
+    def test_cache_cleared_after_other_process_held_lease(self):
+        self.drain(self.drainer_a, added=[self.state])
+        self.drain(self.drainer_b, updated=[dict(self.state, upload_rate=100)])
+
+        # Matches what a cached before b took over, but not what's in the DB
+        self.drain(self.drainer_a, updated=[self.state])
+
+        self.assertEqual(Torrent.objects.get().upload_rate, 0)
+
+    def test_cache_kept_while_lease_stays(self):
+        self.drain(self.drainer_a, added=[self.state])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.drain(self.drainer_a, updated=[self.state])
+
+        self.assertFalse([q for q in queries.captured_queries
+                          if q['sql'].startswith('SELECT') and 'FROM "torrents_torrent"' in q['sql']])
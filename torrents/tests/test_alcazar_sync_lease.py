@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from torrents import alcazar_event_processor
+from torrents.alcazar_event_processor import AlcazarUpdateDrainer
+from torrents.alcazar_sync_lease import AlcazarSyncLeaseHolder
+from torrents.models import Torrent
+from torrents.tests.test_alcazar_update_drainer import FakeAlcazarClient
+
+
+class AlcazarSyncLeaseTests(TestCase):
+    def setUp(self):
+        self.lease_a = AlcazarSyncLeaseHolder('a', seconds=60)
+        self.lease_b = AlcazarSyncLeaseHolder('b', seconds=60)
+
+    def test_exclusive(self):
+        self.assertTrue(self.lease_a.acquire())
+        self.assertFalse(self.lease_b.acquire())
+        self.assertFalse(self.lease_b.renew())
+        self.assertTrue(self.lease_a.renew())
+
+    def test_generation_changes_with_holder(self):
+        self.assertTrue(self.lease_a.acquire())
+        generation = self.lease_a.generation
+        self.lease_a.release()
+
+        # Nobody held it in between
+        self.assertTrue(self.lease_a.acquire())
+        self.assertEqual(self.lease_a.generation, generation)
+        self.lease_a.release()
+
+        self.assertTrue(self.lease_b.acquire())
+        self.assertEqual(self.lease_b.generation, generation + 1)
+        self.lease_b.release()
+        self.assertTrue(self.lease_a.acquire())
+        self.assertEqual(self.lease_a.generation, generation + 2)
+
+    def test_expired_lease_is_taken_over(self):
+        self.lease_a.seconds = 0
+        self.assertTrue(self.lease_a.acquire())
+
+        self.assertTrue(self.lease_b.acquire())
+        self.assertFalse(self.lease_a.renew())
+
+
+class DrainerLeaseTests(TestCase):
+    def setUp(self):
+        self.lease = AlcazarSyncLeaseHolder('drainer', seconds=60)
+        self.other_lease = AlcazarSyncLeaseHolder('other', seconds=60)
+        self.drainer = AlcazarUpdateDrainer(10, target_page_seconds=1, lease=self.lease)
+
+    def test_skips_while_lease_is_held_elsewhere(self):
+        client = FakeAlcazarClient(25)
+        self.other_lease.acquire()
+
+        self.assertEqual(self.drainer.drain(client, time_budget=60), (0, False))
+        self.assertEqual(client.limits, [])
+
+        self.other_lease.release()
+        self.assertEqual(self.drainer.drain(client, time_budget=60), (25, False))
+
+    def test_stops_when_lease_is_lost(self):
+        client = FakeAlcazarClient(25)
+
+        with mock.patch.object(self.lease, 'renew', return_value=False):
+            self.assertEqual(self.drainer.drain(client, time_budget=60), (10, True))
+        self.assertEqual(client.limits, [10])
+
+    def test_carried_over_page_dropped_after_handover(self):
+        client = FakeAlcazarClient(25)
+        with mock.patch.object(alcazar_event_processor.AlcazarEventProcessor, '_process',
+                               side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                self.drainer.drain(client, time_budget=60)
+        self.other_lease.acquire()
+        self.other_lease.release()
+
+        self.assertEqual(self.drainer.drain(client, time_budget=60), (5, False))
+        self.assertEqual(Torrent.objects.count(), 5)
@@ -0,0 +1,132 @@
+import threading
+import time
+
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+
+from monitoring.models import ComponentStatus
+from task_queue.task_queue import BACK_OFF
+from torrents.alcazar_client import AlcazarClient
+from torrents.alcazar_state_cache import torrent_state_cache
+from torrents.alcazar_sync_lease import AlcazarSyncLeaseHolder
+from torrents.alcazar_update_consumer import AlcazarUpdateConsumer, CONSUMER_COMPONENT_NAME, is_consumer_active
+from torrents.models import AlcazarClientConfig, Torrent
+from torrents.tasks import poll_alcazar
+from torrents.tests.fake_alcazar import FakeAlcazar
+from torrents.tests.utils import make_torrent_state, make_info_hash
+
+
+class FakeAlcazarMixin:
+    supports_wait = True
+
+    def setUp(self):
+        torrent_state_cache.clear()
+        self.alcazar = FakeAlcazar(supports_wait=self.supports_wait)
+        AlcazarClientConfig.objects.create(base_url=self.alcazar.start())
+        self.addCleanup(self.alcazar.stop)
+
+    def push_later(self, delay, *args, **kwargs):
+        timer = threading.Timer(delay, self.alcazar.push, args, kwargs)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+
+class LongPollTests(FakeAlcazarMixin, TestCase):
+    def test_returns_as_soon_as_updates_arrive(self):
+        self.push_later(0.2, 'test_realm', added=[make_torrent_state(make_info_hash(1))])
+
+        start = time.time()
+        batch = AlcazarClient().pop_update_batch(10, wait=10)
+
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual([state['info_hash'] for state in batch['test_realm']['added']], [make_info_hash(1)])
+
+    def test_returns_empty_after_wait(self):
+        start = time.time()
+        batch = AlcazarClient().pop_update_batch(10, wait=0.2)
+
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertEqual(batch, {})
+
+
+class AlcazarUpdateConsumerTests(FakeAlcazarMixin, TestCase):
+    def test_applies_updates_as_they_arrive(self):
+        consumer = AlcazarUpdateConsumer(wait=10)
+        self.push_later(0.2, 'test_realm', added=[make_torrent_state(make_info_hash(i)) for i in range(3)])
+
+        start = time.time()
+        num_events = consumer.run_once(AlcazarClient())
+
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(num_events, 3)
+        self.assertEqual(Torrent.objects.count(), 3)
+
+    def test_run_heartbeats_and_hands_back_on_stop(self):
+        consumer = AlcazarUpdateConsumer(wait=0.1)
+        self.alcazar.push('test_realm', added=[make_torrent_state(make_info_hash(1))])
+        statuses = []
+
+        def heartbeat(status, message, traceback_str=None):
+            statuses.append(status)
+            consumer.stop()
+
+        consumer.heartbeat = heartbeat
+        consumer.run()
+
+        self.assertEqual(statuses, [ComponentStatus.STATUS_GREEN, ComponentStatus.STATUS_YELLOW])
+        self.assertEqual(Torrent.objects.count(), 1)
+
+    def test_waits_while_poll_holds_lease(self):
+        consumer = AlcazarUpdateConsumer(wait=0.2)
+        self.alcazar.push('test_realm', added=[make_torrent_state(make_info_hash(1))])
+        poll_lease = AlcazarSyncLeaseHolder('poll_alcazar')
+        poll_lease.acquire()
+
+        self.assertEqual(consumer.run_once(AlcazarClient()), 0)
+        self.assertEqual(self.alcazar.requests, [])
+
+        poll_lease.release()
+        self.assertEqual(consumer.run_once(AlcazarClient()), 1)
+
+
+# ComponentStatus is written through the control connection, which can't see or wait for an open test transaction
+class PollAlcazarFallbackTests(FakeAlcazarMixin, TransactionTestCase):
+    def test_poll_alcazar_stands_down_while_consumer_is_active(self):
+        self.alcazar.push('test_realm', added=[make_torrent_state(make_info_hash(1))])
+        ComponentStatus.update_status(CONSUMER_COMPONENT_NAME, ComponentStatus.STATUS_GREEN, 'Running.')
+
+        self.assertTrue(is_consumer_active())
+        self.assertEqual(poll_alcazar(), BACK_OFF)
+        self.assertFalse(Torrent.objects.exists())
+
+        with override_settings(ALCAZAR_CONSUMER_STALE_SECONDS=0):
+            self.assertFalse(is_consumer_active())
+            poll_alcazar()
+        self.assertEqual(Torrent.objects.count(), 1)
+
+    def test_poll_alcazar_waits_for_consumer_lease(self):
+        self.alcazar.push('test_realm', added=[make_torrent_state(make_info_hash(1))])
+        # The consumer's heartbeat went stale mid-drain, it still holds the lease
+        consumer_lease = AlcazarSyncLeaseHolder('alcazar_consumer')
+        consumer_lease.acquire()
+
+        self.assertFalse(is_consumer_active())
+        self.assertEqual(poll_alcazar(), BACK_OFF)
+        self.assertFalse(Torrent.objects.exists())
+
+        consumer_lease.release()
+        poll_alcazar()
+        self.assertEqual(Torrent.objects.count(), 1)
+
+
+class UnsupportedLongPollTests(FakeAlcazarMixin, TestCase):
+    supports_wait = False
+
+    def test_consumer_does_not_spin(self):
+        consumer = AlcazarUpdateConsumer(wait=0.3)
+
+        start = time.time()
+        self.assertEqual(consumer.run_once(AlcazarClient()), 0)
+
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertEqual(len(self.alcazar.requests), 1)
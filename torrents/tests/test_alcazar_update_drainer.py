@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from torrents import alcazar_event_processor
+from torrents.alcazar_event_processor import AlcazarUpdateDrainer, MIN_UPDATE_BATCH_SIZE, MAX_UPDATE_BATCH_SIZE
+from torrents.models import Torrent
+from torrents.tests.utils import make_torrent_state, make_info_hash
+
+
+class FakeAlcazarClient:
+    """Serves a fixed backlog of added torrents through pop_update_batch."""
+
+    def __init__(self, num_events, realm_name='test_realm'):
+        self.backlog = [make_torrent_state(make_info_hash(i)) for i in range(num_events)]
+        self.realm_name = realm_name
+        self.limits = []
+
+    def pop_update_batch(self, limit, wait=None):
+        self.limits.append(limit)
+        page, self.backlog = self.backlog[:limit], self.backlog[limit:]
+        return {self.realm_name: {'added': page, 'updated': [], 'removed': []}}
+
+
+class AlcazarUpdateDrainerTests(TestCase):
+    def test_drains_backlog_in_pages(self):
+        client = FakeAlcazarClient(25)
+        drainer = AlcazarUpdateDrainer(10, target_page_seconds=1)
+
+        num_events, has_more = drainer.drain(client, time_budget=60)
+
+        self.assertEqual((num_events, has_more), (25, False))
+        self.assertEqual(len(client.limits), 3)
+        self.assertEqual(Torrent.objects.count(), 25)
+
+    def test_stops_at_time_budget(self):
+        client = FakeAlcazarClient(25)
+        drainer = AlcazarUpdateDrainer(10, target_page_seconds=1)
+
+        num_events, has_more = drainer.drain(client, time_budget=0)
+
+        self.assertEqual((num_events, has_more), (10, True))
+        self.assertEqual(len(client.backlog), 15)
+
+    def test_empty_backlog(self):
+        client = FakeAlcazarClient(0)
+        drainer = AlcazarUpdateDrainer(10, target_page_seconds=1)
+
+        self.assertEqual(drainer.drain(client, time_budget=60), (0, False))
+        self.assertFalse(Torrent.objects.exists())
+
+    def test_failed_page_is_raised(self):
+        client = FakeAlcazarClient(25)
+        drainer = AlcazarUpdateDrainer(10, target_page_seconds=1)
+
+        with mock.patch.object(alcazar_event_processor.AlcazarEventProcessor, '_process',
+                               side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                drainer.drain(client, time_budget=60)
+        self.assertFalse(Torrent.objects.exists())
+
+    def test_prefetched_page_survives_failure(self):
+        client = FakeAlcazarClient(25)
+        drainer = AlcazarUpdateDrainer(10, target_page_seconds=1)
+
+        with mock.patch.object(alcazar_event_processor.AlcazarEventProcessor, '_process',
+                               side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                drainer.drain(client, time_budget=60)
+        # The failed page is lost, the one prefetched while it was processed isn't
+        self.assertEqual(client.limits, [10, 10])
+
+        self.assertEqual(drainer.drain(client, time_budget=60), (15, False))
+        self.assertEqual(
+            sorted(Torrent.objects.values_list('info_hash', flat=True)),
+            [make_info_hash(i) for i in range(10, 25)],
+        )
+
+    def test_skips_while_previous_drain_is_running(self):
+        client = FakeAlcazarClient(25)
+        drainer = AlcazarUpdateDrainer(10, target_page_seconds=1)
+
+        with drainer.lock:
+            self.assertEqual(drainer.drain(client, time_budget=60), (0, False))
+        self.assertEqual(client.limits, [])
+        self.assertEqual(drainer.drain(client, time_budget=60), (25, False))
+
+
+class BatchSizeTests(TestCase):
+    def setUp(self):
+        self.drainer = AlcazarUpdateDrainer(5000, target_page_seconds=2)
+
+    def test_grows_when_fast(self):
+        self.assertEqual(self.drainer.get_next_batch_size(5000, 1.6), 6250)
+        self.assertEqual(self.drainer.get_next_batch_size(5000, 0.01), 10000)
+
+    def test_shrinks_when_slow(self):
+        self.assertEqual(self.drainer.get_next_batch_size(5000, 4), 2500)
+        self.assertEqual(self.drainer.get_next_batch_size(5000, 100), 2500)
+
+    def test_partial_page_keeps_size(self):
+        self.assertEqual(self.drainer.get_next_batch_size(10, 0.001), 5000)
+
+    def test_bounds(self):
+        self.drainer.batch_size = MAX_UPDATE_BATCH_SIZE
+        self.assertEqual(self.drainer.get_next_batch_size(MAX_UPDATE_BATCH_SIZE, 0.01), MAX_UPDATE_BATCH_SIZE)
+        self.drainer.batch_size = MIN_UPDATE_BATCH_SIZE
+        self.assertEqual(self.drainer.get_next_batch_size(MIN_UPDATE_BATCH_SIZE, 100), MIN_UPDATE_BATCH_SIZE)
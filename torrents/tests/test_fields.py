@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from torrents.fields import BinaryInfoHashField
+from torrents.models import Realm, Torrent
+from torrents.serializers import TorrentSerializer
+from torrents.tests.utils import make_info_hash
+
+INFO_HASH = 'abcdef0123456789abcdef0123456789abcdef01'
+
+
+class BinaryInfoHashFieldTests(TestCase):
+    def setUp(self):
+        self.realm = Realm.objects.create(name='test_realm')
+
+    def create_torrent(self, info_hash):
+        return Torrent.objects.create(realm=self.realm, client='test_client', info_hash=info_hash, status=3,
+                                      download_path='/downloads')
+
+    def test_stored_as_20_bytes(self):
+        torrent = self.create_torrent(INFO_HASH.upper())
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT info_hash FROM torrents_torrent WHERE id = %s', [torrent.id])
+            self.assertEqual(bytes(cursor.fetchone()[0]), bytes.fromhex(INFO_HASH))
+        self.assertEqual(Torrent.objects.get(id=torrent.id).info_hash, INFO_HASH)
+
+    def test_lookups(self):
+        for i in range(3):
+            self.create_torrent(make_info_hash(i))
+
+        self.assertEqual(Torrent.objects.get(info_hash=make_info_hash(1)).info_hash, make_info_hash(1))
+        self.assertEqual(
+            sorted(Torrent.objects.filter(info_hash__in=[make_info_hash(0), make_info_hash(2)]).values_list(
+                'info_hash', flat=True)),
+            [make_info_hash(0), make_info_hash(2)],
+        )
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Torrent.objects.filter(info_hash='not a hash').exists()
+        with self.assertRaises(ValueError):
+            Torrent.objects.filter(info_hash='abcd').exists()
+
+    def test_serializer(self):
+        torrent = self.create_torrent(INFO_HASH)
+
+        self.assertEqual(TorrentSerializer(torrent).data['info_hash'], INFO_HASH)
+        # Declared on the serializers, the mapping is shared by every app's ModelSerializers
+        self.assertNotIn(BinaryInfoHashField, serializers.ModelSerializer.serializer_field_mapping)
+
+    def test_view_invalid_info_hash(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('user'))
+        self.create_torrent(INFO_HASH)
+
+        response = client.get('/api/torrents/realms/test_realm/by-info-hash/{}'.format(INFO_HASH))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['info_hash'], INFO_HASH)
+        response = client.get('/api/torrents/realms/test_realm/by-info-hash/xyz')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from torrents.alcazar_event_processor import AlcazarEventProcessor
+from torrents.models import Realm, Torrent, TorrentStats
+from torrents.tests.utils import make_torrent_state, make_info_hash
+
+
+class TorrentStatsTests(TestCase):
+    def setUp(self):
+        self.realm = Realm.objects.create(name='test_realm')
+
+    def process(self, added=(), updated=()):
+        AlcazarEventProcessor.process({
+            self.realm.name: {'added': list(added), 'updated': list(updated), 'removed': []},
+        })
+
+    def test_save_creates_and_updates_stats(self):
+        torrent = Torrent(realm=self.realm, client='test_client', info_hash=make_info_hash(1), status=3,
+                          download_path='/downloads', progress=0.5, uploaded=10)
+        torrent.save()
+
+        torrent = Torrent.objects.get(id=torrent.id)
+        self.assertEqual((torrent.progress, torrent.uploaded, torrent.downloaded), (0.5, 10, None))
+
+        torrent.progress = 1.0
+        torrent.save(update_fields=('progress',))
+        self.assertEqual(TorrentStats.objects.get(torrent=torrent).progress, 1.0)
+
+    def test_sync_writes_stats_only_to_stats_table(self):
+        states = [make_torrent_state(make_info_hash(i), upload_rate=0) for i in range(10)]
+        self.process(added=states)
+        self.assertEqual(TorrentStats.objects.count(), 10)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.process(updated=[dict(state, upload_rate=100) for state in states])
+
+        update_queries = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertTrue(update_queries)
+        self.assertTrue(all('"torrents_torrentstats"' in sql for sql in update_queries))
+        self.assertEqual(set(TorrentStats.objects.values_list('upload_rate', flat=True)), {100})
+
+    def test_delete_cascades(self):
+        self.process(added=[make_torrent_state(make_info_hash(1))])
+
+        Torrent.objects.all().delete()
+
+        self.assertFalse(TorrentStats.objects.exists())
+
+
+class TorrentsViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('user'))
+        realm = Realm.objects.create(name='test_realm')
+        AlcazarEventProcessor.process({realm.name: {
+            'added': [
+                make_torrent_state(make_info_hash(1), progress=0.5, upload_rate=0),
+                make_torrent_state(make_info_hash(2), progress=1.0, upload_rate=100),
+            ],
+            'updated': [],
+            'removed': [],
+        }})
+
+    def get_torrents(self, **params):
+        response = self.client.get('/api/torrents/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_serializes_stats(self):
+        torrents = self.get_torrents(order_by='info_hash')
+
+        self.assertEqual([(t['progress'], t['upload_rate']) for t in torrents], [(0.5, 0), (1.0, 100)])
+
+    def test_order_by_stats(self):
+        torrents = self.get_torrents(order_by='-progress')
+
+        self.assertEqual([t['info_hash'] for t in torrents], [make_info_hash(2), make_info_hash(1)])
+
+    def test_filter_active(self):
+        with CaptureQueriesContext(connection) as queries:
+            torrents = self.get_torrents(status='active')
+
+        self.assertEqual([t['info_hash'] for t in torrents], [make_info_hash(2)])
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "torrents_torrentstats"' in q['sql']])
@@ -0,0 +1,25 @@
+def make_torrent_state(info_hash, **kwargs):
+    """A torrent state as returned by Alcazar."""
+
+    state = {
+        'info_hash': info_hash,
+        'client': 'test_client',
+        'status': 3,
+        'download_path': '/downloads/{}'.format(info_hash[:8]),
+        'name': 'Torrent {}'.format(info_hash[:8]),
+        'size': 1000,
+        'downloaded': 1000,
+        'uploaded': 0,
+        'download_rate': 0,
+        'upload_rate': 0,
+        'progress': 1.0,
+        'date_added': '2019-03-01T12:00:00+00:00',
+        'error': None,
+        'tracker_error': None,
+    }
+    state.update(kwargs)
+    return state
+
+
+def make_info_hash(i):
+    return '{:040x}'.format(i)
@@ -4,6 +4,7 @@ import zipstream
 from django.db import transaction
 from django.db.models import Q
 from django.http import StreamingHttpResponse
+from rest_framework import status
 from rest_framework.exceptions import NotFound
 from rest_framework.generics import RetrieveUpdateDestroyAPIView, ListAPIView, ListCreateAPIView, RetrieveDestroyAPIView
 from rest_framework.pagination import PageNumberPagination
@@ -14,14 +15,25 @@ from Harvest.utils import TransactionAPIView, CORSBrowserExtensionView, union_di
 from torrents.add_torrent import add_torrent_from_file, add_torrent_from_tracker, fetch_torrent
 from torrents.alcazar_client import AlcazarClient, AlcazarRemoteException
 from torrents.exceptions import RealmNotFoundException
-from torrents.models import AlcazarClientConfig, Realm, Torrent, DownloadLocation
+from torrents.models import AlcazarClientConfig, Realm, Torrent, DownloadLocation, TORRENT_STATS_FIELDS
 from torrents.remove_torrent import remove_torrent
 from torrents.serializers import AlcazarClientConfigSerializer, RealmSerializer, TorrentSerializer, \
     DownloadLocationSerializer, TorrentInfoSerializer
+from torrents.tasks import fetch_torrent_task, add_torrent_from_tracker_task
 from torrents.utils import get_zip_download_filename_base, add_zip_download_files
 from trackers.registry import TrackerRegistry
 
 
+def is_async_request(request):
+    """Slow tracker work can be moved to the task queue by passing async=1. The response then holds the task id."""
+
+    return str(request.data.get('async', '')).lower() in ('1', 'true')
+
+
+def async_task_response(async_task):
+    return Response({'task_id': async_task.id}, status=status.HTTP_202_ACCEPTED)
+
+
 class Realms(ListAPIView):
     queryset = Realm.objects.all()
     serializer_class = RealmSerializer
@@ -92,7 +104,7 @@ class Torrents(CORSBrowserExtensionView, ListAPIView):
     FILTER_FUNCS = {
         None: lambda qs: qs,
         FILTER_ALL: lambda qs: qs,
-        FILTER_ACTIVE: lambda qs: qs.filter(Q(download_rate__gt=0) | Q(upload_rate__gt=0)),
+        FILTER_ACTIVE: lambda qs: qs.filter(Q(stats__download_rate__gt=0) | Q(stats__upload_rate__gt=0)),
         FILTER_DOWNLOADING: lambda qs: qs.filter(status=Torrent.STATUS_DOWNLOADING),
         FILTER_SEEDING: lambda qs: qs.filter(status=Torrent.STATUS_SEEDING),
         FILTER_ERRORS: lambda qs: qs.filter(Q(error__isnull=False) | Q(tracker_error__isnull=False)),
@@ -131,6 +143,10 @@ class Torrents(CORSBrowserExtensionView, ListAPIView):
     def _apply_order_by(self, qs, order_by):
         if not order_by:
             return qs.order_by('-added_datetime')
+        # Transfer stats are exposed as Torrent fields, but live in TorrentStats
+        field = order_by.lstrip('-')
+        if field in TORRENT_STATS_FIELDS:
+            order_by = order_by[:-len(field)] + 'stats__' + field
         return qs.order_by(order_by)
 
     def get_serializer_context(self):
@@ -203,7 +219,8 @@ class TorrentByRealmInfoHash(TorrentView, APIView):
             raise NotFound()
         try:
             return Torrent.objects.get(realm=realm, info_hash=self.kwargs['info_hash'])
-        except Torrent.DoesNotExist:
+        except (Torrent.DoesNotExist, ValueError):
+            # ValueError is raised for strings that aren't valid info hashes
             raise NotFound()
 
 
@@ -227,6 +244,8 @@ class FetchTorrent(APIView):
         tracker_name = request.data['tracker_name']
         tracker_id = request.data['tracker_id']
         tracker = TrackerRegistry.get_plugin(tracker_name, self.__class__.__name__)
+        if is_async_request(request):
+            return async_task_response(fetch_torrent_task.delay(tracker_name, tracker_id))
 
         try:
             realm = Realm.objects.get(name=tracker.name)
@@ -262,6 +281,10 @@ class AddTorrentFromTracker(CORSBrowserExtensionView, APIView):
         download_path_pattern = request.data['download_path']
 
         tracker = TrackerRegistry.get_plugin(tracker_name, self.__class__.__name__)
+        if is_async_request(request):
+            return async_task_response(
+                add_torrent_from_tracker_task.delay(tracker_name, tracker_id, download_path_pattern))
+
         added_torrent = add_torrent_from_tracker(
             tracker=tracker,
             tracker_id=tracker_id,
@@ -17,5 +17,5 @@ class UploadStudioConfig(AppConfig):
         ExecutorRegistry.register_executor(sox_process.SoxProcessExecutor)
         ExecutorRegistry.register_executor(fix_filename_track_numbers.FixFilenameTrackNumbers)
 
-        from .receivers import on_torrent_finished
-        signals.torrent_finished.connect(on_torrent_finished)
+        from .receivers import on_torrents_finished
+        signals.torrents_finished.connect(on_torrents_finished)
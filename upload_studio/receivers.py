@@ -2,7 +2,9 @@ from upload_studio.models import Project
 from upload_studio.tasks import project_run_all
 
 
-def on_torrent_finished(sender, torrent, **kwargs):
-    projects = Project.objects.filter(source_torrent=torrent, is_finished=False)
-    for project in projects:
-        project_run_all.delay(project.id)
+def on_torrents_finished(sender, torrents, **kwargs):
+    project_ids = Project.objects.filter(
+        source_torrent__in=[torrent.id for torrent in torrents],
+        is_finished=False,
+    ).values_list('id', flat=True)
+    project_run_all.delay_many((project_id,) for project_id in project_ids)
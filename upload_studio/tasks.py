@@ -1,14 +1,14 @@
-from task_queue.task_queue import TaskQueue
+from task_queue.task_queue import TaskQueue, EXECUTOR_PROCESS
 from upload_studio.steps_runner import StepsRunner
 
 
-@TaskQueue.async_task()
+@TaskQueue.async_task(executor=EXECUTOR_PROCESS, unique_key=True)
 def project_run_all(project_id):
     runner = StepsRunner(project_id)
     runner.run_all()
 
 
-@TaskQueue.async_task()
+@TaskQueue.async_task(executor=EXECUTOR_PROCESS)
 def project_run_one(project_id):
     runner = StepsRunner(project_id)
     runner.run_one()